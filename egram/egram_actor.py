@@ -0,0 +1,109 @@
+# -----------------------------------------------------------------------------
+# EGRAM STORAGE ACTOR
+# One writer thread owns every egram write; callers on any thread (serial
+# read loop, Tk) queue their writes and optionally wait for the result
+# readers never lock: the writer replaces headers / index entries instead of
+# mutating them, so a reader always sees a consistent snapshot
+# -----------------------------------------------------------------------------
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class StorageActor:
+    def __init__(self, name="egram-storage"):
+        self.name = name
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+        # metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.busy_ms = 0.0
+
+    # ---- lifecycle -----------------------------------------------------------
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def close(self, timeout=5.0):
+        # drains everything queued so far, then stops the thread; the thread
+        # is kept until it exits so writes nested in the drained jobs still
+        # run inline
+        thread = self.thread
+        if thread is None:
+            return
+        self.queue.put(None)
+        thread.join(timeout)
+        with self.lock:
+            self.thread = None
+
+    def on_writer_thread(self):
+        return threading.current_thread() is self.thread
+
+    # ---- producers -----------------------------------------------------------
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        with self.lock:
+            self.submitted += 1
+
+        # a write issued from inside another write runs right away, queueing
+        # it would deadlock the writer waiting on itself
+        if self.on_writer_thread():
+            self.execute(future, fn, args, kwargs)
+            return future
+
+        self.start()
+        self.queue.put((future, fn, args, kwargs))
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return future
+
+    def call(self, fn, *args, **kwargs):
+        return self.submit(fn, *args, **kwargs).result()
+
+    # ---- writer thread -------------------------------------------------------
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            future, fn, args, kwargs = item
+            self.execute(future, fn, args, kwargs)
+
+    def execute(self, future, fn, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self.lock:
+                self.failed += 1
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self.lock:
+                self.completed += 1
+                self.busy_ms += (time.perf_counter() - start) * 1000.0
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "busy_ms": self.busy_ms
+            }
@@ -0,0 +1,181 @@
+# -----------------------------------------------------------------------------
+# EGRAM SAMPLE CLOCK
+# Gives each received frame a timestamp (ms since the stream started,
+# plus start_ms)
+# in order of preference:
+#   sequence - frame counter from the device (wraps every 2^bits frames),
+#              t = frame index * sample period; dropped frames leave gaps
+#   device   - device clock ticks (wraps every 2^bits ticks)
+#   host     - neither available: time.monotonic_ns at arrival with a
+#              sample-rate model; the period is re-estimated continuously
+#              (drift between device and host clocks) and gaps longer than
+#              GAP_MS are taken as dropped frames
+# timestamps handed out are always increasing, across calls as well, and
+# on a whole-microsecond grid so stored sessions compact to int32 deltas
+# (egram_codec)
+# -----------------------------------------------------------------------------
+
+import time
+
+import numpy as np
+
+SEQUENCE_BITS = 8
+DEVICE_TICK_BITS = 32
+DEVICE_TICK_MS = 1.0
+
+# host model: share of the timing error corrected per batch (phase) and
+# folded into the period estimate (drift), and the period's allowed range
+PHASE_GAIN = 0.1
+DRIFT_GAIN = 0.002
+MAX_DRIFT = 0.05
+
+# arrival later than the model by more than this = frames were lost
+GAP_MS = 50.0
+
+
+class SampleClock:
+    def __init__(self, sampling_rate_hz=500, start_ms=0.0, sequence_bits=SEQUENCE_BITS,
+                 tick_bits=DEVICE_TICK_BITS, tick_ms=DEVICE_TICK_MS):
+        # start_ms: time of the first frame (e.g. continuing a stored session)
+        self.start_ms = start_ms
+        self.nominal_period_ms = 1000.0 / sampling_rate_hz
+        self.sequence_bits = sequence_bits
+        self.tick_bits = tick_bits
+        self.tick_ms = tick_ms
+        self.reset()
+
+    def reset(self):
+        self.period_ms = self.nominal_period_ms
+        self.last_t = None
+
+        # host time (ms) of t = 0
+        self.origin_ms = None
+
+        # last raw counter values, and their unwrapped totals
+        self.last_sequence = None
+        self.frame_index = 0
+        self.last_tick = None
+        self.tick_total = 0
+
+        # stats
+        self.gaps = 0
+        self.dropped_frames = 0
+
+    def host_ms(self, arrival_ns):
+        if arrival_ns is None:
+            arrival_ns = time.monotonic_ns()
+        return arrival_ns / 1e6
+
+    # ---- entry point -------------------------------------------------------
+    def stamp(self, count, sequence=None, device_ticks=None, arrival_ns=None):
+        # timestamps (ms, float array) for `count` frames received together
+        if count == 0:
+            return np.zeros(0)
+
+        now_ms = self.host_ms(arrival_ns)
+        if sequence is not None:
+            t = self.stamp_sequence(np.asarray(sequence, dtype=np.int64), now_ms)
+        elif device_ticks is not None:
+            t = self.stamp_device(np.asarray(device_ticks, dtype=np.int64), now_ms)
+        else:
+            t = self.stamp_host(count, now_ms)
+
+        t = self.make_increasing(t)
+        self.last_t = t[-1]
+        return np.round((t + self.start_ms) * 1000) / 1000
+
+    # ---- sequence counter --------------------------------------------------
+    def stamp_sequence(self, sequence, now_ms):
+        modulus = 1 << self.sequence_bits
+        steps = np.diff(sequence) % modulus
+
+        if self.last_sequence is None:
+            self.origin_ms = now_ms - (len(sequence) - 1) * self.period_ms
+            first = 0
+        else:
+            first = self.frame_index + self.unwrap_step(sequence[0], now_ms)
+        self.last_sequence = int(sequence[-1])
+
+        lost = steps[steps > 1] - 1
+        self.gaps += len(lost)
+        self.dropped_frames += int(lost.sum())
+
+        index = first + np.concatenate([[0], np.cumsum(steps)])
+        self.frame_index = int(index[-1])
+        return index * self.nominal_period_ms
+
+    def unwrap_step(self, value, now_ms):
+        # frames since the last batch; the counter may have wrapped several
+        # times while frames were lost, host time tells how many
+        modulus = 1 << self.sequence_bits
+        step = (int(value) - self.last_sequence) % modulus
+        expected = (now_ms - self.origin_ms) / self.nominal_period_ms - self.frame_index
+        wraps = max(0, round((expected - step) / modulus))
+        step += wraps * modulus
+
+        if step > 1:
+            self.gaps += 1
+            self.dropped_frames += step - 1
+        return step
+
+    # ---- device clock --------------------------------------------------------
+    def stamp_device(self, ticks, now_ms):
+        modulus = 1 << self.tick_bits
+        steps = np.diff(ticks) % modulus
+
+        if self.last_tick is None:
+            first = 0
+        else:
+            first = self.tick_total + (int(ticks[0]) - self.last_tick) % modulus
+        self.last_tick = int(ticks[-1])
+
+        totals = first + np.concatenate([[0], np.cumsum(steps)])
+        self.tick_total = int(totals[-1])
+        return totals * self.tick_ms
+
+    # ---- host clock fallback ---------------------------------------------------
+    def stamp_host(self, count, now_ms):
+        steps = np.arange(1, count + 1)
+
+        if self.origin_ms is None:
+            # the newest frame of the first batch arrived just now
+            self.origin_ms = now_ms - (count - 1) * self.period_ms
+            return (steps - 1) * self.period_ms
+
+        # where the model puts the last frame vs. when it actually arrived
+        error = (now_ms - self.origin_ms) - (self.last_t + count * self.period_ms)
+
+        if error > GAP_MS:
+            # frames were lost: restart the batch so it ends at arrival time
+            self.gaps += 1
+            self.dropped_frames += int(error / self.period_ms)
+            return now_ms - self.origin_ms - (count - steps) * self.period_ms
+
+        # small errors are jitter and drift: nudge the period, and spread a
+        # share of the error over this batch
+        self.period_ms += DRIFT_GAIN * error / count
+        low = self.nominal_period_ms * (1 - MAX_DRIFT)
+        high = self.nominal_period_ms * (1 + MAX_DRIFT)
+        self.period_ms = min(max(self.period_ms, low), high)
+
+        step = max(self.period_ms + PHASE_GAIN * error / count, self.period_ms / 2)
+        return self.last_t + steps * step
+
+    # ---- helpers -------------------------------------------------------------
+    def make_increasing(self, t):
+        # strictly increasing, also relative to the previous batch
+        epsilon = self.nominal_period_ms / 100
+        ramp = np.arange(len(t)) * epsilon
+        start = -np.inf if self.last_t is None else self.last_t + epsilon
+        return np.maximum.accumulate(np.maximum(t - ramp, start)) + ramp
+
+    def drift_ppm(self):
+        return (self.period_ms / self.nominal_period_ms - 1) * 1e6
+
+    def stats(self):
+        return {
+            "period_ms": self.period_ms,
+            "drift_ppm": self.drift_ppm(),
+            "gaps": self.gaps,
+            "dropped_frames": self.dropped_frames
+        }
@@ -0,0 +1,231 @@
+# -----------------------------------------------------------------------------
+# EGRAM CHANNEL CODEC
+# Lossless compact encoding for finished channel recordings
+# timestamps -> first value + int32 deltas (whole ms, else whole us), values -> raw int8 device counts
+# (parse_egram_packet reads one signed byte and divides by 10), then zlib
+# falls back to plain float64 columns when a channel does not fit that model
+#
+# a channel file is a container of independently encoded blocks plus a table
+# of (first t, last t) per block, so a time range only decodes the blocks it
+# overlaps
+# -----------------------------------------------------------------------------
+
+import bisect
+
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"EGZ1"
+CONTAINER_MAGIC = b"EGZ2"
+
+# magic, sample count, timestamp encoding, value encoding, value divisor, first t
+CODEC_HEAD = struct.Struct("<4sQBBdd")
+
+# magic, sample count, block count; followed by one BLOCK_ENTRY per block
+CONTAINER_HEAD = struct.Struct("<4sQI")
+
+# first t, last t, byte offset from the start of the file, byte length
+BLOCK_ENTRY = struct.Struct("<ddQI")
+
+# magic + sample count, shared by both layouts
+COUNT_HEAD = struct.Struct("<4sQ")
+
+# samples per block (~8 s at 500 Hz)
+BLOCK_SIZE = 4096
+
+TS_FLOAT = 0        # float64 timestamps
+TS_INT_DELTA = 1    # int32 deltas from the first timestamp
+TS_US_DELTA = 2     # int32 deltas in microseconds (egram_clock stamps)
+
+VAL_FLOAT = 0       # float64 values (NaN = missing)
+VAL_INT8 = 1        # int8 counts, value = count / divisor
+
+# device counts are tenths of a millivolt
+COUNT_DIVISOR = 10.0
+
+COMPRESS_LEVEL = 6
+
+
+# -----------------------------------------------------------------------------
+# encoding
+# -----------------------------------------------------------------------------
+def int_deltas(ticks):
+    # first tick + int32 deltas when ticks are whole numbers that fit, else None
+    if not np.all(np.isfinite(ticks)) or not np.all(ticks == np.round(ticks)):
+        return None
+    deltas = np.diff(ticks)
+    if len(deltas) and (deltas.min() < -2**31 or deltas.max() >= 2**31):
+        return None
+    return float(ticks[0]), deltas.astype("<i4").tobytes()
+
+
+def encode_timestamps(t):
+    if len(t) == 0:
+        return TS_FLOAT, 0.0, b""
+
+    encoded = int_deltas(t)
+    if encoded is not None:
+        return TS_INT_DELTA, *encoded
+
+    # only lossless if dividing the microseconds gives back the exact floats
+    us = np.round(t * 1000)
+    if np.array_equal(us / 1000, t):
+        encoded = int_deltas(us)
+        if encoded is not None:
+            return TS_US_DELTA, *encoded
+
+    return TS_FLOAT, 0.0, np.ascontiguousarray(t, dtype="<f8").tobytes()
+
+
+def encode_values(values):
+    if len(values) and np.all(np.isfinite(values)):
+        counts = np.round(values * COUNT_DIVISOR)
+        if counts.min() >= -128 and counts.max() <= 127:
+            # only lossless if dividing the counts gives back the exact floats
+            if np.array_equal(counts / COUNT_DIVISOR, values):
+                return VAL_INT8, counts.astype("i1").tobytes()
+
+    return VAL_FLOAT, np.ascontiguousarray(values, dtype="<f8").tobytes()
+
+
+def encode_block(t, values):
+    t = np.asarray(t, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    ts_kind, t0, ts_raw = encode_timestamps(t)
+    val_kind, val_raw = encode_values(values)
+
+    head = CODEC_HEAD.pack(MAGIC, len(t), ts_kind, val_kind, COUNT_DIVISOR, t0)
+    return head + zlib.compress(ts_raw + val_raw, COMPRESS_LEVEL)
+
+
+def encode_channel(t, values, block_size=BLOCK_SIZE):
+    t = np.asarray(t, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    starts = range(0, len(t), block_size)
+    offset = CONTAINER_HEAD.size + BLOCK_ENTRY.size * len(starts)
+
+    table = []
+    blocks = []
+    for start in starts:
+        block = encode_block(t[start:start + block_size], values[start:start + block_size])
+        last = min(start + block_size, len(t)) - 1
+        table.append(BLOCK_ENTRY.pack(t[start], t[last], offset, len(block)))
+        blocks.append(block)
+        offset += len(block)
+
+    head = CONTAINER_HEAD.pack(CONTAINER_MAGIC, len(t), len(blocks))
+    return head + b"".join(table) + b"".join(blocks)
+
+
+# -----------------------------------------------------------------------------
+# decoding
+# -----------------------------------------------------------------------------
+def read_count(raw_head):
+    magic, count = COUNT_HEAD.unpack_from(raw_head)
+    if magic not in (MAGIC, CONTAINER_MAGIC):
+        raise ValueError("Not an encoded egram channel")
+    return count
+
+
+def decode_block(raw):
+    # returns (timestamps, values) float64 arrays
+    magic, count, ts_kind, val_kind, divisor, t0 = CODEC_HEAD.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded egram channel")
+
+    if count == 0:
+        return np.zeros(0), np.zeros(0)
+
+    payload = zlib.decompress(raw[CODEC_HEAD.size:])
+
+    if ts_kind in (TS_INT_DELTA, TS_US_DELTA):
+        ts_size = (count - 1) * 4
+        deltas = np.frombuffer(payload, dtype="<i4", count=count - 1)
+        t = np.empty(count, dtype=np.float64)
+        t[0] = t0
+        t[1:] = t0 + np.cumsum(deltas, dtype=np.float64)
+        if ts_kind == TS_US_DELTA:
+            t /= 1000
+    else:
+        ts_size = count * 8
+        t = np.frombuffer(payload, dtype="<f8", count=count).copy()
+
+    if val_kind == VAL_INT8:
+        counts = np.frombuffer(payload, dtype="i1", count=count, offset=ts_size)
+        values = counts / divisor
+    else:
+        values = np.frombuffer(payload, dtype="<f8", count=count, offset=ts_size).copy()
+
+    return t, values
+
+
+def read_block_table(f):
+    # (first t, last t, offset, length) per block of an open channel file
+    f.seek(0)
+    magic, _, blocks = CONTAINER_HEAD.unpack(f.read(CONTAINER_HEAD.size))
+    if magic != CONTAINER_MAGIC:
+        raise ValueError("Not a block encoded egram channel")
+    raw = f.read(BLOCK_ENTRY.size * blocks)
+    return list(BLOCK_ENTRY.iter_unpack(raw))
+
+
+def join_blocks(parts):
+    if not parts:
+        return np.zeros(0), np.zeros(0)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def decode_channel(raw):
+    # whole channel as (timestamps, values) float64 arrays
+    if raw[:4] == MAGIC:
+        return decode_block(raw)
+    if raw[:4] != CONTAINER_MAGIC:
+        raise ValueError("Not an encoded egram channel")
+
+    _, _, blocks = CONTAINER_HEAD.unpack_from(raw)
+    parts = []
+    for i in range(blocks):
+        _, _, offset, length = BLOCK_ENTRY.unpack_from(raw, CONTAINER_HEAD.size + i * BLOCK_ENTRY.size)
+        parts.append(decode_block(raw[offset:offset + length]))
+    return join_blocks(parts)
+
+
+def iter_blocks(f):
+    # (timestamps, values) one block at a time from an open channel file
+    f.seek(0)
+    if f.read(4) == MAGIC:
+        f.seek(0)
+        yield decode_block(f.read())
+        return
+
+    for _, _, offset, length in read_block_table(f):
+        f.seek(offset)
+        yield decode_block(f.read(length))
+
+
+def decode_range(f, t_start, t_end):
+    # samples with t_start <= t <= t_end from an open channel file; timestamps
+    # are sorted, so the block table is binary searched and only the
+    # overlapping blocks are read and decoded
+    f.seek(0)
+    if f.read(4) == MAGIC:
+        f.seek(0)
+        t, values = decode_block(f.read())
+    else:
+        table = read_block_table(f)
+        first = bisect.bisect_left(table, t_start, key=lambda e: e[1])
+        last = bisect.bisect_right(table, t_end, key=lambda e: e[0])
+
+        parts = []
+        for _, _, offset, length in table[first:last]:
+            f.seek(offset)
+            parts.append(decode_block(f.read(length)))
+        t, values = join_blocks(parts)
+
+    lo = np.searchsorted(t, t_start, side="left")
+    hi = np.searchsorted(t, t_end, side="right")
+    return t[lo:hi], values[lo:hi]
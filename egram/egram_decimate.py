@@ -0,0 +1,75 @@
+# -----------------------------------------------------------------------------
+# EGRAM TRACE DECIMATION
+# Cuts a trace down to what the screen can show: one min/max pair per pixel
+# column (about 2x the axis width in points), so QRS peaks are never lost
+# buckets are fixed-width slices of absolute time, so as the window scrolls
+# earlier buckets keep their values; a Decimator caches them and only
+# computes buckets for samples that arrived since the last frame
+# -----------------------------------------------------------------------------
+
+import numpy as np
+
+from egram.egram_pyramid import envelope_xy
+
+
+def minmax_buckets(t, values, width):
+    # (bucket index, min, max) of every bucket touched by t; NaN is skipped
+    index = np.floor(t / width).astype(np.int64)
+    starts = np.flatnonzero(np.diff(index)) + 1
+    starts = np.concatenate([[0], starts])
+    return index[starts], np.fmin.reduceat(values, starts), np.fmax.reduceat(values, starts)
+
+
+class Decimator:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.width = None
+
+        # finished buckets (index, min, max), oldest first
+        self.index = np.zeros(0, dtype=np.int64)
+        self.lo = np.zeros(0)
+        self.hi = np.zeros(0)
+
+        # first bucket that may still receive samples, and the newest
+        # timestamp seen (a smaller one means the buffer was reset)
+        self.open_bucket = None
+        self.last_t = None
+
+    def update(self, t, values, t_start, t_end, columns):
+        # decimated (xs, ys) of a trace drawn over t_start..t_end on `columns`
+        # pixels; short traces are passed through untouched
+        t = np.asarray(t, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(t) <= 2 * columns or t_end <= t_start:
+            self.clear()
+            return t, values
+
+        width = (t_end - t_start) / columns
+        if width != self.width or (self.last_t is not None and t[-1] < self.last_t):
+            self.clear()
+            self.width = width
+
+        # only samples from the first unfinished bucket onwards are new work
+        first = 0
+        if self.open_bucket is not None:
+            first = np.searchsorted(t, self.open_bucket * width, side="left")
+        index, lo, hi = minmax_buckets(t[first:], values[first:], width)
+
+        # everything but the newest bucket is final
+        self.index = np.concatenate([self.index, index[:-1]])
+        self.lo = np.concatenate([self.lo, lo[:-1]])
+        self.hi = np.concatenate([self.hi, hi[:-1]])
+        self.open_bucket = index[-1]
+        self.last_t = t[-1]
+
+        # forget buckets that scrolled out of the window
+        keep = np.searchsorted(self.index, np.floor(t[0] / width), side="left")
+        if keep:
+            self.index = self.index[keep:]
+            self.lo = self.lo[keep:]
+            self.hi = self.hi[keep:]
+
+        centers = (np.concatenate([self.index, index[-1:]]) + 0.5) * width
+        return envelope_xy(centers, np.concatenate([self.lo, lo[-1:]]), np.concatenate([self.hi, hi[-1:]]))
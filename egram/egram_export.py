@@ -0,0 +1,303 @@
+# -----------------------------------------------------------------------------
+# EGRAM EXPORT
+# Streams a recorded session to files for analysis tools
+#   csv  - <session>.csv (channel, t_ms, value_mv) + <session>_markers.csv
+#   bin  - <session>.egx, JSON header followed by raw little-endian records
+#   edf  - <session>.edf, EDF-style 16-bit signal file + <session>_markers.csv
+# samples are written as recorded, or high-pass filtered with --high-pass
+# channels are read chunk by chunk, memory use does not grow with the
+# length of the recording; export_sessions spreads many sessions over a
+# process pool
+#
+# usage (from the project folder):
+#     python -m egram.egram_export EGRAM_1234ABCD [...] --format edf --out exports [--high-pass]
+# -----------------------------------------------------------------------------
+
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from egram import egram_storage
+from egram.egram_filter import HPF_CUTOFF_HZ, filter_records
+from egram.egram_segments import CHANNELS, SAMPLE_DTYPE
+
+EXPORT_FORMATS = ["csv", "bin", "edf"]
+CHUNK_SIZE = 8192
+
+# binary export: magic + length of the JSON header that follows
+EXPORT_MAGIC = b"EGX1"
+EXPORT_HEAD = struct.Struct("<4sI")
+
+# EDF-style signal scaling: digital = value_mv * 10 (device counts), the
+# lowest digital value marks a missing / padded sample
+EDF_DIGITAL_MIN = -32768
+EDF_DIGITAL_MAX = 32767
+EDF_SCALE = 10.0
+EDF_LABELS = {"atrial": "Atrial EGM", "ventricular": "Ventricular EGM", "surface": "Surface ECG"}
+
+
+# -----------------------------------------------------------------------------
+# helpers
+# -----------------------------------------------------------------------------
+def format_number(x):
+    if math.isnan(x):
+        return ""
+    if x.is_integer():
+        return str(int(x))
+    return repr(x)
+
+
+def session_meta(session):
+    return {
+        "session_id": session["session_id"],
+        "patient_id": session["patient_id"],
+        "start_time": session["start_time"],
+        "end_time": session["end_time"],
+        "settings": session["settings"]
+    }
+
+
+def channel_chunks(session, channel, chunk_size, high_pass=False):
+    chunks = egram_storage.iter_channel_chunks(session["session_id"], channel, chunk_size)
+    if high_pass:
+        rate = session["settings"].get("sampling_rate_hz", 500)
+        chunks = filter_records(chunks, rate)
+    return chunks
+
+
+def write_markers_csv(session, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["timestamp_ms", "channel", "abbr", "modifier"])
+        for m in session["markers"]:
+            writer.writerow([m.get("timestamp_ms"), m.get("channel"), m.get("abbr"), m.get("modifier")])
+
+
+# -----------------------------------------------------------------------------
+# CSV
+# -----------------------------------------------------------------------------
+def write_csv(session, path, chunk_size=CHUNK_SIZE, high_pass=False):
+    with open(path, "w", newline="") as f:
+        f.write("channel,t_ms,value_mv\n")
+        for channel in CHANNELS:
+            for records in channel_chunks(session, channel, chunk_size, high_pass):
+                lines = []
+                for t, value in zip(records["t"].tolist(), records["value"].tolist()):
+                    lines.append(f"{channel},{format_number(t)},{format_number(value)}\n")
+                f.write("".join(lines))
+
+
+# -----------------------------------------------------------------------------
+# compact binary
+# -----------------------------------------------------------------------------
+def write_binary(session, path, chunk_size=CHUNK_SIZE, high_pass=False):
+    session_id = session["session_id"]
+    channels = []
+    for channel in CHANNELS:
+        channels.append({"name": channel, "count": egram_storage.get_sample_count(session_id, channel)})
+
+    header = json.dumps({
+        "session": session_meta(session),
+        "record_dtype": "<f8 t_ms, <f8 value_mv",
+        "high_pass_hz": HPF_CUTOFF_HZ if high_pass else None,
+        "channels": channels,
+        "markers": session["markers"]
+    }).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(EXPORT_HEAD.pack(EXPORT_MAGIC, len(header)))
+        f.write(header)
+        for info in channels:
+            written = 0
+            for records in channel_chunks(session, info["name"], chunk_size, high_pass):
+                # never write more than the header promised (samples may
+                # still be arriving for an unfinished session)
+                records = records[:info["count"] - written]
+                f.write(np.ascontiguousarray(records, dtype=SAMPLE_DTYPE).tobytes())
+                written += len(records)
+                if written >= info["count"]:
+                    break
+
+
+def read_binary(path):
+    # (header dict, {channel: record array}) of a binary export
+    with open(path, "rb") as f:
+        magic, length = EXPORT_HEAD.unpack(f.read(EXPORT_HEAD.size))
+        if magic != EXPORT_MAGIC:
+            raise ValueError("Not an egram export")
+        header = json.loads(f.read(length).decode("utf-8"))
+
+        channels = {}
+        for info in header["channels"]:
+            raw = f.read(info["count"] * SAMPLE_DTYPE.itemsize)
+            channels[info["name"]] = np.frombuffer(raw, dtype=SAMPLE_DTYPE)
+    return header, channels
+
+
+# -----------------------------------------------------------------------------
+# EDF-style
+# fixed 1 s data records of int16 samples at the session sampling rate;
+# samples are placed in recorded order and short channels are padded
+# -----------------------------------------------------------------------------
+def fixed_blocks(chunks, size, count):
+    # re-cut a stream of record chunks into `count` arrays of `size` values
+    pending = np.zeros(0)
+    for _ in range(count):
+        while len(pending) < size:
+            records = next(chunks, None)
+            if records is None:
+                break
+            pending = np.concatenate([pending, records["value"]])
+
+        block = np.full(size, np.nan)
+        block[:min(size, len(pending))] = pending[:size]
+        pending = pending[size:]
+        yield block
+
+
+def to_digital(values):
+    digital = np.round(values * EDF_SCALE)
+    digital = np.clip(digital, EDF_DIGITAL_MIN + 1, EDF_DIGITAL_MAX)
+    digital[np.isnan(values)] = EDF_DIGITAL_MIN
+    return digital.astype("<i2")
+
+
+def edf_field(value, width):
+    return str(value)[:width].ljust(width).encode("ascii", "replace")
+
+
+def edf_start(session):
+    try:
+        start = datetime.fromisoformat(str(session["start_time"]).replace("Z", "+00:00"))
+    except ValueError:
+        start = datetime(1985, 1, 1)
+    return start.strftime("%d.%m.%y"), start.strftime("%H.%M.%S")
+
+
+def write_edf(session, path, chunk_size=CHUNK_SIZE, high_pass=False):
+    session_id = session["session_id"]
+    rate = int(session["settings"].get("sampling_rate_hz", 500))
+
+    counts = {}
+    for channel in CHANNELS:
+        counts[channel] = egram_storage.get_sample_count(session_id, channel)
+    signals = [c for c in CHANNELS if counts[c] > 0]
+    records = max([-(-counts[c] // rate) for c in signals] or [0])
+
+    start_date, start_time = edf_start(session)
+    physical_min = (EDF_DIGITAL_MIN + 1) / EDF_SCALE
+    physical_max = EDF_DIGITAL_MAX / EDF_SCALE
+
+    head = b"".join([
+        edf_field("0", 8),
+        edf_field(session.get("patient_id") or "X", 80),
+        edf_field(f"Startdate {session_id} DCM egram", 80),
+        edf_field(start_date, 8),
+        edf_field(start_time, 8),
+        edf_field(256 + 256 * len(signals), 8),
+        edf_field("", 44),
+        edf_field(records, 8),
+        edf_field(1, 8),
+        edf_field(len(signals), 4)
+    ])
+    fields = [
+        (lambda c: EDF_LABELS[c], 16),
+        (lambda c: "pacemaker lead", 80),
+        (lambda c: "mV", 8),
+        (lambda c: physical_min, 8),
+        (lambda c: physical_max, 8),
+        (lambda c: EDF_DIGITAL_MIN + 1, 8),
+        (lambda c: EDF_DIGITAL_MAX, 8),
+        (lambda c: f"HP:{HPF_CUTOFF_HZ}Hz" if high_pass else "", 80),
+        (lambda c: rate, 8),
+        (lambda c: "", 32)
+    ]
+    for make, width in fields:
+        head += b"".join(edf_field(make(c), width) for c in signals)
+
+    with open(path, "wb") as f:
+        f.write(head)
+
+        streams = []
+        for channel in signals:
+            chunks = channel_chunks(session, channel, chunk_size, high_pass)
+            streams.append(fixed_blocks(chunks, rate, records))
+
+        for _ in range(records):
+            for stream in streams:
+                f.write(to_digital(next(stream)).tobytes())
+
+
+# -----------------------------------------------------------------------------
+# entry points
+# -----------------------------------------------------------------------------
+def export_session(session_id, out_dir, fmt="csv", chunk_size=CHUNK_SIZE, high_pass=False):
+    # returns the paths written
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("Invalid export format")
+
+    session = egram_storage.get_session(session_id)
+    if session is None:
+        raise ValueError("Session not found")
+
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, session_id)
+
+    if fmt == "csv":
+        write_csv(session, base + ".csv", chunk_size, high_pass)
+        write_markers_csv(session, base + "_markers.csv")
+        return [base + ".csv", base + "_markers.csv"]
+
+    if fmt == "bin":
+        write_binary(session, base + ".egx", chunk_size, high_pass)
+        return [base + ".egx"]
+
+    write_edf(session, base + ".edf", chunk_size, high_pass)
+    write_markers_csv(session, base + "_markers.csv")
+    return [base + ".edf", base + "_markers.csv"]
+
+
+def export_sessions(session_ids, out_dir, fmt="csv", workers=None, high_pass=False):
+    # bulk export, one session per worker process; returns {session_id: paths}
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("Invalid export format")
+
+    # workers only read; a process that owns the writer makes its pending
+    # writes visible and the index current first
+    if egram_storage.flush_pending():
+        egram_storage.get_index()
+
+    results = {}
+    with egram_storage.worker_pool(workers) as pool:
+        jobs = [pool.submit(export_session, sid, out_dir, fmt, CHUNK_SIZE, high_pass) for sid in session_ids]
+        for session_id, job in zip(session_ids, jobs):
+            results[session_id] = job.result()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export recorded egram sessions.")
+    parser.add_argument("session_ids", nargs="+")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--high-pass", action="store_true", help="high-pass filter all channels")
+    args = parser.parse_args(argv)
+
+    # the app may be recording: leave its journal and index files alone
+    egram_storage.set_read_only()
+    results = export_sessions(args.session_ids, args.out, args.format, args.workers, args.high_pass)
+    for session_id, paths in results.items():
+        print(f"[EXPORT] {session_id}: {', '.join(paths)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# -----------------------------------------------------------------------------
+# EGRAM HIGH-PASS FILTER
+# Streaming 2nd order (biquad) IIR high-pass for EGM / ECG channels
+# each HighPassFilter keeps its state between blocks, so packets can be fed
+# one batch at a time and the output is the same as filtering in one go
+#
+# blocks are processed without a per-sample Python loop: with the biquad
+# written as a 2-state system (A, B, C, D) a block of n samples is
+#     y = conv(u, h)[:n] + C A^k s        (h = impulse response)
+#     s' = A^n s + sum A^(n-1-k) B u[k]
+# the powers of A are precomputed per (rate, cutoff) and cached
+# -----------------------------------------------------------------------------
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+HPF_CUTOFF_HZ = 0.5
+HPF_Q = 1 / math.sqrt(2)   # Butterworth
+
+# longest block handled in one step, longer batches are split
+FILTER_BLOCK = 256
+
+
+@lru_cache(maxsize=None)
+def highpass_coefficients(sampling_rate_hz, cutoff_hz=HPF_CUTOFF_HZ, q=HPF_Q):
+    # RBJ cookbook high-pass, normalized so a0 = 1: (b0, b1, b2), (a1, a2)
+    w0 = 2 * math.pi * cutoff_hz / sampling_rate_hz
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    a0 = 1 + alpha
+
+    b = ((1 + cos_w0) / 2 / a0, -(1 + cos_w0) / a0, (1 + cos_w0) / 2 / a0)
+    a = (-2 * cos_w0 / a0, (1 - alpha) / a0)
+    return b, a
+
+
+@lru_cache(maxsize=None)
+def block_kernel(sampling_rate_hz, cutoff_hz=HPF_CUTOFF_HZ, q=HPF_Q):
+    # impulse response h[0..FILTER_BLOCK), first rows of A^k and A^k B
+    (b0, b1, b2), (a1, a2) = highpass_coefficients(sampling_rate_hz, cutoff_hz, q)
+    A = np.array([[-a1, 1.0], [-a2, 0.0]])
+    B = np.array([b1 - a1 * b0, b2 - a2 * b0])
+
+    powers = np.empty((FILTER_BLOCK + 1, 2, 2))
+    powers[0] = np.eye(2)
+    for k in range(FILTER_BLOCK):
+        powers[k + 1] = A @ powers[k]
+
+    # A^k B for k = 0..FILTER_BLOCK-1
+    responses = powers[:FILTER_BLOCK] @ B
+
+    impulse = np.empty(FILTER_BLOCK)
+    impulse[0] = b0
+    impulse[1:] = responses[:-1, 0]
+    return impulse, powers, responses
+
+
+class HighPassFilter:
+    def __init__(self, sampling_rate_hz=500, cutoff_hz=HPF_CUTOFF_HZ):
+        self.sampling_rate_hz = sampling_rate_hz
+        self.cutoff_hz = cutoff_hz
+        self.kernel = block_kernel(sampling_rate_hz, cutoff_hz)
+
+        # transposed direct form II state, None until the first sample
+        self.state = None
+        self.last_value = 0.0
+
+    def reset(self):
+        self.state = None
+        self.last_value = 0.0
+
+    def prime(self, value):
+        # steady state for a constant input: output starts at 0 instead of
+        # ringing on the DC offset of the first sample
+        (b0, _, b2), _ = highpass_coefficients(self.sampling_rate_hz, self.cutoff_hz)
+        self.state = np.array([-b0 * value, b2 * value])
+
+    def process(self, values):
+        # filtered copy of values; missing (NaN) samples stay NaN, the filter
+        # holds the last valid input across them
+        u = np.array(values, dtype=np.float64)
+        if len(u) == 0:
+            return u
+
+        missing = np.isnan(u)
+        if missing.any():
+            if missing[0]:
+                # before the first sample, start from the first valid one
+                first = np.flatnonzero(~missing)
+                if self.state is None and len(first):
+                    u[0] = u[first[0]]
+                else:
+                    u[0] = self.last_value
+            valid = np.where(missing, 0, np.arange(len(u)))
+            u = u[np.maximum.accumulate(valid)]
+        self.last_value = u[-1]
+
+        if self.state is None:
+            self.prime(u[0])
+
+        impulse, powers, responses = self.kernel
+        y = np.empty(len(u))
+        for start in range(0, len(u), FILTER_BLOCK):
+            block = u[start:start + FILTER_BLOCK]
+            n = len(block)
+
+            y[start:start + n] = np.convolve(block, impulse[:n])[:n] + powers[:n, 0, :] @ self.state
+            self.state = powers[n] @ self.state + block @ responses[n - 1::-1]
+
+        y[missing] = np.nan
+        return y
+
+
+def filter_values(values, sampling_rate_hz=500, cutoff_hz=HPF_CUTOFF_HZ):
+    # one-shot filtering of a whole recording
+    return HighPassFilter(sampling_rate_hz, cutoff_hz).process(values)
+
+
+def filter_records(chunks, sampling_rate_hz=500, cutoff_hz=HPF_CUTOFF_HZ):
+    # stream of (t, value) record chunks -> filtered copies, state carried
+    # across chunks (egram_storage.iter_channel_chunks)
+    hpf = HighPassFilter(sampling_rate_hz, cutoff_hz)
+    for records in chunks:
+        out = records.copy()
+        out["value"] = hpf.process(records["value"])
+        yield out
@@ -0,0 +1,102 @@
+# -----------------------------------------------------------------------------
+# EGRAM PACKET FRAMER
+# Splits the serial byte stream into fixed-size telemetry frames
+# frames start with the 0xAA 0x22 sync word; garbage between frames is
+# skipped with bytes.find instead of byte by byte, and consumed bytes are
+# only cut off the front of the buffer once in a while, so framing stays
+# linear in the number of bytes received even on a noisy link
+# -----------------------------------------------------------------------------
+
+import time
+
+SYNC_WORD = b"\xAA\x22"
+FRAME_SIZE = 20
+
+# drop consumed bytes from the buffer once this many have piled up
+COMPACT_BYTES = 4096
+
+
+class PacketFramer:
+    def __init__(self, frame_size=FRAME_SIZE, sync=SYNC_WORD, compact_bytes=COMPACT_BYTES):
+        self.frame_size = frame_size
+        self.sync = sync
+        self.compact_bytes = compact_bytes
+
+        self.buffer = bytearray()
+        self.pos = 0
+
+        # stats
+        self.bytes_received = 0
+        self.frames = 0
+        self.resyncs = 0
+        self.discarded_bytes = 0
+        self.fps = 0.0
+        self.rate_time = time.monotonic()
+        self.rate_frames = 0
+
+    def feed(self, data):
+        # append received bytes, return the complete frames (bytes) found
+        self.buffer += data
+        self.bytes_received += len(data)
+
+        frames = []
+        buf = self.buffer
+        pos = self.pos
+        size = self.frame_size
+        sync = self.sync
+        end = len(buf)
+
+        with memoryview(buf) as view:
+            while end - pos >= size:
+                if buf.startswith(sync, pos):
+                    frames.append(bytes(view[pos:pos + size]))
+                    pos += size
+                    continue
+
+                # out of sync: jump to the next sync word
+                self.resyncs += 1
+                found = buf.find(sync, pos + 1)
+                if found == -1:
+                    # keep a trailing partial sync word for the next read
+                    keep = end
+                    for n in range(len(sync) - 1, 0, -1):
+                        if end - n > pos and buf.endswith(sync[:n]):
+                            keep = end - n
+                            break
+                    self.discarded_bytes += keep - pos
+                    pos = keep
+                    break
+
+                self.discarded_bytes += found - pos
+                pos = found
+
+        self.pos = pos
+        if pos >= self.compact_bytes or pos == end:
+            del buf[:pos]
+            self.pos = 0
+
+        self.frames += len(frames)
+        self.update_rate()
+        return frames
+
+    def update_rate(self):
+        now = time.monotonic()
+        elapsed = now - self.rate_time
+        if elapsed >= 1.0:
+            self.fps = (self.frames - self.rate_frames) / elapsed
+            self.rate_time = now
+            self.rate_frames = self.frames
+
+    def reset(self):
+        self.buffer = bytearray()
+        self.pos = 0
+
+    def stats(self):
+        return {
+            "bytes_received": self.bytes_received,
+            "frames": self.frames,
+            "resyncs": self.resyncs,
+            "discarded_bytes": self.discarded_bytes,
+            "frames_per_second": self.fps,
+            "buffered_bytes": len(self.buffer) - self.pos
+        }
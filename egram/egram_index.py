@@ -0,0 +1,232 @@
+# -----------------------------------------------------------------------------
+# EGRAM SESSION INDEX
+# Small persisted table of session headers (no samples)
+# lets lookups by session or patient skip the sample payloads entirely
+# -----------------------------------------------------------------------------
+
+import json
+import os
+
+from egram.egram_segments import CHANNELS
+
+# index file name inside the segment store folder
+INDEX_NAME = "index.json"
+
+
+# -----------------------------------------------------------------------------
+# build an index entry from a session header
+# -----------------------------------------------------------------------------
+def make_entry(header, sample_counts=None, byte_offsets=None, legacy=False):
+    if sample_counts is None:
+        sample_counts = {}
+    if byte_offsets is None:
+        byte_offsets = {}
+
+    counts = {}
+    offsets = {}
+    for channel in CHANNELS:
+        counts[channel] = sample_counts.get(channel, 0)
+        # end of the compact file and of the raw segment at the last sync
+        offsets[channel] = byte_offsets.get(channel, {"compact": 0, "segment": 0})
+
+    return {
+        "session_id": header["session_id"],
+        "patient_id": header.get("patient_id"),
+        "start_time": header.get("start_time"),
+        "end_time": header.get("end_time"),
+        "settings": header.get("settings", {}),
+        "sample_counts": counts,
+        "byte_offsets": offsets,
+        "legacy": legacy
+    }
+
+
+def entry_for_store_session(store, header):
+    counts = {}
+    offsets = {}
+    for channel in CHANNELS:
+        counts[channel] = store.sample_count(header["session_id"], channel)
+        offsets[channel] = store.file_sizes(header["session_id"], channel)
+    return make_entry(header, counts, offsets)
+
+
+def entry_for_legacy_session(session):
+    counts = {}
+    for channel, info in session.get("channels", {}).items():
+        counts[channel] = len(info.get("samples", []))
+    return make_entry(session, counts, legacy=True)
+
+
+# -----------------------------------------------------------------------------
+# JSON-backed index
+# only the storage writer thread updates it; entries and per-patient lists are
+# replaced rather than edited so readers on other threads need no lock
+# -----------------------------------------------------------------------------
+class SessionIndex:
+    # markers and the telemetry log stay in the per-session JSON-lines files
+    owns_logs = False
+
+    def __init__(self, path, load=True):
+        self.path = path
+        self.entries = {}
+        self.by_patient = {}
+
+        # (mtime, size) of the legacy egram.json the legacy entries came from
+        self.legacy_stamp = None
+
+        self.loaded = self.load() if load else False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except ValueError:
+            # a damaged index is just a cache, caller rebuilds it
+            return False
+
+        self.entries = data.get("sessions", {})
+        stamp = data.get("legacy_stamp")
+        self.legacy_stamp = tuple(stamp) if stamp else None
+        self.rebuild_patient_map()
+        return True
+
+    def save(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        data = {
+            "legacy_stamp": list(self.legacy_stamp) if self.legacy_stamp else None,
+            "sessions": self.entries
+        }
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def rebuild_patient_map(self):
+        by_patient = {}
+        for entry in self.entries.values():
+            by_patient.setdefault(entry.get("patient_id"), []).append(entry["session_id"])
+        self.by_patient = by_patient
+
+    # ---- lookups -------------------------------------------------------------
+    def get(self, session_id):
+        return self.entries.get(session_id)
+
+    def all_entries(self):
+        return sorted(self.entries.values(), key=lambda e: e.get("start_time") or "")
+
+    def for_patient(self, patient_id):
+        entries = self.entries
+        out = []
+        for session_id in self.by_patient.get(patient_id, []):
+            if session_id in entries:
+                out.append(entries[session_id])
+        out.sort(key=lambda e: e.get("start_time") or "")
+        return out
+
+    # ---- updates -------------------------------------------------------------
+    def put(self, entry, save=True):
+        # copy-on-write: readers iterating the old dicts are not disturbed
+        session_id = entry["session_id"]
+        old = self.entries.get(session_id)
+        by_patient = dict(self.by_patient)
+        if old is not None and old.get("patient_id") != entry.get("patient_id"):
+            ids = by_patient[old.get("patient_id")]
+            by_patient[old.get("patient_id")] = [i for i in ids if i != session_id]
+            old = None
+
+        entries = dict(self.entries)
+        entries[session_id] = entry
+        if old is None:
+            patient_id = entry.get("patient_id")
+            by_patient[patient_id] = by_patient.get(patient_id, []) + [session_id]
+
+        self.entries = entries
+        self.by_patient = by_patient
+        if save:
+            self.save()
+
+    def replace_legacy(self, legacy_entries, stamp, save=True):
+        # drop legacy entries that disappeared, keep store entries untouched
+        entries = {}
+        for session_id, entry in self.entries.items():
+            if not entry.get("legacy"):
+                entries[session_id] = entry
+
+        for entry in legacy_entries:
+            if entry["session_id"] not in entries:
+                entries[entry["session_id"]] = entry
+
+        self.entries = entries
+        self.legacy_stamp = stamp
+        self.rebuild_patient_map()
+        if save:
+            self.save()
+
+
+# -----------------------------------------------------------------------------
+# SQLite-backed index (helper/sqlite_store.py)
+# same interface as SessionIndex; also keeps a copy of markers and the
+# telemetry log indexed by session and timestamp and answers reads from it;
+# the per-session JSON-lines files stay the record the copy is rebuilt from
+# -----------------------------------------------------------------------------
+class SqliteSessionIndex:
+    owns_logs = True
+
+    def __init__(self, db):
+        self.db = db
+        self.loaded = bool(db.get_meta("egram_index_built", False))
+
+    @property
+    def legacy_stamp(self):
+        stamp = self.db.get_meta("egram_legacy_stamp")
+        return tuple(stamp) if stamp else None
+
+    def save(self):
+        # every change is committed as it happens, just remember the build
+        self.db.set_meta("egram_index_built", True)
+        self.loaded = True
+
+    # ---- lookups -------------------------------------------------------------
+    def get(self, session_id):
+        return self.db.get_session_entry(session_id)
+
+    def all_entries(self):
+        return self.db.session_entries()
+
+    def for_patient(self, patient_id):
+        return self.db.session_entries(patient_id)
+
+    # ---- updates -------------------------------------------------------------
+    def put(self, entry, save=True):
+        self.db.put_session_entries([entry])
+
+    def replace_legacy(self, legacy_entries, stamp, save=True):
+        self.db.replace_legacy_sessions(legacy_entries)
+        self.db.set_meta("egram_legacy_stamp", list(stamp) if stamp else None)
+
+    # ---- markers / telemetry log ---------------------------------------------
+    def append_marker(self, session_id, marker):
+        self.db.append_markers(session_id, [marker])
+
+    def read_markers(self, session_id):
+        return self.db.read_markers(session_id)
+
+    def read_markers_range(self, session_id, t_start, t_end):
+        return self.db.read_markers_range(session_id, t_start, t_end)
+
+    def append_status(self, session_id, entry):
+        self.db.append_status(session_id, [entry])
+
+    def read_status(self, session_id):
+        return self.db.read_status(session_id)
+
+    def import_logs(self, session_id, markers, status):
+        # replaces the session's copy, so importing again never duplicates
+        self.db.replace_logs(session_id, markers, status)
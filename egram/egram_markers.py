@@ -0,0 +1,88 @@
+# -----------------------------------------------------------------------------
+# EGRAM PLOT MARKERS
+# MarkerTrack - markers of one channel, sorted by timestamp, so the ones in
+#               view are found by bisection; markers older than the
+#               retention span are dropped as time moves on
+# MarkerPool  - text artists of one axes, reused from frame to frame; only
+#               markers inside the visible window get one
+# -----------------------------------------------------------------------------
+
+from bisect import bisect_left, bisect_right
+
+# how far back markers are kept in memory, on top of the display window
+MARKER_HISTORY_MS = 60 * 1000
+
+MARKER_COLOR = "red"
+MARKER_FONT_SIZE = 8
+
+
+class MarkerTrack:
+    def __init__(self, retain_ms):
+        self.retain_ms = retain_ms
+        self.times = []
+        self.labels = []
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, t, label):
+        if not self.times or t >= self.times[-1]:
+            self.times.append(t)
+            self.labels.append(label)
+            return
+
+        # late marker, keep the lists sorted
+        i = bisect_right(self.times, t)
+        self.times.insert(i, t)
+        self.labels.insert(i, label)
+
+    def visible(self, t_start, t_end):
+        lo = bisect_left(self.times, t_start)
+        hi = bisect_right(self.times, t_end)
+        return self.times[lo:hi], self.labels[lo:hi]
+
+    def prune(self, latest_t):
+        cut = bisect_left(self.times, latest_t - self.retain_ms)
+        if cut:
+            del self.times[:cut]
+            del self.labels[:cut]
+
+    def clear(self):
+        self.times = []
+        self.labels = []
+
+
+class MarkerPool:
+    def __init__(self, ax):
+        self.ax = ax
+        self.texts = []
+        self.count = 0
+        self.animated = False
+
+    def show(self, times, labels):
+        # reuse (or grow) the pool for these markers, hide the rest
+        for i, (t, label) in enumerate(zip(times, labels)):
+            if i == len(self.texts):
+                text = self.ax.text(0, 0, "", fontsize=MARKER_FONT_SIZE, color=MARKER_COLOR, clip_on=True)
+                text.set_animated(self.animated)
+                self.texts.append(text)
+
+            text = self.texts[i]
+            text.set_position((t, 0))
+            text.set_text(label)
+            text.set_visible(True)
+
+        for text in self.texts[len(times):self.count]:
+            text.set_visible(False)
+        self.count = len(times)
+
+    def hide(self):
+        self.show([], [])
+
+    def set_animated(self, animated):
+        self.animated = animated
+        for text in self.texts:
+            text.set_animated(animated)
+
+    def visible_texts(self):
+        return self.texts[:self.count]
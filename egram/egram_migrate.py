@@ -0,0 +1,258 @@
+# -----------------------------------------------------------------------------
+# EGRAM LEGACY MIGRATION
+# Streaming reader for legacy egram.json files and a one-shot migration into
+# the segment store layout
+#
+# usage (from the project folder):
+#     python -m egram.egram_migrate [data/egram.json] [--dest data/egram]
+# -----------------------------------------------------------------------------
+
+import argparse
+import codecs
+import json
+import os
+import sys
+import time
+
+from egram.egram_segments import SegmentStore, CHANNELS
+from egram.egram_index import SessionIndex, SqliteSessionIndex, INDEX_NAME, entry_for_store_session
+from helper.sqlite_store import SqliteStore
+
+CHUNK_SIZE = 64 * 1024
+CHECKPOINT_NAME = "migrate.checkpoint"
+SESSIONS_KEY = '"egram_sessions"'
+
+_decoder = json.JSONDecoder()
+
+
+# -----------------------------------------------------------------------------
+# streaming reader
+# walks egram_sessions one session at a time; memory stays bounded by the
+# largest single session instead of the whole file
+# -----------------------------------------------------------------------------
+class LegacySessionReader:
+    def __init__(self, path, start_offset=0, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(path) if os.path.exists(path) else 0
+
+        # byte offset just after the last session returned (resume point)
+        self.offset = start_offset
+        self.start_offset = start_offset
+
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self.start_offset)
+            yield from self.read_sessions(f)
+
+    def read_sessions(self, f):
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        eof = False
+
+        def read_more(size):
+            nonlocal buffer, eof
+            raw = f.read(size)
+            if not raw:
+                eof = True
+            buffer += decoder.decode(raw, final=eof)
+
+        # a fresh read starts at the top of the file, find the array first;
+        # a resumed read starts right after a session inside the array
+        if self.start_offset == 0:
+            while True:
+                key = buffer.find(SESSIONS_KEY)
+                bracket = buffer.find("[", key) if key >= 0 else -1
+                if bracket >= 0:
+                    self.offset += len(buffer[:bracket + 1].encode("utf-8"))
+                    buffer = buffer[bracket + 1:]
+                    break
+                if eof:
+                    return
+                read_more(self.chunk_size)
+
+        want = self.chunk_size
+        while True:
+            # skip separators between sessions
+            pos = 0
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos:
+                self.offset += len(buffer[:pos].encode("utf-8"))
+                buffer = buffer[pos:]
+
+            if not buffer:
+                if eof:
+                    return
+                read_more(self.chunk_size)
+                continue
+
+            if buffer[0] == "]":
+                return
+
+            try:
+                session, end = _decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+                # session spans past the buffer; grow reads geometrically so a
+                # large session is re-scanned O(log n) times, not O(n)
+                read_more(want)
+                want = max(want, len(buffer))
+                continue
+
+            want = self.chunk_size
+            self.offset += len(buffer[:end].encode("utf-8"))
+            buffer = buffer[end:]
+            yield session
+
+
+def iter_legacy_sessions(path):
+    return iter(LegacySessionReader(path))
+
+
+# -----------------------------------------------------------------------------
+# checkpoint helpers
+# -----------------------------------------------------------------------------
+def source_stamp(path):
+    info = os.stat(path)
+    return [os.path.abspath(path), info.st_size, info.st_mtime_ns]
+
+
+def load_checkpoint(path, stamp):
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except ValueError:
+        return 0
+    if data.get("source") != stamp:
+        return 0
+    return data.get("offset", 0)
+
+
+def save_checkpoint(path, stamp, offset):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"source": stamp, "offset": offset}, f)
+    os.replace(tmp_path, path)
+
+
+# -----------------------------------------------------------------------------
+# migration
+# -----------------------------------------------------------------------------
+def print_progress(stats):
+    print(
+        f"[MIGRATE] {stats['migrated']} migrated, {stats['skipped']} skipped, "
+        f"{stats['samples']} samples, {stats['percent']:.1f}% "
+        f"({stats['mb_per_s']:.2f} MB/s, {stats['samples_per_s']:.0f} samples/s)"
+    )
+
+
+def migrate_legacy_file(legacy_path, root, progress=print_progress, report_every=1.0, compact=True, index=None):
+    # sessions already in the store are skipped and a checkpoint of the read
+    # position is kept, so an interrupted migration can simply be run again
+    store = SegmentStore(root)
+    os.makedirs(root, exist_ok=True)
+    if index is None:
+        index = SessionIndex(os.path.join(root, INDEX_NAME))
+    checkpoint_path = os.path.join(root, CHECKPOINT_NAME)
+
+    stats = {
+        "migrated": 0,
+        "skipped": 0,
+        "samples": 0,
+        "bytes": 0,
+        "percent": 100.0,
+        "seconds": 0.0,
+        "mb_per_s": 0.0,
+        "samples_per_s": 0.0
+    }
+    if not os.path.exists(legacy_path):
+        return stats
+
+    stamp = source_stamp(legacy_path)
+    reader = LegacySessionReader(legacy_path, load_checkpoint(checkpoint_path, stamp))
+    start = time.perf_counter()
+    last_report = start
+
+    def update_rates():
+        elapsed = time.perf_counter() - start
+        stats["bytes"] = reader.offset - reader.start_offset
+        stats["seconds"] = elapsed
+        stats["percent"] = 100.0 * reader.offset / reader.total_bytes if reader.total_bytes else 100.0
+        if elapsed > 0:
+            stats["mb_per_s"] = stats["bytes"] / elapsed / 1e6
+            stats["samples_per_s"] = stats["samples"] / elapsed
+
+    for session in reader:
+        session_id = session.get("session_id")
+        if store.has_session(session_id):
+            stats["skipped"] += 1
+            # interrupted between writing the session and indexing it
+            if index.get(session_id) is None:
+                index.put(entry_for_store_session(store, store.read_header(session_id)), save=False)
+                if index.owns_logs:
+                    index.import_logs(session_id, session.get("markers", []), session.get("telemetry_status_log", []))
+        else:
+            header = store.import_session(session)
+            if compact and header.get("end_time") is not None:
+                for channel in CHANNELS:
+                    store.compact_channel(session_id, channel)
+            index.put(entry_for_store_session(store, header), save=False)
+            if index.owns_logs:
+                index.import_logs(session_id, session.get("markers", []), session.get("telemetry_status_log", []))
+
+            stats["migrated"] += 1
+            for info in session.get("channels", {}).values():
+                stats["samples"] += len(info.get("samples", []))
+
+        # the index is saved before the checkpoint so a resumed run never
+        # skips a session that is missing from the index
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            index.save()
+            save_checkpoint(checkpoint_path, stamp, reader.offset)
+            update_rates()
+            if progress:
+                progress(stats)
+            last_report = now
+
+    index.save()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    update_rates()
+    stats["percent"] = 100.0
+    if progress:
+        progress(stats)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate a legacy egram.json file into the segment store.")
+    parser.add_argument("legacy_file", nargs="?", default=os.path.join("data", "egram.json"))
+    parser.add_argument("--dest", default=os.path.join("data", "egram"))
+    parser.add_argument("--no-compact", action="store_true", help="keep finished sessions as raw segments")
+    parser.add_argument("--db", help="SQLite database for session metadata instead of index.json")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.legacy_file):
+        print(f"[MIGRATE] {args.legacy_file} not found")
+        return 1
+
+    index = None
+    if args.db:
+        index = SqliteSessionIndex(SqliteStore(args.db))
+
+    stats = migrate_legacy_file(args.legacy_file, args.dest, compact=not args.no_compact, index=index)
+    print(f"[MIGRATE] done in {stats['seconds']:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,26 +4,117 @@
 # Uses matplotlib + helper/egram_utils
 # -----------------------------------------------------------------------------
 
+import numpy as np
 from matplotlib.figure import Figure
-from egram.egram_utils import apply_gain, append_and_trim, format_marker_label
+from egram.egram_utils import format_marker_label, gain_value, samples_to_arrays, scale_values
+from egram.egram_decimate import Decimator
+from egram.egram_filter import HighPassFilter
+from egram.egram_markers import MarkerPool, MarkerTrack, MARKER_HISTORY_MS
+from egram.egram_pyramid import envelope_xy
+from egram.egram_ring import RingBuffer
+from egram.egram_samples import SampleBlock
 
 # color scheme
 BG_COLOR = "#1e1e1e"
 AXIS_LABEL_COLOR = "#ffffff"
 GRID_COLOR = "#444444"
+LINE_COLORS = {"atrial": "cyan", "ventricular": "lime", "surface": "magenta"}
+
+def buffer_latest(buf):
+    # last timestamp of a buffer (ordered oldest -> newest), 0 when empty
+    if isinstance(buf, RingBuffer):
+        return buf.latest_t() if len(buf) else 0
+    if isinstance(buf, tuple):
+        return buf[0][-1] if len(buf[0]) else 0
+    if isinstance(buf, SampleBlock):
+        return buf.t[-1] if len(buf) else 0
+    return buf[-1].get("t", 0) if buf else 0
+
+
+# smallest y-range (mV), so flat or quiet traces don't rescale every frame
+MIN_Y_SPAN = 1.0
+
+# frames the trace must stay small before the y-range shrinks
+SHRINK_FRAMES = 15
+
+
+class YScale:
+    # y-range of one axes: grows at once to fit the trace, shrinks once the
+    # trace has used under a quarter of it for SHRINK_FRAMES frames in a row
+    def __init__(self, ax):
+        self.ax = ax
+        self.small_frames = 0
+        ax.set_ylim(-MIN_Y_SPAN / 2, MIN_Y_SPAN / 2)
+
+    def update(self, ys):
+        # True when the limits changed (blit background is stale)
+        ys = np.asarray(ys, dtype=np.float64)
+        ys = ys[np.isfinite(ys)]
+        if len(ys) == 0:
+            return False
+
+        lo, hi = ys.min(), ys.max()
+        pad = (hi - lo) * 0.1
+        limits = (lo - pad, hi + pad)
+        if hi - lo + 2 * pad < MIN_Y_SPAN:
+            center = (lo + hi) / 2
+            limits = (center - MIN_Y_SPAN / 2, center + MIN_Y_SPAN / 2)
+
+        bottom, top = self.ax.get_ylim()
+        if lo >= bottom and hi <= top:
+            if limits[1] - limits[0] >= 0.25 * (top - bottom):
+                self.small_frames = 0
+                return False
+            self.small_frames += 1
+            if self.small_frames < SHRINK_FRAMES:
+                return False
+
+        self.small_frames = 0
+        if limits == (bottom, top):
+            return False
+        self.ax.set_ylim(*limits)
+        return True
+
 
 class EgramPlot:
-    def __init__(self, window_seconds):
+    def __init__(self, window_seconds, sampling_rate_hz=500, marker_history_ms=MARKER_HISTORY_MS):
         # window size in milliseconds
         self.window_ms = window_seconds * 1000
 
-        # buffers
-        self.atrial_buf = []
-        self.vent_buf = []
-        self.surface_buf = []
+        # span shown instead of window_ms while an overview is loaded
+        self.view_ms = None
+
+        # live buffers: one fixed-size ring per channel holding one window
+        capacity = int(window_seconds * sampling_rate_hz)
+        self.rings = {
+            "atrial": RingBuffer(capacity),
+            "ventricular": RingBuffer(capacity),
+            "surface": RingBuffer(capacity)
+        }
+
+        # high-pass stage per channel; always fed so its state is warm when
+        # the filter is switched on mid-stream
+        self.high_pass = False
+        self.filters = {channel: HighPassFilter(sampling_rate_hz) for channel in self.rings}
+
+        # buffers being drawn: the rings, or (t, values) arrays from load_arrays
+        self.atrial_buf = self.rings["atrial"]
+        self.vent_buf = self.rings["ventricular"]
+        self.surface_buf = self.rings["surface"]
+
+        # traces are reduced to min/max pairs per pixel column before drawing
+        self.decimate = True
+        self.decimators = {channel: Decimator() for channel in self.rings}
+
+        # newest timestamp over all drawn buffers, kept up to date as samples
+        # arrive so redraws don't have to look through the buffers
+        self.latest_t = 0
 
-        # markers
-        self.markers = []
+        # markers per channel, kept for the window plus marker_history_ms
+        self.show_markers = True
+        self.marker_tracks = {
+            channel: MarkerTrack(self.window_ms + marker_history_ms) for channel in self.rings
+        }
 
         # create figure with dark background
         self.fig = Figure(figsize=(7, 5), dpi=100, facecolor=BG_COLOR)
@@ -32,11 +123,24 @@ class EgramPlot:
         self.ax_vent = self.fig.add_subplot(312, facecolor=BG_COLOR)
         self.ax_surface = self.fig.add_subplot(313, facecolor=BG_COLOR)
 
-        self.line_atrial = None
-        self.line_vent = None
-        self.line_surface = None
-
         self.init_axes()
+        self.marker_pools = {channel: MarkerPool(ax) for channel, ax in self.axes().items()}
+        self.y_scales = {channel: YScale(ax) for channel, ax in self.axes().items()}
+
+        # one line per channel for the life of the plot, redraws only swap
+        # their data
+        self.line_atrial, = self.ax_atrial.plot([], [], color=LINE_COLORS["atrial"])
+        self.line_vent, = self.ax_vent.plot([], [], color=LINE_COLORS["ventricular"])
+        self.line_surface, = self.ax_surface.plot([], [], color=LINE_COLORS["surface"])
+
+        # channels on screen and the figure size they were laid out for
+        self.shown = []
+        self.layout_key = None
+
+        # blitting (attach): canvas, cached background without the traces
+        self.canvas = None
+        self.background = None
+        self.draw_cid = None
 
     def init_axes(self):
         for ax, title in zip(
@@ -50,57 +154,140 @@ class EgramPlot:
             ax.grid(True, color=GRID_COLOR)
 
     def reset(self):
-        self.atrial_buf = []
-        self.vent_buf = []
-        self.surface_buf = []
-        self.markers = []
+        self.reset_live()
+        for channel, track in self.marker_tracks.items():
+            track.clear()
+            self.marker_pools[channel].hide()
 
-        for ax in [self.ax_atrial, self.ax_vent, self.ax_surface]:
-            ax.cla()
-            ax.set_facecolor(BG_COLOR)
-
-        self.init_axes()
-        self.line_atrial = None
-        self.line_vent = None
-        self.line_surface = None
+        for line in self.lines().values():
+            line.set_data([], [])
+        self.layout_key = None
 
     def update_samples(self, channel, samples, gain_str):
-        gain_samples = apply_gain(samples, gain_str)
+        t, values = samples_to_arrays(samples)
+        self.update_arrays(channel, t, values, gain_str)
+
+    def update_arrays(self, channel, t, values, gain_str):
+        # batches that are already arrays (e.g. egram_utils.decode_packets);
+        # live data replaces a recorded window loaded with load_arrays
+        if self.view_ms is not None or any(isinstance(b, tuple) for b in self.buffers()):
+            self.reset_live()
+
+        ring = self.rings.get(channel)
+        if ring is None:
+            return
+
+        filtered = self.filters[channel].process(values)
+        if self.high_pass:
+            values = filtered
+        ring.extend(t, scale_values(values, gain_value(gain_str)))
+        if len(ring):
+            self.latest_t = max(self.latest_t, ring.latest_t())
+
+    def set_high_pass(self, enabled):
+        # applies to samples from now on, buffered samples are kept as drawn
+        self.high_pass = bool(enabled)
+
+    def reset_live(self):
+        for channel, ring in self.rings.items():
+            ring.clear()
+            self.filters[channel].reset()
+            self.set_buffer(channel, ring)
+        self.view_ms = None
+
+    def buffers(self):
+        return [self.atrial_buf, self.vent_buf, self.surface_buf]
+
+    def load_arrays(self, channel, t, values, end_ms=None):
+        # show one window of a recorded channel straight from (timestamps, values)
+        # arrays, e.g. egram_storage.get_channel_arrays; slices are views, not copies
+        if end_ms is None:
+            end_ms = t[-1] if len(t) else 0
+
+        lo = np.searchsorted(t, end_ms - self.window_ms, side="left")
+        hi = np.searchsorted(t, end_ms, side="right")
+        self.set_buffer(channel, (t[lo:hi], values[lo:hi]))
+        self.view_ms = None
+
+    def load_overview(self, channel, t, lo, hi):
+        # zoomed-out view from egram_storage.get_channel_overview; each bucket
+        # becomes a min -> max stroke so peaks survive any amount of zooming out
+        xs, ys = envelope_xy(t, lo, hi)
+
+        self.set_buffer(channel, (xs, ys))
+        if len(xs):
+            self.view_ms = max(xs[-1] - xs[0], self.window_ms)
+
+    def set_buffer(self, channel, buf):
         if channel == "atrial":
-            self.atrial_buf = append_and_trim(self.atrial_buf, gain_samples, self.window_ms)
+            self.atrial_buf = buf
         elif channel == "ventricular":
-            self.vent_buf = append_and_trim(self.vent_buf, gain_samples, self.window_ms)
+            self.vent_buf = buf
         elif channel == "surface":
-            self.surface_buf = append_and_trim(self.surface_buf, gain_samples, self.window_ms)
+            self.surface_buf = buf
+
+        # cached buckets belong to the old buffer
+        if channel in self.decimators:
+            self.decimators[channel].clear()
+        self.latest_t = max(buffer_latest(b) for b in self.buffers())
 
     def add_marker(self, marker):
-        self.markers.append(marker)
+        track = self.marker_tracks.get(marker.get("channel"))
+        if track is None:
+            return
+        track.add(marker.get("timestamp_ms", 0), format_marker_label(marker))
+        track.prune(self.latest_t)
 
     def draw_markers(self, ax, channel_name):
-        for marker in self.markers:
-            if marker.get("channel") != channel_name:
-                continue
-            t = marker.get("timestamp_ms", 0)
-            label = format_marker_label(marker)
-            ax.text(t, 0, label, fontsize=8, color="red")
+        # markers inside the x-range of ax, drawn with the channel's pooled
+        # text artists
+        pool = self.marker_pools[channel_name]
+        if not self.show_markers:
+            pool.hide()
+            return
+
+        track = self.marker_tracks[channel_name]
+        track.prune(self.latest_t)
+        left, right = ax.get_xlim()
+        pool.show(*track.visible(left, right))
 
     def buffer_to_xy(self, buf):
+        # array buffers from load_arrays are already split into columns,
+        # rings hand out views of their newest window
+        if isinstance(buf, tuple):
+            return buf
+        if isinstance(buf, RingBuffer):
+            return buf.window(self.window_ms)
+        if isinstance(buf, SampleBlock):
+            return buf.t, buf.values
+
         xs, ys = [], []
         for sample in buf:
             xs.append(sample.get("t", 0))
             ys.append(sample.get("value", 0))
         return xs, ys
 
-    def redraw(self, channels_selected):
-        
-        """Redraw plots based on selected channels; only show relevant axes with gap."""
-        # Clear all axes first
-        for ax in [self.ax_atrial, self.ax_vent, self.ax_surface]:
-            ax.cla()
-            ax.set_facecolor(BG_COLOR)
-            ax.set_visible(False)  # hide by default
+    # -------------------------------------------------------------------------
+    # drawing
+    # redraw: update the figure for a full canvas.draw()
+    # blit:   after attach(canvas), repaint only the traces and time axes over
+    #         a cached background; the background is rebuilt on a layout
+    #         change, a y-range change or any full draw (e.g. resize)
+    # -------------------------------------------------------------------------
+    def axes(self):
+        return {"atrial": self.ax_atrial, "ventricular": self.ax_vent, "surface": self.ax_surface}
 
-        self.init_axes()
+    def lines(self):
+        return {"atrial": self.line_atrial, "ventricular": self.line_vent, "surface": self.line_surface}
+
+    def channel_buffers(self):
+        return {"atrial": self.atrial_buf, "ventricular": self.vent_buf, "surface": self.surface_buf}
+
+    def layout(self, channels_selected):
+        """Show only the axes of the selected channels, with a 10px gap."""
+        axes = self.axes()
+        for ax in axes.values():
+            ax.set_visible(False)  # hide by default
 
         fig_height_px = self.fig.get_figheight() * self.fig.get_dpi()
         gap_px = 10
@@ -109,51 +296,127 @@ class EgramPlot:
         if channels_selected == "both":
             height = ((1.0 - gap_frac) / 2) * 0.75
 
-            # Atrial on top
-            self.ax_atrial.set_visible(True)
+            # Atrial on top, ventricular below
             self.ax_atrial.set_position([0.1, 0.5 + gap_frac/2 + 0.075, 0.85, height])
-            xs, ys = self.buffer_to_xy(self.atrial_buf)
-            self.ax_atrial.plot(xs, ys, color="cyan")
-
-            # Ventricular below
-            self.ax_vent.set_visible(True)
             self.ax_vent.set_position([0.1, 0.05, 0.85, height])
-            xs, ys = self.buffer_to_xy(self.vent_buf)
-            self.ax_vent.plot(xs, ys, color="lime")
-        else:
+            self.shown = ["atrial", "ventricular"]
+        elif channels_selected in axes:
             # Single plot fills top
-            if channels_selected == "atrial":
-                self.ax_atrial.set_visible(True)
-                self.ax_atrial.set_position([0.1, 0.05, 0.85, 0.9])
-                xs, ys = self.buffer_to_xy(self.atrial_buf)
-                self.ax_atrial.plot(xs, ys, color="cyan")
-            elif channels_selected == "ventricular":
-                self.ax_vent.set_visible(True)
-                self.ax_vent.set_position([0.1, 0.05, 0.85, 0.9])
-                xs, ys = self.buffer_to_xy(self.vent_buf)
-                self.ax_vent.plot(xs, ys, color="lime")
-            elif channels_selected == "surface":
-                self.ax_surface.set_visible(True)
-                self.ax_surface.set_position([0.1, 0.05, 0.85, 0.9])
-                xs, ys = self.buffer_to_xy(self.surface_buf)
-                self.ax_surface.plot(xs, ys, color="magenta")
+            axes[channels_selected].set_position([0.1, 0.05, 0.85, 0.9])
+            self.shown = [channels_selected]
+        else:
+            self.shown = []
 
+        for channel in self.shown:
+            axes[channel].set_visible(True)
+        for channel, pool in self.marker_pools.items():
+            if channel not in self.shown:
+                pool.hide()
+
+        self.layout_key = (channels_selected, tuple(self.fig.get_size_inches()))
+        self.background = None
+
+    def update_lines(self):
+        # push buffer contents into the lines; True when a y-range changed
+        lines = self.lines()
+        buffers = self.channel_buffers()
+
+        rescaled = False
+        for channel in self.shown:
+            xs, ys = self.trace_xy(channel, buffers[channel])
+            lines[channel].set_data(xs, ys)
+            rescaled = self.y_scales[channel].update(ys) or rescaled
+        return rescaled
+
+    def trace_xy(self, channel, buf):
+        # buffer contents decimated to the axis width in pixels
+        xs, ys = self.buffer_to_xy(buf)
+        if not self.decimate:
+            return xs, ys
+
+        columns = max(int(self.axes()[channel].bbox.width), 1)
+        span = self.view_ms or self.window_ms
+        return self.decimators[channel].update(xs, ys, self.latest_t - span, self.latest_t, columns)
+
+    def update_markers(self):
+        axes = self.axes()
+        for channel in self.shown:
+            self.draw_markers(axes[channel], channel)
+
+    def redraw(self, channels_selected):
+        """Redraw plots based on selected channels; only show relevant axes with gap."""
+        if self.layout_key != (channels_selected, tuple(self.fig.get_size_inches())):
+            self.layout(channels_selected)
+
+        self.update_lines()
         self.adjust_xlim()
+        self.update_markers()
         return self.fig
 
+    def attach(self, canvas):
+        # switch to blitting on this canvas: traces and time axes are left
+        # out of full draws and painted over the cached background instead
+        self.detach()
+        self.canvas = canvas
+        self.background = None
+        self.draw_cid = canvas.mpl_connect("draw_event", self.on_draw)
+        for channel, ax in self.axes().items():
+            self.lines()[channel].set_animated(True)
+            ax.xaxis.set_animated(True)
+            self.marker_pools[channel].set_animated(True)
+
+    def detach(self):
+        if self.canvas is not None:
+            self.canvas.mpl_disconnect(self.draw_cid)
+        self.canvas = None
+        self.background = None
+        for channel, ax in self.axes().items():
+            self.lines()[channel].set_animated(False)
+            ax.xaxis.set_animated(False)
+            self.marker_pools[channel].set_animated(False)
+
+    def on_draw(self, event):
+        # every full draw (first show, resize, layout change) refreshes the
+        # background and puts the traces back on top
+        if self.canvas is None or event.canvas is not self.canvas:
+            return
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_traces()
 
+    def draw_traces(self):
+        axes = self.axes()
+        lines = self.lines()
+        for channel in self.shown:
+            ax = axes[channel]
+            ax.draw_artist(ax.xaxis)
+            ax.draw_artist(lines[channel])
+            for text in self.marker_pools[channel].visible_texts():
+                ax.draw_artist(text)
 
+    def blit(self, channels_selected):
+        if self.canvas is None:
+            self.redraw(channels_selected)
+            return
+
+        full = self.layout_key != (channels_selected, tuple(self.fig.get_size_inches()))
+        if full:
+            self.layout(channels_selected)
+
+        rescaled = self.update_lines()
+        self.adjust_xlim()
+        self.update_markers()
 
+        if full or rescaled or self.background is None:
+            self.canvas.draw()
+            return
 
+        self.canvas.restore_region(self.background)
+        self.draw_traces()
+        self.canvas.blit(self.fig.bbox)
 
     def adjust_xlim(self):
-        latest = 0
-        for buf in [self.atrial_buf, self.vent_buf, self.surface_buf]:
-            for sample in buf:
-                t = sample.get("t", 0)
-                if t > latest:
-                    latest = t
-
-        left = max(latest - self.window_ms, 0)
+        latest = self.latest_t
+        span = self.view_ms or self.window_ms
+        left = max(latest - span, 0)
         for ax in [self.ax_atrial, self.ax_vent, self.ax_surface]:
             ax.set_xlim(left, latest)
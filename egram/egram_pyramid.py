@@ -0,0 +1,167 @@
+# -----------------------------------------------------------------------------
+# EGRAM MIN/MAX PYRAMID
+# Multi-resolution overview of recorded channels
+# level L keeps one (t, min, max) bucket per L raw samples, stored next to the
+# raw data, so a zoomed-out view reads a few thousand buckets instead of
+# every sample
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import threading
+
+import numpy as np
+
+# raw samples per bucket for each stored level (level 1 = raw samples)
+LEVELS = [10, 100, 1000]
+
+# bucket start time + value envelope (float32 is plenty for drawing)
+PYRAMID_DTYPE = np.dtype([("t", "<f8"), ("min", "<f4"), ("max", "<f4")])
+
+# default number of points an overview may return
+OVERVIEW_POINTS = 4000
+
+# pyramid builds for the same channel must not interleave
+_build_lock = threading.Lock()
+
+
+# -----------------------------------------------------------------------------
+# bucket reduction
+# -----------------------------------------------------------------------------
+def reduce_buckets(t, values, level):
+    # one bucket per `level` samples, the last bucket may be partial;
+    # fmin/fmax skip missing (NaN) samples unless a whole bucket is missing
+    n = len(t)
+    count = -(-n // level)
+    out = np.zeros(count, dtype=PYRAMID_DTYPE)
+    if n == 0:
+        return out
+
+    out["t"] = t[::level]
+
+    full = n // level
+    if full:
+        block = np.asarray(values[:full * level]).reshape(full, level)
+        out["min"][:full] = np.fmin.reduce(block, axis=1)
+        out["max"][:full] = np.fmax.reduce(block, axis=1)
+    if full < count:
+        tail = np.asarray(values[full * level:])
+        out["min"][full] = np.fmin.reduce(tail)
+        out["max"][full] = np.fmax.reduce(tail)
+
+    return out
+
+
+# -----------------------------------------------------------------------------
+# on-disk pyramid (per session channel)
+# -----------------------------------------------------------------------------
+def read_meta(store, session_id, channel):
+    path = store.pyramid_meta_path(session_id, channel)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def build_pyramid(store, session_id, channel):
+    # incremental: complete buckets already on disk are kept, only the last
+    # partial bucket and anything recorded since the previous build is redone
+    with _build_lock:
+        records = store.map_channel(session_id, channel)
+        n = len(records)
+
+        covered = read_meta(store, session_id, channel).get("samples", 0)
+        paths = [store.pyramid_path(session_id, channel, level) for level in LEVELS]
+        if covered == n and all(os.path.exists(p) for p in paths):
+            return False
+        if covered > n or not all(os.path.exists(p) for p in paths):
+            covered = 0
+
+        for level, path in zip(LEVELS, paths):
+            keep = covered // level
+            start = keep * level
+            buckets = reduce_buckets(records["t"][start:], records["value"][start:], level)
+
+            mode = "r+b" if os.path.exists(path) else "wb"
+            with open(path, mode) as f:
+                f.truncate(keep * PYRAMID_DTYPE.itemsize)
+                f.seek(keep * PYRAMID_DTYPE.itemsize)
+                f.write(buckets.tobytes())
+
+        meta_path = store.pyramid_meta_path(session_id, channel)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"samples": n, "levels": LEVELS}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        return True
+
+
+def read_level(store, session_id, channel, level):
+    path = store.pyramid_path(session_id, channel, level)
+    count = os.path.getsize(path) // PYRAMID_DTYPE.itemsize if os.path.exists(path) else 0
+    if count == 0:
+        return np.zeros(0, dtype=PYRAMID_DTYPE)
+    return np.memmap(path, dtype=PYRAMID_DTYPE, mode="r", shape=(count,))
+
+
+# -----------------------------------------------------------------------------
+# overview queries, returns (t, min, max); raw samples come back with min == max
+# -----------------------------------------------------------------------------
+def select_range(t, t_start, t_end):
+    lo = 0 if t_start is None else np.searchsorted(t, t_start, side="left")
+    hi = len(t) if t_end is None else np.searchsorted(t, t_end, side="right")
+    return lo, hi
+
+
+def read_overview(store, session_id, channel, t_start=None, t_end=None, max_points=OVERVIEW_POINTS):
+    # reads whatever pyramid is on disk, call build_pyramid first if the
+    # channel may have grown since the last build
+
+    # finest level whose buckets in range fit the point budget (2 points each)
+    chosen = None
+    for level in LEVELS:
+        buckets = read_level(store, session_id, channel, level)
+        lo, hi = select_range(buckets["t"], t_start, t_end)
+        if level == LEVELS[0] and (hi - lo) * level <= max_points:
+            # few enough raw samples, skip the envelope entirely
+            records = store.read_range(
+                session_id, channel,
+                -np.inf if t_start is None else t_start,
+                np.inf if t_end is None else t_end
+            )
+            return records["t"], records["value"], records["value"]
+        chosen = buckets[lo:hi]
+        if (hi - lo) * 2 <= max_points:
+            break
+
+    return chosen["t"], chosen["min"], chosen["max"]
+
+
+def overview_from_arrays(t, values, t_start=None, t_end=None, max_points=OVERVIEW_POINTS):
+    # same as read_overview but computed in memory (legacy sessions)
+    lo, hi = select_range(t, t_start, t_end)
+    t = t[lo:hi]
+    values = values[lo:hi]
+    if len(t) <= max_points:
+        return t, values, values
+
+    level = LEVELS[-1]
+    for candidate in LEVELS:
+        if -(-len(t) // candidate) * 2 <= max_points:
+            level = candidate
+            break
+
+    buckets = reduce_buckets(t, values, level)
+    return buckets["t"], buckets["min"], buckets["max"]
+
+
+def envelope_xy(t, lo, hi):
+    # interleave buckets as t0,t0,t1,t1.. / min0,max0,min1,max1.. so a single
+    # line draws a vertical min -> max stroke per bucket and peaks survive
+    xs = np.repeat(np.asarray(t, dtype=float), 2)
+    ys = np.empty(len(xs))
+    ys[0::2] = lo
+    ys[1::2] = hi
+    return xs, ys
@@ -0,0 +1,124 @@
+# -----------------------------------------------------------------------------
+# EGRAM RENDER SCHEDULER
+# Draws at a fixed frame rate on the Tk side instead of once per packet
+# any thread may post() updates; every frame tick (widget.after) applies all
+# updates posted since the last frame in one go and draws once; frames
+# without updates are not drawn; when drawing takes longer than a frame the
+# missed ticks are skipped rather than queued up
+# -----------------------------------------------------------------------------
+
+import time
+from collections import deque
+
+import numpy as np
+
+RENDER_FPS = 30
+
+# frames kept for the stats
+STATS_FRAMES = 240
+
+
+class RenderScheduler:
+    def __init__(self, widget, apply_updates, draw, fps=RENDER_FPS):
+        # apply_updates(list of posted updates) then draw(), both on the Tk thread
+        self.widget = widget
+        self.apply_updates = apply_updates
+        self.draw = draw
+        self.set_fps(fps)
+
+        # deque append / popleft are thread safe
+        self.pending = deque()
+        self.dirty = False
+        self.after_id = None
+
+        # stats
+        self.frames = 0
+        self.skipped_frames = 0
+        self.frame_times = deque(maxlen=STATS_FRAMES)
+        self.draw_ms = deque(maxlen=STATS_FRAMES)
+        self.coalesced = deque(maxlen=STATS_FRAMES)
+
+    def set_fps(self, fps):
+        self.fps = fps
+        self.period = 1.0 / fps
+
+    # ---- producers (any thread) -------------------------------------------------
+    def post(self, update):
+        self.pending.append(update)
+
+    def request_draw(self):
+        # redraw on the next frame without new data (settings changed, etc.)
+        self.dirty = True
+
+    # ---- Tk side ------------------------------------------------------------------
+    @property
+    def running(self):
+        return self.after_id is not None
+
+    def start(self):
+        if not self.running:
+            self.after_id = self.widget.after(int(self.period * 1000), self.tick)
+
+    def stop(self, flush=True):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+        if flush:
+            self.render()
+
+    def tick(self):
+        started = time.perf_counter()
+        self.render()
+        elapsed = time.perf_counter() - started
+
+        # behind schedule: drop the ticks that were missed and wait for the
+        # next frame boundary
+        missed = int(elapsed // self.period)
+        self.skipped_frames += missed
+        delay = self.period - (elapsed - missed * self.period)
+        self.after_id = self.widget.after(max(int(delay * 1000), 1), self.tick)
+
+    def render(self):
+        updates = []
+        while self.pending:
+            updates.append(self.pending.popleft())
+
+        if not updates and not self.dirty:
+            return False
+        self.dirty = False
+
+        started = time.perf_counter()
+        if updates:
+            self.apply_updates(updates)
+        self.draw()
+        finished = time.perf_counter()
+
+        self.frames += 1
+        self.frame_times.append(finished)
+        self.draw_ms.append((finished - started) * 1000)
+        self.coalesced.append(len(updates))
+        return True
+
+    # ---- stats --------------------------------------------------------------------
+    def achieved_fps(self):
+        if len(self.frame_times) < 2:
+            return 0.0
+        span = self.frame_times[-1] - self.frame_times[0]
+        return (len(self.frame_times) - 1) / span if span > 0 else 0.0
+
+    def stats(self):
+        draw_ms = np.array(self.draw_ms) if self.draw_ms else np.zeros(1)
+        coalesced = np.array(self.coalesced) if self.coalesced else np.zeros(1)
+        p50, p90, p99 = np.percentile(draw_ms, [50, 90, 99])
+        return {
+            "target_fps": self.fps,
+            "fps": self.achieved_fps(),
+            "frames": self.frames,
+            "skipped_frames": self.skipped_frames,
+            "draw_ms_p50": p50,
+            "draw_ms_p90": p90,
+            "draw_ms_p99": p99,
+            "updates_per_frame": coalesced.mean(),
+            "max_updates_per_frame": int(coalesced.max()),
+            "pending": len(self.pending)
+        }
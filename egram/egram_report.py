@@ -0,0 +1,194 @@
+# -----------------------------------------------------------------------------
+# EGRAM REPORTS
+# Renders a session strip (channels, markers, settings, patient info) to PNG
+# or PDF with the Agg canvas, in worker processes so the Tk UI never waits
+# print_metadata of the session is filled in once a report is written
+# -----------------------------------------------------------------------------
+
+import atexit
+import os
+from concurrent.futures import Future
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from egram import egram_storage
+from egram.egram_pyramid import envelope_xy
+from egram.egram_utils import format_marker_label
+from helper.storage import load_patient_by_id
+
+REPORT_DIR = os.path.join("data", "reports")
+REPORT_FORMATS = ["png", "pdf"]
+
+# worker processes for rendering (None = one per CPU)
+REPORT_WORKERS = None
+
+# points per channel strip, about one per pixel column of the page
+REPORT_POINTS = 2000
+
+CHANNEL_TITLES = {"atrial": "Atrial EGM", "ventricular": "Ventricular EGM", "surface": "Surface ECG"}
+CHANNEL_COLORS = {"atrial": "tab:blue", "ventricular": "tab:green", "surface": "tab:purple"}
+
+# one pool per storage location (initializer arguments)
+_pools = {}
+
+
+# -----------------------------------------------------------------------------
+# rendering (runs in a worker process)
+# -----------------------------------------------------------------------------
+def report_lines(session, patient):
+    settings = session["settings"] or {}
+    patient = patient or {}
+    device = patient.get("device", {})
+
+    return [
+        f"Patient: {patient.get('name', '')} ({session['patient_id']})    "
+        f"Device: {device.get('model', '')} {device.get('serial', '')}",
+        f"Session: {session['session_id']}    Start: {session['start_time']}    End: {session['end_time']}",
+        f"EGM gain: {settings.get('egm_gain')}    ECG gain: {settings.get('ecg_gain')}    "
+        f"High-pass: {'on' if settings.get('high_pass_filter') else 'off'}    "
+        f"Sampling: {settings.get('sampling_rate_hz')} Hz"
+    ]
+
+
+def render_report(session_id, out_path, patient=None, build=True):
+    session = egram_storage.get_session(session_id)
+    if session is None:
+        raise ValueError("Session not found")
+
+    channels = []
+    for channel in session["channels"]:
+        if egram_storage.get_sample_count(session_id, channel) > 0:
+            channels.append(channel)
+
+    # letter landscape, pyplot is never used so no GUI backend is touched
+    fig = Figure(figsize=(11, 8.5), dpi=100)
+    FigureCanvasAgg(fig)
+    fig.suptitle("Electrogram Report", fontsize=14, x=0.06, ha="left")
+    fig.text(0.06, 0.93, "\n".join(report_lines(session, patient)), fontsize=9, va="top", family="monospace")
+
+    markers = session["markers"]
+    count = max(len(channels), 1)
+    for i, channel in enumerate(channels):
+        ax = fig.add_axes([0.06, 0.08 + (count - 1 - i) * 0.8 / count, 0.9, 0.8 / count - 0.05])
+
+        t, lo, hi = egram_storage.get_channel_overview(session_id, channel, max_points=REPORT_POINTS, build=build)
+        xs, ys = envelope_xy(t, lo, hi)
+        ax.plot(xs, ys, color=CHANNEL_COLORS.get(channel, "black"), linewidth=0.6)
+
+        for marker in markers:
+            if marker.get("channel") != channel:
+                continue
+            ts = marker.get("timestamp_ms", 0)
+            ax.axvline(ts, color="red", linewidth=0.4, alpha=0.6)
+            ax.text(ts, 1.0, format_marker_label(marker), color="red", fontsize=7,
+                    transform=ax.get_xaxis_transform(), va="bottom")
+
+        ax.set_title(CHANNEL_TITLES.get(channel, channel), fontsize=9, loc="left")
+        ax.set_ylabel("mV", fontsize=8)
+        ax.tick_params(labelsize=7)
+        ax.grid(True, color="#dddddd", linewidth=0.5)
+        if i == len(channels) - 1:
+            ax.set_xlabel("Time (ms)", fontsize=8)
+
+    folder = os.path.dirname(out_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    # write next to the target first so a half-written report never shows up
+    root, ext = os.path.splitext(out_path)
+    tmp_path = root + ".tmp" + ext
+    fig.savefig(tmp_path)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+# -----------------------------------------------------------------------------
+# worker pool
+# -----------------------------------------------------------------------------
+def get_pool():
+    key = egram_storage.worker_args()
+    pool = _pools.get(key)
+    if pool is None:
+        pool = egram_storage.worker_pool(REPORT_WORKERS)
+        _pools[key] = pool
+    return pool
+
+
+def shutdown_reports(wait=True):
+    for pool in list(_pools.values()):
+        pool.shutdown(wait=wait)
+    _pools.clear()
+
+
+atexit.register(shutdown_reports)
+
+
+# -----------------------------------------------------------------------------
+# queue a report, returns a Future resolving to the file path once the
+# report is written and print_metadata is updated
+# -----------------------------------------------------------------------------
+def submit_report(session_id, fmt="pdf", out_dir=None, patient=None):
+    if fmt not in REPORT_FORMATS:
+        raise ValueError("Invalid report format")
+
+    session = egram_storage.get_session(session_id)
+    if session is None:
+        raise ValueError("Session not found")
+    if patient is None:
+        patient = load_patient_by_id(session["patient_id"])
+
+    out_path = os.path.join(out_dir or REPORT_DIR, f"{session_id}.{fmt}")
+    pool = get_pool()
+
+    done = Future()
+    done.set_running_or_notify_cancel()
+
+    # writer thread: flush pending samples and bring the overview pyramids
+    # up to date -> worker process: render (read only) -> writer thread:
+    # update print_metadata; nothing here blocks the calling thread
+    def failed(future):
+        if future.exception() is not None:
+            done.set_exception(future.exception())
+            return True
+        return False
+
+    def marked(future):
+        if not failed(future):
+            done.set_result(out_path)
+
+    # a callback that raises (pool shut down or broken, writer closed) would
+    # otherwise leave done pending forever
+    def rendered(future):
+        try:
+            if not failed(future):
+                egram_storage.mark_printed(session_id, future.result(), wait=False).add_done_callback(marked)
+        except Exception as e:
+            done.set_exception(e)
+
+    def prepared(future):
+        try:
+            if not failed(future):
+                pool.submit(render_report, session_id, out_path, patient, False).add_done_callback(rendered)
+        except Exception as e:
+            done.set_exception(e)
+
+    egram_storage.build_pyramids(session_id, wait=False).add_done_callback(prepared)
+    return done
+
+
+def submit_reports(session_ids, fmt="pdf", out_dir=None):
+    # batch printing, rendered in parallel; returns {session_id: Future}
+    out = {}
+    for session_id in session_ids:
+        out[session_id] = submit_report(session_id, fmt, out_dir)
+    return out
+
+
+def submit_day_reports(day, fmt="pdf", out_dir=None):
+    # every session started on day ("YYYY-MM-DD", UTC start time)
+    session_ids = []
+    for entry in egram_storage.get_index().all_entries():
+        if (entry.get("start_time") or "").startswith(day):
+            session_ids.append(entry["session_id"])
+    return submit_reports(session_ids, fmt, out_dir)
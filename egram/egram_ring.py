@@ -0,0 +1,77 @@
+# -----------------------------------------------------------------------------
+# EGRAM RING BUFFER
+# Fixed-capacity (timestamp, value) buffer for live channel windows
+# every sample is stored twice, at i and i + capacity, so the newest samples
+# are always one contiguous slice: appends are O(1) per sample and plotting
+# gets views without copying
+# -----------------------------------------------------------------------------
+
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        self.t = np.zeros(2 * self.capacity)
+        self.values = np.zeros(2 * self.capacity)
+
+        # next write position in [0, capacity) and number of valid samples
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def push(self, t, value):
+        if value is None:
+            value = np.nan
+        i = self.head
+        self.t[i] = self.t[i + self.capacity] = t
+        self.values[i] = self.values[i + self.capacity] = value
+
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def extend(self, t, values):
+        # whole batch at once; only the newest `capacity` samples can survive
+        t = np.asarray(t, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(t)
+        if n == 0:
+            return
+        if n > self.capacity:
+            t = t[-self.capacity:]
+            values = values[-self.capacity:]
+            self.head = (self.head + n - self.capacity) % self.capacity
+            n = self.capacity
+
+        positions = (self.head + np.arange(n)) % self.capacity
+        self.t[positions] = t
+        self.t[positions + self.capacity] = t
+        self.values[positions] = values
+        self.values[positions + self.capacity] = values
+
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def views(self):
+        # (timestamps, values) oldest -> newest, views into the buffer
+        start = (self.head - self.count) % self.capacity
+        return self.t[start:start + self.count], self.values[start:start + self.count]
+
+    def latest_t(self):
+        if self.count == 0:
+            return None
+        return self.t[(self.head - 1) % self.capacity]
+
+    def window(self, window_ms):
+        # samples within window_ms of the newest one (timestamps are sorted)
+        t, values = self.views()
+        if len(t) == 0:
+            return t, values
+        lo = np.searchsorted(t, t[-1] - window_ms, side="left")
+        return t[lo:], values[lo:]
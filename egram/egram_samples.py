@@ -0,0 +1,68 @@
+# -----------------------------------------------------------------------------
+# EGRAM SAMPLE BLOCKS
+# Compact batch of samples for one channel: parallel float64 timestamp and
+# value arrays instead of one {"t", "value"} dict per sample
+# missing values are NaN; blocks are not changed once handed on (plot,
+# storage writer thread), operations return new blocks
+# -----------------------------------------------------------------------------
+
+import numpy as np
+
+
+class SampleBlock:
+    __slots__ = ("t", "values")
+
+    def __init__(self, t, values):
+        self.t = np.asarray(t, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float64)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def from_dicts(cls, samples):
+        # legacy [{"t", "value"}] lists
+        count = len(samples)
+        t = np.fromiter((s.get("t", 0) for s in samples), dtype=np.float64, count=count)
+        values = np.fromiter((np.nan if s.get("value") is None else s["value"] for s in samples),
+                             dtype=np.float64, count=count)
+        return cls(t, values)
+
+    @classmethod
+    def coerce(cls, samples):
+        # accept a block or a legacy dict list at API boundaries
+        if isinstance(samples, cls):
+            return samples
+        return cls.from_dicts(samples)
+
+    def __len__(self):
+        return len(self.t)
+
+    def __repr__(self):
+        if len(self) == 0:
+            return "SampleBlock(0 samples)"
+        return f"SampleBlock({len(self)} samples, t={self.t[0]:g}..{self.t[-1]:g})"
+
+    @property
+    def nbytes(self):
+        return self.t.nbytes + self.values.nbytes
+
+    def scaled(self, factor):
+        # timestamps are shared, only the values are copied
+        return SampleBlock(self.t, self.values * factor)
+
+    def records(self, dtype):
+        # structured (t, value) array in the on-disk record layout
+        out = np.empty(len(self), dtype=dtype)
+        out["t"] = self.t
+        out["value"] = self.values
+        return out
+
+    def to_dicts(self):
+        out = []
+        for t, value in zip(self.t.tolist(), self.values.tolist()):
+            if t.is_integer():
+                t = int(t)
+            out.append({"t": t, "value": None if value != value else value})
+        return out
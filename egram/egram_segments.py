@@ -0,0 +1,466 @@
+# -----------------------------------------------------------------------------
+# EGRAM SEGMENT STORE
+# Append-only on-disk layout for egram sessions
+# one directory per session, one binary segment file per channel
+# -----------------------------------------------------------------------------
+
+import glob
+import json
+import math
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+
+from egram.egram_samples import SampleBlock
+from egram.egram_codec import CODEC_HEAD, encode_channel, decode_channel, decode_range, iter_blocks, read_count
+
+CHANNELS = ["atrial", "ventricular", "surface"]
+
+# one sample on disk = little-endian float64 timestamp (ms) + float64 value
+SAMPLE_STRUCT = struct.Struct("<dd")
+
+# same record layout as a numpy dtype, lets segment files be memory-mapped
+SAMPLE_DTYPE = np.dtype([("t", "<f8"), ("value", "<f8")])
+
+HEADER_FILE = "session.json"
+MARKERS_FILE = "markers.jsonl"
+STATUS_FILE = "telemetry.jsonl"
+SEGMENT_EXT = ".seg"
+COMPACT_EXT = ".egz"
+PYRAMID_EXT = ".pyr"
+
+
+# -----------------------------------------------------------------------------
+# sample packing helpers
+# -----------------------------------------------------------------------------
+def pack_samples(samples):
+    # missing values are stored as NaN so every record keeps a fixed size
+    if isinstance(samples, SampleBlock):
+        return samples.records(SAMPLE_DTYPE).tobytes()
+
+    out = []
+    for sample in samples:
+        value = sample.get("value")
+        if value is None:
+            value = math.nan
+        out.append(SAMPLE_STRUCT.pack(sample.get("t", 0), value))
+    return b"".join(out)
+
+
+def unpack_samples(raw):
+    # ignore a trailing partial record left behind by an interrupted append
+    usable = len(raw) - (len(raw) % SAMPLE_STRUCT.size)
+
+    return to_sample_dicts(SAMPLE_STRUCT.iter_unpack(raw[:usable]))
+
+
+def marker_time(marker):
+    return marker.get("timestamp_ms", 0)
+
+
+def to_sample_dicts(pairs):
+    out = []
+    for t, value in pairs:
+        t = float(t)
+        value = float(value)
+        if t.is_integer():
+            t = int(t)
+        if math.isnan(value):
+            value = None
+        out.append({"t": t, "value": value})
+    return out
+
+
+# -----------------------------------------------------------------------------
+# per-session directory store
+# -----------------------------------------------------------------------------
+class SegmentStore:
+    def __init__(self, root):
+        self.root = root
+
+        # session headers are tiny and read on every append, keep them cached
+        self.headers = {}
+
+        # optional egram_writer.WriteBehind that batches appends
+        self.writer = None
+
+        # markers per session sorted by timestamp, loaded on the first range
+        # query and kept sorted by append_marker
+        self.sorted_markers = {}
+        self.marker_lock = threading.Lock()
+
+    # ---- raw appends ---------------------------------------------------------
+    def append_bytes(self, path, data):
+        if self.writer is not None:
+            self.writer.append(path, data)
+            return
+
+        with open(path, "ab") as f:
+            f.write(data)
+
+    def sync(self):
+        # make pending write-behind appends visible to readers
+        if self.writer is not None:
+            self.writer.flush()
+
+    # ---- paths ---------------------------------------------------------------
+    def session_dir(self, session_id):
+        return os.path.join(self.root, session_id)
+
+    def segment_path(self, session_id, channel):
+        return os.path.join(self.session_dir(session_id), channel + SEGMENT_EXT)
+
+    def compact_path(self, session_id, channel):
+        return os.path.join(self.session_dir(session_id), channel + COMPACT_EXT)
+
+    def pyramid_path(self, session_id, channel, level):
+        # min/max overview level (egram/egram_pyramid.py)
+        return os.path.join(self.session_dir(session_id), f"{channel}.L{level}{PYRAMID_EXT}")
+
+    def pyramid_meta_path(self, session_id, channel):
+        return os.path.join(self.session_dir(session_id), channel + PYRAMID_EXT + ".json")
+
+    # ---- headers -------------------------------------------------------------
+    def has_session(self, session_id):
+        return self.read_header(session_id) is not None
+
+    def list_session_ids(self):
+        if not os.path.isdir(self.root):
+            return []
+
+        out = []
+        for name in sorted(os.listdir(self.root)):
+            if os.path.exists(os.path.join(self.root, name, HEADER_FILE)):
+                out.append(name)
+        return out
+
+    def read_header(self, session_id):
+        if session_id in self.headers:
+            return self.headers[session_id]
+
+        path = os.path.join(self.session_dir(session_id), HEADER_FILE)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "r") as f:
+            header = json.load(f)
+
+        self.headers[session_id] = header
+        return header
+
+    def write_header(self, header):
+        session_id = header["session_id"]
+        folder = self.session_dir(session_id)
+        os.makedirs(folder, exist_ok=True)
+
+        # write to a temp file first so a crash never leaves a torn header
+        path = os.path.join(folder, HEADER_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(header, f, indent=4)
+        os.replace(tmp_path, path)
+
+        self.headers[session_id] = header
+
+    # ---- samples -------------------------------------------------------------
+    def append_samples(self, session_id, channel, samples):
+        raw = pack_samples(samples)
+        if not raw:
+            return
+
+        self.append_bytes(self.segment_path(session_id, channel), raw)
+
+    def read_samples(self, session_id, channel):
+        self.sync()
+        if os.path.exists(self.compact_path(session_id, channel)):
+            records = self.map_channel(session_id, channel)
+            return to_sample_dicts(zip(records["t"], records["value"]))
+
+        path = self.segment_path(session_id, channel)
+        if not os.path.exists(path):
+            return []
+
+        with open(path, "rb") as f:
+            return unpack_samples(f.read())
+
+    def map_segment(self, session_id, channel):
+        path = self.segment_path(session_id, channel)
+        count = 0
+        if os.path.exists(path):
+            count = os.path.getsize(path) // SAMPLE_STRUCT.size
+
+        if count == 0:
+            return np.zeros(0, dtype=SAMPLE_DTYPE)
+        return np.memmap(path, dtype=SAMPLE_DTYPE, mode="r", shape=(count,))
+
+    def read_compact(self, session_id, channel):
+        path = self.compact_path(session_id, channel)
+        records = np.zeros(0, dtype=SAMPLE_DTYPE)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                t, values = decode_channel(f.read())
+            records = np.zeros(len(t), dtype=SAMPLE_DTYPE)
+            records["t"] = t
+            records["value"] = values
+        return records
+
+    def map_channel(self, session_id, channel):
+        # read-only memory map of the channel records, no parsing or copying;
+        # ["t"] and ["value"] are column views into the same mapping.
+        # compacted channels cannot be mapped and are decoded into memory
+        # (plus any samples appended after compaction)
+        self.sync()
+        if not os.path.exists(self.compact_path(session_id, channel)):
+            return self.map_segment(session_id, channel)
+
+        compact = self.read_compact(session_id, channel)
+        tail = self.map_segment(session_id, channel)
+        if len(tail) == 0:
+            return compact
+        return np.concatenate([compact, tail])
+
+    def read_range(self, session_id, channel, t_start, t_end):
+        # records with t_start <= t <= t_end; binary search on the sorted
+        # timestamps, only the compact blocks that overlap are decoded
+        self.sync()
+        parts = []
+
+        path = self.compact_path(session_id, channel)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                t, values = decode_range(f, t_start, t_end)
+            records = np.zeros(len(t), dtype=SAMPLE_DTYPE)
+            records["t"] = t
+            records["value"] = values
+            parts.append(records)
+
+        tail = self.map_segment(session_id, channel)
+        lo = np.searchsorted(tail["t"], t_start, side="left")
+        hi = np.searchsorted(tail["t"], t_end, side="right")
+        if not parts:
+            return tail[lo:hi]
+        parts.append(tail[lo:hi])
+        return np.concatenate(parts)
+
+    def iter_chunks(self, session_id, channel, chunk_size=4096):
+        # channel records in order, at most one block / chunk in memory
+        self.sync()
+        path = self.compact_path(session_id, channel)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for t, values in iter_blocks(f):
+                    records = np.zeros(len(t), dtype=SAMPLE_DTYPE)
+                    records["t"] = t
+                    records["value"] = values
+                    yield records
+
+        tail = self.map_segment(session_id, channel)
+        for start in range(0, len(tail), chunk_size):
+            yield tail[start:start + chunk_size]
+
+    def sample_count(self, session_id, channel):
+        self.sync()
+        count = 0
+
+        path = self.compact_path(session_id, channel)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                count += read_count(f.read(CODEC_HEAD.size))
+
+        path = self.segment_path(session_id, channel)
+        if os.path.exists(path):
+            count += os.path.getsize(path) // SAMPLE_STRUCT.size
+        return count
+
+    def file_sizes(self, session_id, channel):
+        # bytes in the compact file and in the raw segment
+        self.sync()
+        sizes = {}
+        for kind, path in [
+            ("compact", self.compact_path(session_id, channel)),
+            ("segment", self.segment_path(session_id, channel))
+        ]:
+            sizes[kind] = os.path.getsize(path) if os.path.exists(path) else 0
+        return sizes
+
+    def compact_channel(self, session_id, channel):
+        # re-encode a channel (compact part + raw tail) into one compact file;
+        # removing the raw segment is the commit point: a crash before it
+        # leaves the old files, a crash after it leaves a complete .tmp that
+        # recover() moves into place, so no sample is ever read twice
+        self.sync()
+        segment = self.segment_path(session_id, channel)
+        if not os.path.exists(segment):
+            return
+        records = self.map_channel(session_id, channel)
+
+        path = self.compact_path(session_id, channel)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encode_channel(records["t"], records["value"]))
+            f.flush()
+            os.fsync(f.fileno())
+        del records
+
+        if self.writer is not None:
+            self.writer.forget(segment)
+        os.remove(segment)
+        os.replace(tmp_path, path)
+
+    def recover(self):
+        # finish or roll back compactions cut short by a crash
+        for tmp_path in glob.glob(os.path.join(self.root, "*", "*" + COMPACT_EXT + ".tmp")):
+            path = tmp_path[:-len(".tmp")]
+            segment = path[:-len(COMPACT_EXT)] + SEGMENT_EXT
+            if os.path.exists(segment):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+
+    def disk_usage(self, session_id):
+        total = 0
+        folder = self.session_dir(session_id)
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                total += os.path.getsize(os.path.join(folder, name))
+        return total
+
+    # ---- markers / telemetry log (one JSON object per line) ------------------
+    def append_line(self, session_id, filename, entry):
+        path = os.path.join(self.session_dir(session_id), filename)
+        self.append_bytes(path, (json.dumps(entry) + "\n").encode("utf-8"))
+
+    def read_lines(self, session_id, filename):
+        self.sync()
+        path = os.path.join(self.session_dir(session_id), filename)
+        if not os.path.exists(path):
+            return []
+
+        out = []
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    # torn last line from an interrupted append
+                    break
+        return out
+
+    def append_marker(self, session_id, marker):
+        with self.marker_lock:
+            self.append_line(session_id, MARKERS_FILE, marker)
+            markers = self.sorted_markers.get(session_id)
+            if markers is not None:
+                insort(markers, dict(marker), key=marker_time)
+
+    def read_markers(self, session_id):
+        return self.read_lines(session_id, MARKERS_FILE)
+
+    def markers_range(self, session_id, t_start, t_end):
+        # markers with t_start <= timestamp_ms <= t_end, O(log n + k)
+        markers = self.sorted_markers.get(session_id)
+        if markers is None:
+            with self.marker_lock:
+                markers = self.sorted_markers.get(session_id)
+                if markers is None:
+                    markers = sorted(self.read_markers(session_id), key=marker_time)
+                    self.sorted_markers[session_id] = markers
+
+        lo = bisect_left(markers, t_start, key=marker_time)
+        hi = bisect_right(markers, t_end, key=marker_time)
+        return [dict(m) for m in markers[lo:hi]]
+
+    def append_status(self, session_id, entry):
+        self.append_line(session_id, STATUS_FILE, entry)
+
+    def read_status(self, session_id):
+        return self.read_lines(session_id, STATUS_FILE)
+
+    # ---- whole sessions ------------------------------------------------------
+    def load_session(self, session_id):
+        # rebuild the legacy egram.json session shape from the segment files
+        header = self.read_header(session_id)
+        if header is None:
+            return None
+
+        channels = {}
+        for channel in CHANNELS:
+            info = header.get("channels", {}).get(channel, {})
+            channels[channel] = {
+                "enabled": info.get("enabled", False),
+                "samples": self.read_samples(session_id, channel)
+            }
+
+        return {
+            "session_id": header["session_id"],
+            "patient_id": header.get("patient_id"),
+            "start_time": header.get("start_time"),
+            "end_time": header.get("end_time"),
+            "telemetry_status_log": self.read_status(session_id),
+            "settings": header.get("settings", {}),
+            "channels": channels,
+            "markers": self.read_markers(session_id),
+            "print_metadata": header.get("print_metadata", {})
+        }
+
+    def import_session(self, session):
+        # copy a fully materialized legacy session into the segment layout
+        session_id = session["session_id"]
+        channels = session.get("channels", {})
+
+        header = {
+            "session_id": session_id,
+            "patient_id": session.get("patient_id"),
+            "start_time": session.get("start_time"),
+            "end_time": session.get("end_time"),
+            "settings": session.get("settings", {}),
+            "channels": {},
+            "print_metadata": session.get("print_metadata", {
+                "printed": False,
+                "printed_at": None,
+                "file_path": None
+            })
+        }
+        for channel in CHANNELS:
+            info = channels.get(channel, {})
+            header["channels"][channel] = {"enabled": info.get("enabled", False)}
+
+        # drop leftovers from an interrupted import, header goes last so the
+        # session only becomes visible once all of its data is on disk
+        self.remove_data_files(session_id)
+        os.makedirs(self.session_dir(session_id), exist_ok=True)
+
+        for channel in CHANNELS:
+            samples = channels.get(channel, {}).get("samples", [])
+            self.append_samples(session_id, channel, samples)
+        for entry in session.get("telemetry_status_log", []):
+            self.append_status(session_id, entry)
+        for marker in session.get("markers", []):
+            self.append_marker(session_id, marker)
+
+        self.write_header(header)
+        return header
+
+    def remove_data_files(self, session_id):
+        self.sorted_markers.pop(session_id, None)
+        names = [channel + SEGMENT_EXT for channel in CHANNELS]
+        names += [channel + COMPACT_EXT for channel in CHANNELS]
+        names += [MARKERS_FILE, STATUS_FILE]
+
+        # overview levels are derived from the samples, drop them too
+        folder = self.session_dir(session_id)
+        if os.path.isdir(folder):
+            names += [n for n in os.listdir(folder) if PYRAMID_EXT in n]
+
+        for name in names:
+            path = os.path.join(self.session_dir(session_id), name)
+            if self.writer is not None:
+                self.writer.forget(path)
+            if os.path.exists(path):
+                os.remove(path)
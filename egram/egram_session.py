@@ -0,0 +1,193 @@
+# -----------------------------------------------------------------------------
+# EGRAM SESSION HANDLES
+# Lazy, read-only view of a recorded session
+# metadata comes straight from the session index; channel samples, markers
+# and the telemetry log are only read when they are accessed
+# handles index like the legacy session dicts (session["channels"]["atrial"])
+# -----------------------------------------------------------------------------
+
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from egram.egram_segments import to_sample_dicts
+
+SESSION_KEYS = [
+    "session_id",
+    "patient_id",
+    "start_time",
+    "end_time",
+    "telemetry_status_log",
+    "settings",
+    "channels",
+    "markers",
+    "print_metadata"
+]
+
+
+# -----------------------------------------------------------------------------
+# LRU cache of channel arrays with a memory budget (bytes)
+# -----------------------------------------------------------------------------
+class ChannelCache:
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.lock = threading.Lock()
+
+        # key -> (stamp, t, values, nbytes), least recently used first
+        self.items = OrderedDict()
+        self.used_bytes = 0
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, stamp):
+        # stamp changes when the channel grows, a stale entry counts as a miss
+        with self.lock:
+            item = self.items.get(key)
+            if item is None or item[0] != stamp:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[1], item[2]
+
+    def put(self, key, stamp, t, values):
+        nbytes = t.nbytes + values.nbytes
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old[3]
+
+            # a channel bigger than the whole budget is handed out uncached
+            if nbytes > self.budget_bytes:
+                return
+
+            self.items[key] = (stamp, t, values, nbytes)
+            self.used_bytes += nbytes
+            self.trim()
+
+    def trim(self):
+        while self.used_bytes > self.budget_bytes and self.items:
+            _, item = self.items.popitem(last=False)
+            self.used_bytes -= item[3]
+            self.evictions += 1
+
+    def set_budget(self, budget_bytes):
+        with self.lock:
+            self.budget_bytes = budget_bytes
+            self.trim()
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.used_bytes = 0
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes,
+                "entries": len(self.items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+# -----------------------------------------------------------------------------
+# session handle
+# source is the egram_storage module (load_channel / load_logs / load_header)
+# -----------------------------------------------------------------------------
+class SessionHandle(Mapping):
+    def __init__(self, entry, source):
+        self.entry = entry
+        self.source = source
+
+    @property
+    def session_id(self):
+        return self.entry["session_id"]
+
+    def __getitem__(self, key):
+        if key == "channels":
+            return LazyChannels(self)
+        if key == "markers":
+            return self.source.load_logs(self.session_id)[0]
+        if key == "telemetry_status_log":
+            return self.source.load_logs(self.session_id)[1]
+        if key == "print_metadata":
+            return self.header().get("print_metadata", {})
+        if key in SESSION_KEYS:
+            return self.entry.get(key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(SESSION_KEYS)
+
+    def __len__(self):
+        return len(SESSION_KEYS)
+
+    def __repr__(self):
+        return f"SessionHandle({self.session_id!r})"
+
+    def header(self):
+        return self.source.load_header(self.session_id) or {}
+
+    def channel_arrays(self, channel):
+        # (timestamps, values) numpy arrays, shared through the LRU cache
+        return self.source.load_channel(self.session_id, channel)
+
+    def samples(self, channel):
+        t, values = self.channel_arrays(channel)
+        return to_sample_dicts(zip(t, values))
+
+    def to_dict(self):
+        # fully materialized legacy session dict (e.g. for save_sessions)
+        out = {}
+        for key in SESSION_KEYS:
+            value = self[key]
+            if key == "channels":
+                value = {name: dict(info) for name, info in value.items()}
+            out[key] = value
+        return out
+
+
+class LazyChannels(Mapping):
+    def __init__(self, handle):
+        self.handle = handle
+
+    def names(self):
+        return list(self.handle.header().get("channels", {}))
+
+    def __getitem__(self, channel):
+        info = self.handle.header().get("channels", {}).get(channel)
+        if info is None:
+            raise KeyError(channel)
+        return LazyChannel(self.handle, channel, info.get("enabled", False))
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self):
+        return len(self.names())
+
+
+class LazyChannel(Mapping):
+    def __init__(self, handle, channel, enabled):
+        self.handle = handle
+        self.channel = channel
+        self.enabled = enabled
+
+    def __getitem__(self, key):
+        if key == "enabled":
+            return self.enabled
+        if key == "samples":
+            return self.handle.samples(self.channel)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(["enabled", "samples"])
+
+    def __len__(self):
+        return 2
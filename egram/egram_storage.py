@@ -1,17 +1,72 @@
 # -----------------------------------------------------------------------------
 # EGRAM STORAGE HELPERS
 # Stores and updates real-time electrogram sessions
-# Uses helper.storage load_json / save_json
+# New sessions live in the append-only segment store (egram/egram_segments.py)
+# Legacy sessions in egram.json stay readable (streamed, read-only)
 # -----------------------------------------------------------------------------
 
+import atexit
+import bisect
+import copy
+import multiprocessing
 import os
+import sys
+import threading
 import uuid
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
-from helper.storage import load_json, save_json
+from helper.storage import save_json
+from helper.sqlite_store import SqliteStore
+from egram.egram_segments import SegmentStore, CHANNELS, SAMPLE_DTYPE, to_sample_dicts
+from egram.egram_writer import WriteBehind
+from egram.egram_actor import StorageActor
+from egram.egram_session import SessionHandle, ChannelCache
+from egram.egram_migrate import iter_legacy_sessions
+from egram.egram_pyramid import build_pyramid, read_overview, overview_from_arrays, OVERVIEW_POINTS
+from egram.egram_index import (
+    SessionIndex,
+    SqliteSessionIndex,
+    INDEX_NAME,
+    entry_for_store_session,
+    entry_for_legacy_session
+)
+
+
+# Path to legacy JSON file
+EGRAM_FILE = os.path.join("data", "egram.json")
 
+# Folder holding one sub-folder per session (segment store)
+EGRAM_DIR = os.path.join("data", "egram")
 
-# Path to JSON file
-EGRAM_FILE = os.path.join("data", "egram.json")
+# write-behind settings: appends are journaled immediately and written to
+# the segment files in batches every FLUSH_INTERVAL_S or FLUSH_MAX_RECORDS;
+# acknowledged writes survive an app crash, JOURNAL_FSYNC = True extends that
+# to power loss at the cost of one fsync per append
+WRITE_BEHIND = True
+FLUSH_INTERVAL_S = 0.25
+FLUSH_MAX_RECORDS = 256
+JOURNAL_FSYNC = False
+
+# worker processes only read; they must not touch files the writer owns
+# (journal replay, unfinished compactions)
+READ_ONLY = False
+
+# optional database for session headers, markers and the telemetry log
+# (helper.sqlite_store.SqliteStore); None keeps them in JSON files
+METADATA_DB = None
+
+# one store / index per root folder so caches survive between calls
+_stores = {}
+_indexes = {}
+
+# memory budget for channel arrays kept by session handles (LRU)
+SESSION_CACHE_BYTES = 64 * 1024 * 1024
+
+# single writer thread that runs every egram write (egram/egram_actor.py)
+_actor = None
+
+_channel_cache = ChannelCache(SESSION_CACHE_BYTES)
 
 
 # -----------------------------------------------------------------------------
@@ -22,41 +77,550 @@ def time_now():
 
 
 # -----------------------------------------------------------------------------
-# load all sessions into memory
+# segment store for the current EGRAM_DIR
+# -----------------------------------------------------------------------------
+def get_store():
+    store = _stores.get(EGRAM_DIR)
+    if store is None:
+        store = SegmentStore(EGRAM_DIR)
+        if WRITE_BEHIND:
+            # replays any journal left by a crash before the store is used
+            store.writer = WriteBehind(
+                EGRAM_DIR,
+                flush_interval=FLUSH_INTERVAL_S,
+                max_batch=FLUSH_MAX_RECORDS,
+                fsync=JOURNAL_FSYNC
+            )
+            store.writer.start()
+        if not READ_ONLY:
+            store.recover()
+        _stores[EGRAM_DIR] = store
+    return store
+
+
+# -----------------------------------------------------------------------------
+# write-behind control
+# -----------------------------------------------------------------------------
+def flush():
+    get_store().sync()
+
+
+def flush_pending():
+    # flush this process's write-behind, if it has one; never opens the store
+    # (a read-only process must not replay the writer's journal); returns
+    # whether there was a writer to flush
+    store = _stores.get(EGRAM_DIR)
+    if store is None or store.writer is None:
+        return False
+    store.sync()
+    return True
+
+
+def writer_metrics():
+    # flush latency, batch sizes and queue depth of the write-behind layer
+    writer = get_store().writer
+    if writer is None:
+        return {}
+    return writer.metrics()
+
+
+def close_storage():
+    # drain queued writes, then flush and stop every write-behind thread
+    # (called at interpreter exit)
+    global _actor
+    if _actor is not None:
+        _actor.close()
+        _actor = None
+
+    for store in list(_stores.values()):
+        if store.writer is not None:
+            store.writer.close()
+            store.writer = None
+    _stores.clear()
+    _indexes.clear()
+    _channel_cache.clear()
+
+
+atexit.register(close_storage)
+
+
+def set_read_only():
+    # this process only reads (worker processes, the export command line):
+    # no write-behind, no journal replay or compaction recovery, and the
+    # session index is kept in memory, never saved
+    global WRITE_BEHIND, READ_ONLY
+    WRITE_BEHIND = False
+    READ_ONLY = True
+
+
+def init_worker(egram_dir, egram_file, db_path=None):
+    # read-only setup for a worker process (egram/egram_export.py,
+    # egram/egram_report.py); workers are spawned, and any writer state is
+    # dropped, never closed, so the parent's journal and pending writes are
+    # left alone
+    global EGRAM_DIR, EGRAM_FILE, METADATA_DB, _actor
+    EGRAM_DIR = egram_dir
+    EGRAM_FILE = egram_file
+    set_read_only()
+    METADATA_DB = None
+    if db_path:
+        METADATA_DB = SqliteStore(db_path)
+
+    _actor = None
+    _stores.clear()
+    _indexes.clear()
+    _channel_cache.clear()
+
+
+# -----------------------------------------------------------------------------
+# single-writer actor
+# every function that changes egram data runs on the actor thread, so the
+# serial read loop and the Tk thread can never interleave read-modify-write
+# cycles; reads run on the caller's thread without locking
+# -----------------------------------------------------------------------------
+def get_actor():
+    global _actor
+    if _actor is None:
+        _actor = StorageActor()
+        _actor.start()
+    return _actor
+
+
+def report_write_error(future):
+    error = future.exception()
+    if error is not None:
+        print("[EGRAM ERROR] storage write:", error)
+
+
+def run_write(fn, *args, wait=True):
+    # wait=False queues the write and returns its Future right away
+    # (acquisition thread); errors are then reported instead of raised
+    future = get_actor().submit(fn, *args)
+    if wait:
+        return future.result()
+    future.add_done_callback(report_write_error)
+    return future
+
+
+def storage_metrics():
+    metrics = {"actor": get_actor().metrics()}
+    metrics["write_behind"] = writer_metrics()
+    return metrics
+
+
+# -----------------------------------------------------------------------------
+# legacy egram.json access
+# sessions are streamed one at a time (egram/egram_migrate.py), run
+# python -m egram.egram_migrate to move them into the segment store for good
+# -----------------------------------------------------------------------------
+def load_legacy_sessions():
+    return list(iter_legacy_sessions(EGRAM_FILE))
+
+
+def find_legacy_session(session_id):
+    for s in iter_legacy_sessions(EGRAM_FILE):
+        if s.get("session_id") == session_id:
+            return s
+    return None
+
+
+def legacy_stamp():
+    if not os.path.exists(EGRAM_FILE):
+        return None
+    info = os.stat(EGRAM_FILE)
+    return (info.st_mtime_ns, info.st_size)
+
+
+def worker_args():
+    # init_worker arguments for the current storage location
+    db = METADATA_DB
+    return (EGRAM_DIR, EGRAM_FILE, db.path if db else None)
+
+
+def worker_pool(max_workers=None):
+    # pool of read-only storage workers; spawned, not forked: a forked child
+    # could inherit a lock held by one of this process's storage or serial
+    # threads
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=worker_args()
+    )
+
+
+# -----------------------------------------------------------------------------
+# session header index for the current EGRAM_DIR
+# rebuilt from the session headers if missing, legacy entries are refreshed
+# only when egram.json changes on disk
+# -----------------------------------------------------------------------------
+def use_metadata_backend(db):
+    global METADATA_DB
+    METADATA_DB = db
+    _indexes.clear()
+
+
+def get_index():
+    index = _indexes.get(EGRAM_DIR)
+    if index is None or legacy_stamp() != index.legacy_stamp:
+        # building / refreshing the index writes it, leave that to the actor
+        index = run_write(_refresh_index)
+    return index
+
+
+def _refresh_index():
+    index = _indexes.get(EGRAM_DIR)
+    stamp = legacy_stamp()
+    if index is None or (READ_ONLY and index.owns_logs and stamp != index.legacy_stamp):
+        index = open_index(stamp)
+        _indexes[EGRAM_DIR] = index
+
+    if stamp != index.legacy_stamp:
+        entries = []
+        for s in iter_legacy_sessions(EGRAM_FILE):
+            entries.append(entry_for_legacy_session(s))
+        index.replace_legacy(entries, stamp, save=not READ_ONLY)
+
+    return index
+
+
+def open_index(stamp):
+    if METADATA_DB is not None:
+        index = SqliteSessionIndex(METADATA_DB)
+        # a read-only process can't update the database: an index that is
+        # not built or not current is rebuilt in memory below instead
+        if not READ_ONLY or (index.loaded and index.legacy_stamp == stamp):
+            if not index.loaded:
+                rebuild_index(index)
+            return index
+
+    # with a database, index.json is not kept up to date, don't load it
+    index = SessionIndex(os.path.join(EGRAM_DIR, INDEX_NAME), load=METADATA_DB is None)
+    if not index.loaded:
+        rebuild_index(index)
+    return index
+
+
+def rebuild_index(index):
+    store = get_store()
+    for session_id in store.list_session_ids():
+        entry = entry_for_store_session(store, store.read_header(session_id))
+        index.put(entry, save=False)
+        if index.owns_logs and not READ_ONLY:
+            # the log files are the record, the database copy is rebuilt
+            index.import_logs(session_id, store.read_markers(session_id), store.read_status(session_id))
+    if not READ_ONLY:
+        index.save()
+
+
+def sync_index(header):
+    get_index().put(entry_for_store_session(get_store(), header))
+
+
+# -----------------------------------------------------------------------------
+# session headers (no samples) for a patient, oldest first
+# -----------------------------------------------------------------------------
+def list_session_headers(patient_id):
+    return get_index().for_patient(patient_id)
+
+
+# -----------------------------------------------------------------------------
+# all sessions as lazy handles (egram/egram_session.py)
+# index order is creation order so "last unfinished session" stays meaningful
 # -----------------------------------------------------------------------------
 def load_sessions():
-    default_data = {"egram_sessions": []}
-    data = load_json(EGRAM_FILE, default_data)
-    return data
+    sessions = []
+    for entry in get_index().all_entries():
+        sessions.append(SessionHandle(entry, sys.modules[__name__]))
+    return {"egram_sessions": sessions}
 
 
 # -----------------------------------------------------------------------------
-# save all sessions to disk
+# save all sessions to disk (legacy egram.json format)
 # -----------------------------------------------------------------------------
 def save_sessions(data):
-    save_json(EGRAM_FILE, data)
+    sessions = []
+    for s in data.get("egram_sessions", []):
+        sessions.append(s.to_dict() if isinstance(s, SessionHandle) else s)
+    save_json(EGRAM_FILE, dict(data, egram_sessions=sessions))
+
+
+# -----------------------------------------------------------------------------
+# loaders behind SessionHandle
+# channel arrays go through an LRU cache bounded by SESSION_CACHE_BYTES, so
+# browsing many sessions keeps memory flat
+# -----------------------------------------------------------------------------
+def set_session_cache_budget(budget_bytes):
+    global SESSION_CACHE_BYTES
+    SESSION_CACHE_BYTES = budget_bytes
+    _channel_cache.set_budget(budget_bytes)
+
+
+def session_cache_metrics():
+    return _channel_cache.metrics()
+
+
+def load_header(session_id):
+    entry = get_index().get(session_id)
+    if entry is None:
+        return None
+    if entry.get("legacy"):
+        return find_legacy_session(session_id)
+    return get_store().read_header(session_id)
+
+
+def load_logs(session_id):
+    # (markers, telemetry status log)
+    entry = get_index().get(session_id)
+    if entry is None:
+        return [], []
+
+    if entry.get("legacy"):
+        session = find_legacy_session(session_id) or {}
+        return session.get("markers", []), session.get("telemetry_status_log", [])
+
+    index = get_index()
+    if index.owns_logs:
+        return index.read_markers(session_id), index.read_status(session_id)
+
+    store = get_store()
+    return store.read_markers(session_id), store.read_status(session_id)
+
+
+def load_channel(session_id, channel):
+    entry = get_index().get(session_id)
+    if entry is None:
+        raise ValueError("Session not found")
+
+    # cached arrays are dropped once the channel grows or gets compacted
+    if entry.get("legacy"):
+        stamp = legacy_stamp()
+    else:
+        stamp = (get_store().sample_count(session_id, channel), entry.get("end_time"))
+
+    key = (EGRAM_DIR, session_id, channel)
+    cached = _channel_cache.get(key, stamp)
+    if cached is not None:
+        return cached
+
+    # copies, so the cache never pins a segment file that may be compacted
+    t, values = get_channel_arrays(session_id, channel)
+    t = np.array(t)
+    values = np.array(values)
+    _channel_cache.put(key, stamp, t, values)
+    return t, values
+
+
+# -----------------------------------------------------------------------------
+# header of a session in the segment store
+# legacy-only sessions are copied over the first time they are written to
+# -----------------------------------------------------------------------------
+def require_header(session_id):
+    store = get_store()
+    header = store.read_header(session_id)
+    if header is not None:
+        return header
+
+    entry = get_index().get(session_id)
+    legacy = None
+    if entry is not None and entry.get("legacy"):
+        legacy = find_legacy_session(session_id)
+    if legacy is None:
+        raise ValueError("Session not found")
+
+    header = store.import_session(legacy)
+    sync_index(header)
+
+    index = get_index()
+    if index.owns_logs:
+        index.import_logs(session_id, legacy.get("markers", []), legacy.get("telemetry_status_log", []))
+    return header
 
 
 # -----------------------------------------------------------------------------
 # find a session by ID
 # -----------------------------------------------------------------------------
 def get_session(session_id):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+    entry = get_index().get(session_id)
+    if entry is None:
+        return None
 
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            return s
+    # samples / markers are only read when the handle is indexed for them
+    return SessionHandle(entry, sys.modules[__name__])
+
+
+# -----------------------------------------------------------------------------
+# channel samples as (timestamps, values) arrays
+# store sessions are memory-mapped straight from the segment file, so any
+# time range can be sliced without loading or copying the whole channel
+# -----------------------------------------------------------------------------
+def get_channel_arrays(session_id, channel):
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
+
+    entry = get_index().get(session_id)
+    if entry is None:
+        raise ValueError("Session not found")
+
+    if entry.get("legacy"):
+        session = find_legacy_session(session_id)
+        samples = session.get("channels", {}).get(channel, {}).get("samples", [])
+        records = np.array(
+            [(s.get("t", 0), np.nan if s.get("value") is None else s["value"]) for s in samples],
+            dtype=SAMPLE_DTYPE
+        )
+    else:
+        records = get_store().map_channel(session_id, channel)
+
+    return records["t"], records["value"]
+
+
+# -----------------------------------------------------------------------------
+# time-range queries, t_start <= t <= t_end in ms
+# binary search on the sorted timestamps: O(log n + k) for store sessions,
+# compacted channels only decode the blocks the range overlaps
+# -----------------------------------------------------------------------------
+def get_channel_range(session_id, channel, t_start, t_end):
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
+
+    entry = get_index().get(session_id)
+    if entry is None:
+        raise ValueError("Session not found")
+
+    if entry.get("legacy"):
+        t, values = get_channel_arrays(session_id, channel)
+        lo = np.searchsorted(t, t_start, side="left")
+        hi = np.searchsorted(t, t_end, side="right")
+        return t[lo:hi], values[lo:hi]
+
+    records = get_store().read_range(session_id, channel, t_start, t_end)
+    return records["t"], records["value"]
+
+
+def get_sample_count(session_id, channel):
+    entry = get_index().get(session_id)
+    if entry is None:
+        raise ValueError("Session not found")
+    if entry.get("legacy"):
+        return entry["sample_counts"].get(channel, 0)
+    return get_store().sample_count(session_id, channel)
+
+
+def iter_channel_chunks(session_id, channel, chunk_size=4096):
+    # whole channel as a stream of record arrays ("t", "value"); store
+    # sessions keep at most one chunk in memory
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
+
+    entry = get_index().get(session_id)
+    if entry is None:
+        raise ValueError("Session not found")
+
+    if entry.get("legacy"):
+        t, values = get_channel_arrays(session_id, channel)
+        for start in range(0, len(t), chunk_size):
+            records = np.zeros(len(t[start:start + chunk_size]), dtype=SAMPLE_DTYPE)
+            records["t"] = t[start:start + chunk_size]
+            records["value"] = values[start:start + chunk_size]
+            yield records
+        return
+
+    yield from get_store().iter_chunks(session_id, channel, chunk_size)
+
+
+def get_samples_range(session_id, channel, t_start, t_end):
+    # same as get_channel_range, as {"t", "value"} sample dicts
+    t, values = get_channel_range(session_id, channel, t_start, t_end)
+    return to_sample_dicts(zip(t, values))
+
+
+def markers_in_range(markers, t_start, t_end):
+    # unsorted marker list (legacy sessions)
+    markers = sorted(markers, key=lambda m: m.get("timestamp_ms", 0))
+    times = [m.get("timestamp_ms", 0) for m in markers]
+    lo = bisect.bisect_left(times, t_start)
+    hi = bisect.bisect_right(times, t_end)
+    return markers[lo:hi]
+
+
+def get_markers_range(session_id, t_start, t_end):
+    # the SQLite backend answers this from its (session_id, timestamp_ms)
+    # index, the JSON backend from a sorted copy kept by the segment store
+    index = get_index()
+    entry = index.get(session_id)
+    if entry is None:
+        raise ValueError("Session not found")
+
+    if entry.get("legacy"):
+        markers = find_legacy_session(session_id).get("markers", [])
+        return markers_in_range(markers, t_start, t_end)
+    if index.owns_logs:
+        return index.read_markers_range(session_id, t_start, t_end)
+    return get_store().markers_range(session_id, t_start, t_end)
 
-    return None
+
+# -----------------------------------------------------------------------------
+# zoomed-out channel view as (timestamps, min, max) arrays
+# served from the min/max pyramid (egram/egram_pyramid.py), so the number of
+# points stays around max_points whatever the time range
+# -----------------------------------------------------------------------------
+def get_channel_overview(session_id, channel, t_start=None, t_end=None, max_points=OVERVIEW_POINTS, build=True):
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
+
+    entry = get_index().get(session_id)
+    if entry is None:
+        raise ValueError("Session not found")
+
+    if entry.get("legacy"):
+        t, values = get_channel_arrays(session_id, channel)
+        return overview_from_arrays(t, values, t_start, t_end, max_points)
+
+    # brings the pyramid up to date if the session grew since the last build
+    # (worker processes pass build=False and read what is on disk)
+    if build:
+        run_write(build_pyramid, get_store(), session_id, channel)
+    return read_overview(get_store(), session_id, channel, t_start, t_end, max_points)
+
+
+def build_pyramids(session_id, wait=True):
+    return run_write(_build_pyramids, session_id, wait=wait)
+
+
+def _build_pyramids(session_id):
+    # incremental, a channel that has not grown since the last build is skipped
+    store = get_store()
+    for channel in CHANNELS:
+        if store.sample_count(session_id, channel):
+            build_pyramid(store, session_id, channel)
+
+
+def build_missing_pyramids():
+    # finished store sessions recorded before pyramids existed; one actor
+    # job per session so live writes interleave with the backfill
+    for entry in get_index().all_entries():
+        if not entry.get("legacy") and entry.get("end_time") is not None:
+            build_pyramids(entry["session_id"])
+
+
+def start_pyramid_backfill():
+    thread = threading.Thread(target=build_missing_pyramids, name="egram-pyramids", daemon=True)
+    thread.start()
+    return thread
 
 
 # -----------------------------------------------------------------------------
 # create a new EGRAM session
 # -----------------------------------------------------------------------------
 def create_session(patient_id, settings):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+    return run_write(_create_session, patient_id, settings)
+
+
+def _create_session(patient_id, settings):
+    store = get_store()
+    # load (or rebuild) the index before this session's files exist
+    index = get_index()
 
     session_id = "EGRAM_" + uuid.uuid4().hex[:8].upper()
     now = time_now()
@@ -111,115 +675,133 @@ def create_session(patient_id, settings):
         }
     }
 
-    sessions.append(session)
-    save_sessions({"egram_sessions": sessions})
+    header = store.import_session(session)
+    sync_index(header)
+
+    if index.owns_logs:
+        index.import_logs(session_id, [], session["telemetry_status_log"])
 
     return session
 
 
 # -----------------------------------------------------------------------------
 # add samples to a session channel
+# appends to the channel segment file, cost is O(len(samples))
 # -----------------------------------------------------------------------------
-def add_samples(session_id, channel, samples):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+def add_samples(session_id, channel, samples, wait=True):
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
 
-    # find session
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
+    return run_write(_add_samples, session_id, channel, samples, wait=wait)
 
-    if target is None:
-        raise ValueError("Session not found")
 
-    if channel not in ["atrial", "ventricular", "surface"]:
-        raise ValueError("Invalid channel")
+def _add_samples(session_id, channel, samples):
+    header = require_header(session_id)
+    store = get_store()
 
-    target["channels"][channel]["enabled"] = True
-    target["channels"][channel]["samples"].extend(samples)
+    # only rewrite the header the first time a channel receives data;
+    # headers are replaced, never changed in place, readers may hold them
+    channel_info = header["channels"].get(channel, {})
+    if not channel_info.get("enabled"):
+        header = copy.deepcopy(header)
+        header["channels"][channel] = dict(channel_info, enabled=True)
+        store.write_header(header)
 
-    save_sessions({"egram_sessions": sessions})
+    store.append_samples(session_id, channel, samples)
 
 
 # -----------------------------------------------------------------------------
 # append a marker to a session
 # -----------------------------------------------------------------------------
-def add_marker(session_id, marker):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
-
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
+def add_marker(session_id, marker, wait=True):
+    return run_write(_add_marker, session_id, marker, wait=wait)
 
-    if target is None:
-        raise ValueError("Session not found")
 
-    target["markers"].append(marker)
-    save_sessions({"egram_sessions": sessions})
+def _add_marker(session_id, marker):
+    require_header(session_id)
+    # markers.jsonl is the record, the SQLite backend keeps an indexed copy
+    get_store().append_marker(session_id, marker)
+    index = get_index()
+    if index.owns_logs:
+        index.append_marker(session_id, marker)
 
 
 # -----------------------------------------------------------------------------
 # update telemetry status
 # -----------------------------------------------------------------------------
-def set_telemetry(session_id, status):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+def set_telemetry(session_id, status, wait=True):
+    return run_write(_set_telemetry, session_id, status, wait=wait)
 
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
 
-    if target is None:
-        raise ValueError("Session not found")
-
-    target["telemetry_status_log"].append({
+def _set_telemetry(session_id, status):
+    header = require_header(session_id)
+    entry = {
         "time": time_now(),
         "status": status
-    })
+    }
+
+    get_store().append_status(session_id, entry)
+    index = get_index()
+    if index.owns_logs:
+        index.append_status(session_id, entry)
 
-    save_sessions({"egram_sessions": sessions})
+    # status changes are rare (connect / stop), refresh the index's sample
+    # counts and byte offsets of a session still being recorded
+    sync_index(header)
 
 
 # -----------------------------------------------------------------------------
 # finalize a session
+# channels are re-encoded into the compact format (egram/egram_codec.py)
+# and get their min/max overview levels
 # -----------------------------------------------------------------------------
 def finish_session(session_id):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+    return run_write(_finish_session, session_id)
 
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
 
-    if target is None:
-        raise ValueError("Session not found")
+def _finish_session(session_id):
+    header = dict(require_header(session_id), end_time=time_now())
+    store = get_store()
+    store.write_header(header)
 
-    target["end_time"] = time_now()
-    save_sessions({"egram_sessions": sessions})
+    for channel in CHANNELS:
+        store.compact_channel(session_id, channel)
+    _build_pyramids(session_id)
+    sync_index(header)
 
-    return target
+    return get_session(session_id)
+
+
+# -----------------------------------------------------------------------------
+# record a printed report (egram/egram_report.py) in print_metadata
+# -----------------------------------------------------------------------------
+def mark_printed(session_id, file_path, wait=True):
+    return run_write(_mark_printed, session_id, file_path, wait=wait)
+
+
+def _mark_printed(session_id, file_path):
+    header = copy.deepcopy(require_header(session_id))
+    header["print_metadata"] = {
+        "printed": True,
+        "printed_at": time_now(),
+        "file_path": file_path
+    }
+    get_store().write_header(header)
 
 
 # -----------------------------------------------------------------------------
 # get active session or create one
 # -----------------------------------------------------------------------------
 def get_or_start_session(patient_id, settings=None):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+    # lookup and create run as one job, two threads cannot both create
+    return run_write(_get_or_start_session, patient_id, settings)
+
 
+def _get_or_start_session(patient_id, settings=None):
     # return last unfinished session
-    for s in reversed(sessions):
-        if s.get("patient_id") == patient_id and s.get("end_time") is None:
-            return s
+    for entry in reversed(list_session_headers(patient_id)):
+        if entry.get("end_time") is None:
+            return get_session(entry["session_id"])
 
     # else, create a new one
     return create_session(patient_id, settings or {})
@@ -229,12 +811,10 @@ def get_or_start_session(patient_id, settings=None):
 # list sessions for a patient
 # -----------------------------------------------------------------------------
 def list_sessions(patient_id):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
-
     out = []
-    for s in sessions:
-        if s.get("patient_id") == patient_id:
-            out.append(s)
+    for entry in list_session_headers(patient_id):
+        session = get_session(entry["session_id"])
+        if session is not None:
+            out.append(session)
 
     return out
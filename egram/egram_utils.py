@@ -3,42 +3,37 @@
 # helper functions for gains, trimming, markers, and sample formatting
 # -----------------------------------------------------------------------------
 import time
+from bisect import bisect_left
+
+import numpy as np
+
+from egram.egram_framer import PacketFramer, FRAME_SIZE, SYNC_WORD
+from egram.egram_samples import SampleBlock
 
 # -----------------------------------------------------------------------------
 # gain helpers
 # -----------------------------------------------------------------------------
+GAINS = {"0.5X": 0.5, "1X": 1.0, "2X": 2.0}
+
+
 def gain_value(gain_str):
     # convert gain string into numeric multiplier
-    if gain_str == "0.5X":
-        return 0.5
-    elif gain_str == "1X":
-        return 1.0
-    elif gain_str == "2X":
-        return 2.0
-    else:
-        return 1.0   # fallback gain
+    return GAINS.get(gain_str, 1.0)   # fallback gain
 
 
 def apply_gain(samples, gain_str):
-    # multiply each sample's value by the gain
+    # multiply each sample's value by the gain; SampleBlocks stay blocks,
+    # dict lists are kept for older callers
     gain = gain_value(gain_str)
-    out = []
+    if isinstance(samples, SampleBlock):
+        return samples.scaled(gain)
 
+    out = []
     for sample in samples:
-        new_sample = {}
-
-        # copy timestamp
-        if "t" in sample:
-            new_sample["t"] = sample["t"]
-
-        # apply gain only if value exists
-        if "value" in sample:
-            new_sample["value"] = sample["value"] * gain
-        else:
-            new_sample["value"] = None
-
+        value = sample.get("value")
+        new_sample = {"t": sample["t"]} if "t" in sample else {}
+        new_sample["value"] = None if value is None else value * gain
         out.append(new_sample)
-
     return out
 
 
@@ -47,22 +42,27 @@ def apply_gain(samples, gain_str):
 # keeps buffers within window size for rolling displays
 # -----------------------------------------------------------------------------
 def trim_window(samples, max_ms):
+    if isinstance(samples, SampleBlock):
+        if len(samples) == 0:
+            return samples
+        lo = np.searchsorted(samples.t, samples.t[-1] - max_ms, side="left")
+        return SampleBlock(samples.t[lo:], samples.values[lo:])
+
     # if buffer has no samples, return empty list
     if samples is None or len(samples) == 0:
         return []
 
-    # assume samples are ordered oldest → newest
+    # assume samples are ordered oldest → newest, bisect for the cut point
     latest_sample = samples[-1]
     latest_timestamp = latest_sample.get("t", 0)
     threshold = latest_timestamp - max_ms
 
-    trimmed = []
-    for sample in samples:
-        timestamp = sample.get("t", 0)
-        if timestamp >= threshold:
-            trimmed.append(sample)
+    cut = bisect_left(samples, threshold, key=sample_time)
+    return samples[cut:]
+
 
-    return trimmed
+def sample_time(sample):
+    return sample.get("t", 0)
 
 
 # -----------------------------------------------------------------------------
@@ -82,24 +82,63 @@ def format_marker_label(marker):
 
 
 # -----------------------------------------------------------------------------
-# placeholder for raw ADC → mv conversion
-# will update later once microcontroller protocol is confirmed
+# batch kernels
+# whole packet batches as numpy arrays, missing values are NaN
 # -----------------------------------------------------------------------------
-def convert_raw_samples(raw_list, scale=1.0):
-    # raw_list may be ints; convert to {"t": <ms>, "value": <float>}
-    out = []
-    timestamp = 0
+SAMPLE_PERIOD_MS = 2         # 500 Hz, live data is timed by egram_clock
+COUNTS_TO_MV = 0.1           # one int8 count = 0.1 mV
+
+PACKET_SIZE = FRAME_SIZE
+PACKET_HEADER = tuple(SYNC_WORD)
+VENT_BYTE = 18
+ATRIAL_BYTE = 19
+
 
-    for value in raw_list:
-        sample = {}
-        sample["t"] = timestamp
-        sample["value"] = value * scale
+def samples_to_arrays(samples):
+    # SampleBlock or [{"t", "value"}] -> (timestamps, values) float arrays
+    block = SampleBlock.coerce(samples)
+    return block.t, block.values
 
-        out.append(sample)
 
-        # assume 2 ms between samples (placeholder)
-        timestamp = timestamp + 2
+def scale_values(values, factor):
+    # gain / unit scaling of a whole batch
+    return np.asarray(values, dtype=np.float64) * factor
 
+
+def sample_times(count, start_ms=0, period_ms=SAMPLE_PERIOD_MS):
+    return start_ms + np.arange(count, dtype=np.float64) * period_ms
+
+
+def counts_to_mv(raw, scale=COUNTS_TO_MV):
+    # raw ADC / int8 counts (any integer array or bytes of int8) -> mV
+    if isinstance(raw, (bytes, bytearray, memoryview)):
+        raw = np.frombuffer(raw, dtype=np.int8)
+    return np.asarray(raw, dtype=np.float64) * scale
+
+
+def decode_packets(data, scale=COUNTS_TO_MV):
+    # back-to-back 20 byte packets (bytes or uint8 array) -> (atrial, ventricular)
+    # mV arrays; packets with a bad header come back as NaN
+    packets = np.frombuffer(data, dtype=np.uint8)
+    packets = packets[:len(packets) - len(packets) % PACKET_SIZE].reshape(-1, PACKET_SIZE)
+
+    valid = (packets[:, 0] == PACKET_HEADER[0]) & (packets[:, 1] == PACKET_HEADER[1])
+    atrial = counts_to_mv(packets[:, ATRIAL_BYTE].view(np.int8), scale)
+    vent = counts_to_mv(packets[:, VENT_BYTE].view(np.int8), scale)
+    atrial[~valid] = np.nan
+    vent[~valid] = np.nan
+    return atrial, vent
+
+
+def convert_raw_samples(raw_list, scale=1.0, clock=None):
+    # raw_list may be ints; convert to {"t": <ms>, "value": <float>}
+    # timestamps come from clock (egram_clock.SampleClock) when given,
+    # otherwise a fixed sample period starting at 0
+    t = clock.stamp(len(raw_list)) if clock is not None else sample_times(len(raw_list))
+    values = scale_values(raw_list, scale)
+    out = []
+    for ts, value in zip(t.tolist(), values.tolist()):
+        out.append({"t": int(ts) if ts.is_integer() else ts, "value": value})
     return out
 
 
@@ -107,6 +146,12 @@ def convert_raw_samples(raw_list, scale=1.0):
 # helper to merge sample lists for plotting
 # -----------------------------------------------------------------------------
 def append_and_trim(existing, new_samples, window_ms):
+    if isinstance(new_samples, SampleBlock):
+        existing = SampleBlock.coerce(existing or [])
+        combined = SampleBlock(np.concatenate([existing.t, new_samples.t]),
+                               np.concatenate([existing.values, new_samples.values]))
+        return trim_window(combined, window_ms)
+
     # start with empty list if no existing samples
     if existing is None or len(existing) == 0:
         combined = []
@@ -129,23 +174,18 @@ def append_and_trim(existing, new_samples, window_ms):
     combined = trim_window(combined, window_ms)
     return combined
 
-def read_egram_packets(serial_port, running_flag, packet_size, on_packet):
-    buffer = bytearray()
+
+# -----------------------------------------------------------------------------
+# serial packet reader
+# -----------------------------------------------------------------------------
+def read_egram_packets(serial_port, running_flag, packet_size, on_packet, framer=None):
+    # framer can be passed in to keep its stats (PacketFramer.stats)
+    if framer is None:
+        framer = PacketFramer(packet_size)
 
     while running_flag():
         if serial_port.in_waiting:
-            buffer += serial_port.read(serial_port.in_waiting)
-
-            while len(buffer) >= packet_size:
-                if not (buffer[0] == 0xAA and buffer[1] == 0x22):
-                    buffer.pop(0)
-                    continue
-
-                packet = buffer[:packet_size]
-                buffer = buffer[packet_size:]
-
-                print(f"[DEBUG] Packet received ({len(packet)} bytes): {list(packet)}")
-
+            for packet in framer.feed(serial_port.read(serial_port.in_waiting)):
                 on_packet(packet)
 
-        time.sleep(0.001)
\ No newline at end of file
+        time.sleep(0.001)
@@ -0,0 +1,281 @@
+# -----------------------------------------------------------------------------
+# EGRAM WRITE-BEHIND
+# Batches egram appends in memory and flushes them from a background thread
+# every append is first written to a small redo journal, so once a call
+# returns the data survives a crash of the app; surviving a power loss as
+# well needs fsync=True (one fsync per append)
+# a batch that fails to apply (disk full, I/O error) stays queued and in its
+# journal, and is retried on the next flush
+# -----------------------------------------------------------------------------
+
+import glob
+import os
+import struct
+import threading
+import time
+import zlib
+
+# journal record = crc32, path length, target offset, data length, path, data
+JOURNAL_HEAD = struct.Struct("<IHQI")
+
+
+# -----------------------------------------------------------------------------
+# journal record helpers
+# -----------------------------------------------------------------------------
+def encode_record(path, offset, data):
+    path_bytes = path.encode("utf-8")
+    crc = zlib.crc32(struct.pack("<Q", offset) + path_bytes + data)
+    head = JOURNAL_HEAD.pack(crc, len(path_bytes), offset, len(data))
+    return head + path_bytes + data
+
+
+def read_journal(journal_path):
+    # yields (path, offset, data) and stops at the first torn / corrupt record
+    with open(journal_path, "rb") as f:
+        raw = f.read()
+
+    pos = 0
+    while pos + JOURNAL_HEAD.size <= len(raw):
+        crc, path_len, offset, data_len = JOURNAL_HEAD.unpack_from(raw, pos)
+        start = pos + JOURNAL_HEAD.size
+        end = start + path_len + data_len
+        if end > len(raw):
+            break
+
+        path_bytes = raw[start:start + path_len]
+        data = raw[start + path_len:end]
+        if zlib.crc32(struct.pack("<Q", offset) + path_bytes + data) != crc:
+            break
+
+        yield path_bytes.decode("utf-8"), offset, data
+        pos = end
+
+
+def apply_record(path, offset, data):
+    # idempotent: writing the same record twice leaves the file unchanged
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size >= offset + len(data):
+        return
+    if size < offset:
+        raise IOError(f"journal gap in {path}: file has {size} bytes, record starts at {offset}")
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as f:
+        f.seek(offset)
+        f.write(data)
+
+
+# -----------------------------------------------------------------------------
+# write-behind appender
+# -----------------------------------------------------------------------------
+class WriteBehind:
+    def __init__(self, root, flush_interval=0.25, max_batch=256, fsync=False):
+        self.root = root
+        self.journal_path = os.path.join(root, "journal.bin")
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+
+        # pending (path, offset, data) records not yet applied to their files
+        self.pending = []
+
+        # logical file sizes including pending appends, keyed by relative path
+        self.sizes = {}
+        self.rotation = 0
+
+        # rotated journals of batches that failed to apply, removed once the
+        # retry succeeds
+        self.kept_journals = []
+
+        # metrics
+        self.flush_count = 0
+        self.records_flushed = 0
+        self.bytes_flushed = 0
+        self.last_batch = 0
+        self.max_batch_seen = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.total_latency_ms = 0.0
+        self.max_queue_depth = 0
+
+        os.makedirs(root, exist_ok=True)
+        self.recover()
+        self.journal = open(self.journal_path, "ab")
+
+    # ---- crash recovery ------------------------------------------------------
+    def journal_files(self):
+        rotated = glob.glob(self.journal_path + ".*")
+        rotated.sort(key=lambda p: int(p.rsplit(".", 1)[1]))
+        if os.path.exists(self.journal_path):
+            rotated.append(self.journal_path)
+        return rotated
+
+    def recover(self):
+        # replay every journal left behind by a previous run, oldest first
+        for journal_path in self.journal_files():
+            for path, offset, data in read_journal(journal_path):
+                apply_record(os.path.join(self.root, path), offset, data)
+            os.remove(journal_path)
+
+    # ---- producers -----------------------------------------------------------
+    def append(self, path, data):
+        if not data:
+            return
+
+        rel_path = os.path.relpath(path, self.root)
+
+        with self.lock:
+            offset = self.sizes.get(rel_path)
+            if offset is None:
+                offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+            self.journal.write(encode_record(rel_path, offset, data))
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+
+            self.pending.append((rel_path, offset, data))
+            self.sizes[rel_path] = offset + len(data)
+
+            depth = len(self.pending)
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+        if depth >= self.max_batch:
+            self.wake.set()
+
+    # ---- flushing ------------------------------------------------------------
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                batch = self.pending
+                if not batch:
+                    return 0
+                self.pending = []
+
+                # new appends go to a fresh journal while this batch is applied
+                self.journal.close()
+                self.rotation += 1
+                rotated = f"{self.journal_path}.{self.rotation}"
+                os.replace(self.journal_path, rotated)
+                self.journal = open(self.journal_path, "ab")
+
+            start = time.perf_counter()
+            try:
+                written = self.apply_batch(batch)
+            except Exception:
+                # back in front of the newer appends; sizes already count it
+                with self.lock:
+                    self.pending = batch + self.pending
+                    self.kept_journals.append(rotated)
+                raise
+
+            for journal_path in self.kept_journals + [rotated]:
+                os.remove(journal_path)
+            self.kept_journals = []
+            latency_ms = (time.perf_counter() - start) * 1000.0
+
+            self.flush_count += 1
+            self.records_flushed += len(batch)
+            self.bytes_flushed += written
+            self.last_batch = len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.last_latency_ms = latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            self.total_latency_ms += latency_ms
+            return len(batch)
+
+    def apply_batch(self, batch):
+        # group records per file (packets interleave channels) and merge
+        # back-to-back records into one write per file
+        runs = {}
+        for path, offset, data in batch:
+            file_runs = runs.setdefault(path, [])
+            if file_runs and file_runs[-1][0] + file_runs[-1][1] == offset:
+                file_runs[-1][1] += len(data)
+                file_runs[-1][2].append(data)
+            else:
+                file_runs.append([offset, len(data), [data]])
+
+        written = 0
+        for path, file_runs in runs.items():
+            for offset, _, chunks in file_runs:
+                written += self.write_run(path, offset, chunks)
+        return written
+
+    def write_run(self, rel_path, offset, chunks):
+        data = b"".join(chunks)
+        path = os.path.join(self.root, rel_path)
+        apply_record(path, offset, data)
+        if self.fsync:
+            with open(path, "rb+") as f:
+                os.fsync(f.fileno())
+        return len(data)
+
+    def forget(self, path):
+        # called when a file is rewritten or removed outside the writer
+        rel_path = os.path.relpath(path, self.root)
+        self.flush()
+        with self.lock:
+            self.sizes.pop(rel_path, None)
+
+    # ---- background thread ---------------------------------------------------
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # data stays in the journal and is replayed on next start
+                print("[EGRAM ERROR] write-behind flush:", e)
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        self.journal.close()
+
+    # ---- metrics -------------------------------------------------------------
+    def metrics(self):
+        with self.lock:
+            depth = len(self.pending)
+            queued_bytes = sum(len(r[2]) for r in self.pending)
+
+        avg_latency = self.total_latency_ms / self.flush_count if self.flush_count else 0.0
+        avg_batch = self.records_flushed / self.flush_count if self.flush_count else 0.0
+
+        return {
+            "queue_depth": depth,
+            "queued_bytes": queued_bytes,
+            "max_queue_depth": self.max_queue_depth,
+            "flushes": self.flush_count,
+            "records_flushed": self.records_flushed,
+            "bytes_flushed": self.bytes_flushed,
+            "last_batch_size": self.last_batch,
+            "max_batch_size": self.max_batch_seen,
+            "avg_batch_size": avg_batch,
+            "last_flush_ms": self.last_latency_ms,
+            "max_flush_ms": self.max_latency_ms,
+            "avg_flush_ms": avg_latency
+        }
@@ -12,17 +12,25 @@ from egram.egram_storage import (
     get_or_start_session,
     add_samples,
     add_marker,
-    set_telemetry
+    set_telemetry,
+    get_channel_arrays
 )
-from egram.egram_utils import read_egram_packets
+from egram.egram_render import RenderScheduler, RENDER_FPS
+from egram.egram_report import submit_report
+from egram.egram_samples import SampleBlock
+from egram.egram_framer import PacketFramer
+from egram.egram_clock import SampleClock
+from egram.egram_utils import decode_packets, sample_times
 from helper.serial_comm import PacemakerSerial
 import threading
 import time
 
+import numpy as np
+
 # ==============================================
 #  PARSE TELEMETRY PACKET (20 bytes from MCU)
 # ==============================================
-def parse_egram_packet(packet_bytes):
+def parse_egram_packet(packet_bytes, t=0):
     if len(packet_bytes) != 20:
         print("[DEBUG] Packet ignored: wrong length", len(packet_bytes))
         return None
@@ -40,8 +48,8 @@ def parse_egram_packet(packet_bytes):
     print(f"[DEBUG] Parsed Packet → atrial: {atr_mV} mV, ventricular: {vent_mV} mV")
 
     return {
-        "atrial": [{"t": 0, "value": atr_mV}],
-        "ventricular": [{"t": 0, "value": vent_mV}],
+        "atrial": SampleBlock([t], [atr_mV]),
+        "ventricular": SampleBlock([t], [vent_mV]),
         "markers": []
     }
     
@@ -61,6 +69,8 @@ class EgramScreen(tk.Frame):
         self.canvas = None
         self.collecting = False
         self.active_patient = None
+        self.framer = None
+        self.clock = None
 
 
         # UI layout
@@ -84,10 +94,13 @@ class EgramScreen(tk.Frame):
         self.build_controls()
         self.build_plot_container()
 
-        # Initialize the empty plot
+        # Initialize the empty plot, embedded once for the life of the screen
         self.plot = EgramPlot(window_seconds=5)
         self.setup_plot_canvas()
 
+        # plot updates are drawn at a capped frame rate, not per packet
+        self.renderer = RenderScheduler(self, self.apply_updates, self.draw_plot, fps=RENDER_FPS)
+
         # Update axes visibility based on selected channels
         self.update_plot_mode()
 
@@ -175,6 +188,18 @@ class EgramScreen(tk.Frame):
         )
         stop_btn.pack(side="top", anchor="e", pady=2)
 
+        print_btn = tk.Button(
+            right_frame,
+            text="Print Report",
+            width=10,
+            bg=self.BTN_BG,
+            fg=self.BTN_FG,
+            activebackground=self.BTN_ACTIVE_BG,
+            activeforeground=self.BTN_ACTIVE_FG,
+            command=self.print_report
+        )
+        print_btn.pack(side="top", anchor="e", pady=2)
+
 
     # -------------------------------------------------------------------------
     # Control widgets
@@ -229,6 +254,7 @@ class EgramScreen(tk.Frame):
             controls,
             text="High-pass Filter",
             variable=self.hpf_var,
+            command=self.toggle_high_pass,
             bg=self.DARK_BG,
             fg=self.FG_COLOR,
             selectcolor=self.DARK_BG
@@ -240,6 +266,7 @@ class EgramScreen(tk.Frame):
             controls,
             text="Event Markers",
             variable=self.marker_var,
+            command=self.toggle_markers,
             bg=self.DARK_BG,
             fg=self.FG_COLOR,
             selectcolor=self.DARK_BG
@@ -279,24 +306,22 @@ class EgramScreen(tk.Frame):
         self.canvas = FigureCanvasTkAgg(fig, master=self.plot_area)
         self.canvas.get_tk_widget().pack(fill="both", expand=True)
 
+        # live updates blit the traces over a cached background
+        self.plot.attach(self.canvas)
+
     # -------------------------------------------------------------------------
     # Update axes visibility based on selected channels
     # -------------------------------------------------------------------------
     def update_plot_mode(self):
         selected = self.channel_var.get()
 
-        # Reset all axes buffers
-        self.plot.reset()
-
-        # Redraw the figure for the selected mode
-        self.plot.redraw(selected)
-
-        # Remove the old canvas and embed a fresh one
-        if self.canvas:
-            self.canvas.get_tk_widget().destroy()
+        # Same canvas and buffers for every mode, only the axes layout
+        # changes (samples keep arriving for hidden channels too)
+        if self.canvas is None:
+            self.setup_plot_canvas()
 
-        self.setup_plot_canvas()  # creates a fresh FigureCanvasTkAgg
-        self.canvas.draw()
+        # Lay out and draw the figure for the selected mode
+        self.plot.blit(selected)
 
     # -------------------------------------------------------------------------
     # Navigation
@@ -337,12 +362,17 @@ class EgramScreen(tk.Frame):
 
         self.collecting = True
         self.telemetry_label.config(text="Telemetry: Connected", fg="green")
+        self.renderer.start()
 
         # -----------------------------
         # Unified read loop
         # -----------------------------
+        # resync / frame rate counters stay readable via self.framer.stats()
+        self.framer = PacketFramer()
+        if self.clock is None:
+            self.clock = self.start_clock()
+
         def read_loop():
-            buffer = bytearray()
             while self.collecting:
                 try:
                     if not ser or not ser.ser or not ser.ser.is_open:
@@ -352,23 +382,14 @@ class EgramScreen(tk.Frame):
                     # Read all available bytes
                     in_waiting = ser.ser.in_waiting
                     if in_waiting:
-                        buffer += ser.ser.read(in_waiting)
-
                         # Extract full 20-byte packets
-                        while len(buffer) >= 20:
-                            # Check header
-                            if not (buffer[0] == 0xAA and buffer[1] == 0x22):
-                                buffer.pop(0)
-                                continue
+                        frames = self.framer.feed(ser.ser.read(in_waiting))
 
-                            packet = buffer[:20]
-                            buffer = buffer[20:]
-
-                            # --- Parse packet and update plots ---
-                            payload = parse_egram_packet(packet)
-                            if payload:
-                                self.handle_incoming_data(payload)
+                        # --- Parse packets and update plots ---
+                        if frames:
+                            self.handle_frames(frames)
 
+                        for packet in frames:
                             # --- Telemetry 19th/20th byte ---
                             byte19, byte20 = packet[18], packet[19]
                             telemetry_value = (byte19 << 8) | byte20
@@ -389,12 +410,65 @@ class EgramScreen(tk.Frame):
         threading.Thread(target=read_loop, daemon=True).start()
         
 
+    def toggle_high_pass(self):
+        # live switch, the plot keeps its buffers
+        self.plot.set_high_pass(self.hpf_var.get())
+
+    def toggle_markers(self):
+        self.plot.show_markers = self.marker_var.get()
+        if self.renderer.running:
+            self.renderer.request_draw()
+        else:
+            # stopped or recorded session: no frame is coming, draw now
+            self.plot.blit(self.channel_var.get())
+
+    def start_clock(self):
+        # a reused session already has samples, continue after the last one
+        settings = self.session["settings"] or {}
+        rate = settings.get("sampling_rate_hz", 500)
+        start_ms = 0
+        for channel in ["atrial", "ventricular"]:
+            t, _ = get_channel_arrays(self.session["session_id"], channel)
+            if len(t):
+                start_ms = max(start_ms, t[-1] + 1000.0 / rate)
+        return SampleClock(rate, start_ms=start_ms)
+
     def stop_collection(self):
         self.collecting = False
+        if self.framer:
+            print("[EGRAM] serial framing:", self.framer.stats())
+        if self.clock:
+            print("[EGRAM] sample clock:", self.clock.stats())
+        if self.renderer.running:
+            self.renderer.stop()
+            print("[EGRAM] rendering:", self.renderer.stats())
         if self.session:
-            set_telemetry(self.session["session_id"], "disconnected")
+            set_telemetry(self.session["session_id"], "disconnected", wait=False)
         self.telemetry_label.config(text="Telemetry: Disconnected", fg="red")
 
+    # -------------------------------------------------------------------------
+    # Report printing (rendered in a worker process, see egram/egram_report.py)
+    # -------------------------------------------------------------------------
+    def print_report(self):
+        if not self.session:
+            print("Warning: No session to print.")
+            return
+
+        job = submit_report(self.session["session_id"], "pdf", patient=self.active_patient)
+        self.after(200, self.check_report, job)
+
+    def check_report(self, job):
+        # poll from the Tk loop, Tk widgets must not be touched from the
+        # thread that completes the job
+        if not job.done():
+            self.after(200, self.check_report, job)
+            return
+
+        if job.exception() is not None:
+            print("[EGRAM ERROR] report:", job.exception())
+        else:
+            print("[EGRAM] report saved to", job.result())
+
     # -------------------------------------------------------------------------
     # Update loop (periodic)
     # -------------------------------------------------------------------------
@@ -403,45 +477,73 @@ class EgramScreen(tk.Frame):
             return
 
         # Demo/fake data
-        samples = [{"t": i*2, "value": i % 10 / 10.0} for i in range(20)]
+        t = sample_times(20)
+        samples = SampleBlock(t, np.arange(20) % 10 / 10.0)
         selected = self.channel_var.get()
 
+        payload = {}
         if selected in ["atrial", "both"]:
-            self.plot.update_samples("atrial", samples, self.egm_gain_var.get())
-            add_samples(self.session["session_id"], "atrial", samples)
+            payload["atrial"] = samples
         if selected in ["ventricular", "both"]:
-            self.plot.update_samples("ventricular", samples, self.egm_gain_var.get())
-            add_samples(self.session["session_id"], "ventricular", samples)
+            payload["ventricular"] = samples
         if selected == "surface":
-            self.plot.update_samples("surface", samples, self.ecg_gain_var.get())
-            add_samples(self.session["session_id"], "surface", samples)
+            payload["surface"] = samples
 
-        self.plot.redraw(selected)
-        self.canvas.draw()
+        self.handle_incoming_data(payload)
         self.after(100, self.update_plot_loop)
 
     # -------------------------------------------------------------------------
     # Handle incoming data from device
     # -------------------------------------------------------------------------
+    def handle_frames(self, frames):
+        # one batch of 20-byte packets, decoded and timestamped together
+        # (no sequence counter in the packet yet: host clock timing)
+        atrial, vent = decode_packets(b"".join(frames))
+        t = self.clock.stamp(len(frames))
+        self.handle_incoming_data({
+            "atrial": SampleBlock(t, atrial),
+            "ventricular": SampleBlock(t, vent),
+            "markers": []
+        })
+
     def handle_incoming_data(self, payload):
         if not self.collecting:
             return
 
         print("[DEBUG] handle_incoming_data called with payload:", payload)
 
+        # storage right away, the plot on the next frame (Tk thread)
         for channel in ["atrial", "ventricular", "surface"]:
             if channel in payload:
-                gain = self.egm_gain_var.get() if channel != "surface" else self.ecg_gain_var.get()
-                self.plot.update_samples(channel, payload[channel], gain)
-                add_samples(self.session["session_id"], channel, payload[channel])
+                add_samples(self.session["session_id"], channel, payload[channel], wait=False)
                 print(f"[DEBUG] {channel} channel updated with {payload[channel]}")
 
         if "markers" in payload:
             for m in payload["markers"]:
-                self.plot.add_marker(m)
-                add_marker(self.session["session_id"], m)
+                add_marker(self.session["session_id"], m, wait=False)
                 print("[DEBUG] Marker added:", m)
 
-        self.canvas.draw()
+        self.renderer.post(payload)
+
+    # -------------------------------------------------------------------------
+    # Render scheduler callbacks (Tk thread, see egram/egram_render.py)
+    # -------------------------------------------------------------------------
+    def apply_updates(self, payloads):
+        # every payload posted since the last frame: one plot update per channel
+        for channel in ["atrial", "ventricular", "surface"]:
+            blocks = [SampleBlock.coerce(p[channel]) for p in payloads if channel in p]
+            if not blocks:
+                continue
+            gain = self.egm_gain_var.get() if channel != "surface" else self.ecg_gain_var.get()
+            t = np.concatenate([b.t for b in blocks])
+            values = np.concatenate([b.values for b in blocks])
+            self.plot.update_arrays(channel, t, values, gain)
+
+        for payload in payloads:
+            for m in payload.get("markers", []):
+                self.plot.add_marker(m)
+
+    def draw_plot(self):
+        self.plot.blit(self.channel_var.get())
 
     
\ No newline at end of file
@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import messagebox
-from helper.storage import save_json
+from helper.storage import save_users
 
 
 # -----------------------------------------------------------------------------
@@ -20,7 +20,7 @@ def register_user(users, username, password, data_path):
     new_user = {"username": username, "password": password}
     users.append(new_user)
 
-    save_json(data_path, {"users": users})
+    save_users(data_path, users)
     return True, "User registered successfully."
 
 
@@ -220,18 +220,15 @@ def save_patient_from_dashboard(dashboard):
         messagebox.showwarning("Missing Fields", "Patient Name, Model, and Serial are required.")
         return
 
-    existing_patients = storage.load_all_patients()
-    existing_dcm_serials = []
-
-    for p in existing_patients:
-        if "device" in p and "dcm_serial" in p["device"]:
-            existing_dcm_serials.append(p["device"]["dcm_serial"])
-
     if dashboard.patient and "device" in dashboard.patient and "dcm_serial" in dashboard.patient["device"]:
         dcm_serial = dashboard.patient["device"]["dcm_serial"]
     else:
-        next_num = len(existing_dcm_serials) + 1
+        # next free serial, checked against the dcm_serial lookup
+        next_num = len(dashboard.patients) + 1
         dcm_serial = "DCM-" + str(next_num).zfill(3)
+        while storage.load_patient_by_dcm_serial(dcm_serial) is not None:
+            next_num += 1
+            dcm_serial = "DCM-" + str(next_num).zfill(3)
 
     # Gather parameters from entries
     parameters = {}
@@ -265,7 +262,11 @@ def save_patient_from_dashboard(dashboard):
 
     # Save patient data
     storage.save_patient_to_file(new_patient)
-    dashboard.patients = storage.load_all_patients()
+    # keep the dropdown list in step without reloading every patient
+    if any(p.get("id") == patient_id for p in dashboard.patients):
+        dashboard.patients = [new_patient if p.get("id") == patient_id else p for p in dashboard.patients]
+    else:
+        dashboard.patients = dashboard.patients + [new_patient]
     dashboard.patient = new_patient
     dashboard.refresh_patient_dropdown()
     dashboard.patient_var.set(patient_name)
@@ -331,7 +332,7 @@ def remove_patient(dashboard):
     confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to remove patient {patient_id}?")
     if confirm:
         storage.delete_patient(patient_id)
-        dashboard.patients = storage.load_all_patients()
+        dashboard.patients = [p for p in dashboard.patients if p.get("id") != patient_id]
         dashboard.patient = None
         dashboard.clear_fields()
         dashboard.refresh_patient_dropdown()
@@ -0,0 +1,288 @@
+# SQLITE STORE
+# optional database backend for patients, users and egram session metadata
+# plug in with helper.storage.use_backend() / egram_storage.use_metadata_backend()
+# the JSON files in data/ stay supported as an import source
+
+import json
+import os
+import sqlite3
+import threading
+
+
+DB_FILE = os.path.join("data", "dcm.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS patients (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    dcm_serial TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS patients_name ON patients(name);
+CREATE INDEX IF NOT EXISTS patients_dcm_serial ON patients(dcm_serial);
+
+CREATE TABLE IF NOT EXISTS egram_sessions (
+    session_id TEXT PRIMARY KEY,
+    patient_id TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    legacy INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS egram_sessions_patient ON egram_sessions(patient_id, start_time);
+CREATE INDEX IF NOT EXISTS egram_sessions_start ON egram_sessions(start_time);
+
+CREATE TABLE IF NOT EXISTS egram_markers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    timestamp_ms REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS egram_markers_session_time ON egram_markers(session_id, timestamp_ms);
+
+CREATE TABLE IF NOT EXISTS egram_status (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    time TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS egram_status_session ON egram_status(session_id);
+"""
+
+
+class SqliteStore:
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        # sqlite connections cannot be shared between threads, so the
+        # acquisition thread and the Tk thread each get their own; WAL mode
+        # lets one of them write while the other keeps reading
+        self.local = threading.local()
+
+        conn = self.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    # -----------------------------
+    # connection helpers
+    # -----------------------------
+    def connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self.local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        conn = self.connect()
+        with conn:
+            return conn.execute(sql, params)
+
+    def query(self, sql, params=()):
+        return self.connect().execute(sql, params).fetchall()
+
+    def close(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def get_meta(self, key, default=None):
+        rows = self.query("SELECT value FROM meta WHERE key = ?", (key,))
+        if not rows:
+            return default
+        return json.loads(rows[0][0])
+
+    def set_meta(self, key, value):
+        self.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value))
+        )
+
+    # -----------------------------
+    # users
+    # -----------------------------
+    def load_users(self):
+        rows = self.query("SELECT data FROM users ORDER BY rowid")
+        return [json.loads(r[0]) for r in rows]
+
+    def save_users(self, users):
+        conn = self.connect()
+        with conn:
+            conn.execute("DELETE FROM users")
+            conn.executemany(
+                "INSERT INTO users (username, data) VALUES (?, ?)",
+                [(u["username"], json.dumps(u)) for u in users]
+            )
+
+    # -----------------------------
+    # patients
+    # -----------------------------
+    def load_all_patients(self):
+        rows = self.query("SELECT data FROM patients ORDER BY rowid")
+        return [json.loads(r[0]) for r in rows]
+
+    def load_patient_by_id(self, patient_id):
+        rows = self.query("SELECT data FROM patients WHERE id = ?", (patient_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def load_patient_by_name(self, name):
+        rows = self.query("SELECT data FROM patients WHERE name = ? ORDER BY rowid LIMIT 1", (name,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def load_patient_by_dcm_serial(self, dcm_serial):
+        rows = self.query("SELECT data FROM patients WHERE dcm_serial = ? ORDER BY rowid LIMIT 1", (dcm_serial,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def save_patient(self, patient):
+        # upsert keeps the rowid, so the patient keeps its place in the list
+        dcm_serial = patient.get("device", {}).get("dcm_serial")
+        self.execute(
+            "INSERT INTO patients (id, name, dcm_serial, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, "
+            "dcm_serial = excluded.dcm_serial, data = excluded.data",
+            (patient["id"], patient.get("name"), dcm_serial, json.dumps(patient))
+        )
+
+    def delete_patient(self, patient_id):
+        self.execute("DELETE FROM patients WHERE id = ?", (patient_id,))
+
+    # -----------------------------
+    # egram session headers
+    # -----------------------------
+    def put_session_entries(self, entries):
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO egram_sessions (session_id, patient_id, start_time, end_time, legacy, data) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET patient_id = excluded.patient_id, "
+                "start_time = excluded.start_time, end_time = excluded.end_time, "
+                "legacy = excluded.legacy, data = excluded.data",
+                [
+                    (e["session_id"], e.get("patient_id"), e.get("start_time"), e.get("end_time"),
+                     1 if e.get("legacy") else 0, json.dumps(e))
+                    for e in entries
+                ]
+            )
+
+    def get_session_entry(self, session_id):
+        rows = self.query("SELECT data FROM egram_sessions WHERE session_id = ?", (session_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def session_entries(self, patient_id=None):
+        if patient_id is None:
+            rows = self.query("SELECT data FROM egram_sessions ORDER BY start_time")
+        else:
+            rows = self.query(
+                "SELECT data FROM egram_sessions WHERE patient_id = ? ORDER BY start_time",
+                (patient_id,)
+            )
+        return [json.loads(r[0]) for r in rows]
+
+    def session_count(self):
+        return self.query("SELECT COUNT(*) FROM egram_sessions")[0][0]
+
+    def replace_legacy_sessions(self, entries):
+        conn = self.connect()
+        with conn:
+            conn.execute("DELETE FROM egram_sessions WHERE legacy = 1")
+            conn.executemany(
+                "INSERT OR IGNORE INTO egram_sessions "
+                "(session_id, patient_id, start_time, end_time, legacy, data) VALUES (?, ?, ?, ?, 1, ?)",
+                [
+                    (e["session_id"], e.get("patient_id"), e.get("start_time"), e.get("end_time"), json.dumps(e))
+                    for e in entries
+                ]
+            )
+
+    # -----------------------------
+    # egram markers / telemetry log
+    # -----------------------------
+    def append_markers(self, session_id, markers):
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO egram_markers (session_id, timestamp_ms, data) VALUES (?, ?, ?)",
+                [(session_id, m.get("timestamp_ms"), json.dumps(m)) for m in markers]
+            )
+
+    def read_markers(self, session_id):
+        rows = self.query(
+            "SELECT data FROM egram_markers WHERE session_id = ? ORDER BY id",
+            (session_id,)
+        )
+        return [json.loads(r[0]) for r in rows]
+
+    def read_markers_range(self, session_id, t_start, t_end):
+        rows = self.query(
+            "SELECT data FROM egram_markers WHERE session_id = ? "
+            "AND timestamp_ms BETWEEN ? AND ? ORDER BY timestamp_ms, id",
+            (session_id, t_start, t_end)
+        )
+        return [json.loads(r[0]) for r in rows]
+
+    def append_status(self, session_id, entries):
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO egram_status (session_id, time, status) VALUES (?, ?, ?)",
+                [(session_id, e.get("time"), e.get("status")) for e in entries]
+            )
+
+    def replace_logs(self, session_id, markers, status):
+        # one transaction, so readers never see a half-replaced log
+        conn = self.connect()
+        with conn:
+            conn.execute("DELETE FROM egram_markers WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM egram_status WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO egram_markers (session_id, timestamp_ms, data) VALUES (?, ?, ?)",
+                [(session_id, m.get("timestamp_ms"), json.dumps(m)) for m in markers]
+            )
+            conn.executemany(
+                "INSERT INTO egram_status (session_id, time, status) VALUES (?, ?, ?)",
+                [(session_id, e.get("time"), e.get("status")) for e in status]
+            )
+
+    def read_status(self, session_id):
+        rows = self.query(
+            "SELECT time, status FROM egram_status WHERE session_id = ? ORDER BY id",
+            (session_id,)
+        )
+        return [{"time": r[0], "status": r[1]} for r in rows]
+
+    # -----------------------------
+    # import from the JSON files
+    # -----------------------------
+    def is_empty(self):
+        users = self.query("SELECT COUNT(*) FROM users")[0][0]
+        patients = self.query("SELECT COUNT(*) FROM patients")[0][0]
+        return users == 0 and patients == 0
+
+    def import_json(self, patients_file=None, users_file=None):
+        if patients_file and os.path.exists(patients_file):
+            with open(patients_file, "r") as f:
+                for patient in json.load(f).get("patients", []):
+                    self.save_patient(patient)
+
+        if users_file and os.path.exists(users_file):
+            with open(users_file, "r") as f:
+                self.save_users(json.load(f).get("users", []))
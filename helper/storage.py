@@ -7,6 +7,17 @@ import os
 
 PATIENTS_FILE = os.path.join("data", "patients.json")
 
+# optional database backend (helper.sqlite_store.SqliteStore)
+# None keeps everything in the JSON files
+BACKEND = None
+
+
+# select the backend used by the patient / user helpers below
+def use_backend(backend):
+    global BACKEND
+    BACKEND = backend
+
+
 # helper function to load the user data from user.json 
 def load_json(filepath, default_data):
     if not os.path.exists(filepath):
@@ -22,12 +33,30 @@ def save_json(filepath, data):
 
     with open(filepath, "w") as f:
         json.dump(data, f, indent=4)
+
+
+# -----------------------------
+# Load / save registered users
+# -----------------------------
+def load_users(filepath):
+    if BACKEND is not None:
+        return {"users": BACKEND.load_users()}
+    return load_json(filepath, {"users": []})
+
+
+def save_users(filepath, users):
+    if BACKEND is not None:
+        BACKEND.save_users(users)
+        return
+    save_json(filepath, {"users": users})
         
         
 # -----------------------------
 # Load all patients from file
 # -----------------------------
 def load_all_patients():
+    if BACKEND is not None:
+        return BACKEND.load_all_patients()
     if not os.path.exists(PATIENTS_FILE):
         return []
     try:
@@ -41,16 +70,43 @@ def load_all_patients():
 # Load a patient by name
 # -----------------------------
 def load_patient_by_name(name):
+    if BACKEND is not None:
+        return BACKEND.load_patient_by_name(name)
     patients = load_all_patients()
     for p in patients:
         if p["name"] == name:
             return p
     return None
 
+# -----------------------------
+# Load a patient by ID
+# -----------------------------
+def load_patient_by_id(patient_id):
+    if BACKEND is not None:
+        return BACKEND.load_patient_by_id(patient_id)
+    for p in load_all_patients():
+        if p.get("id") == patient_id:
+            return p
+    return None
+
+# -----------------------------
+# Load a patient by DCM serial
+# -----------------------------
+def load_patient_by_dcm_serial(dcm_serial):
+    if BACKEND is not None:
+        return BACKEND.load_patient_by_dcm_serial(dcm_serial)
+    for p in load_all_patients():
+        if p.get("device", {}).get("dcm_serial") == dcm_serial:
+            return p
+    return None
+
 # -----------------------------
 # Save or update a patient
 # -----------------------------
 def save_patient_to_file(patient):
+    if BACKEND is not None:
+        BACKEND.save_patient(patient)
+        return
     patients = load_all_patients()
     updated = False
     
@@ -70,6 +126,11 @@ def save_patient_to_file(patient):
 # Delete a patient by ID
 # -----------------------------
 def delete_patient(patient_id):
+    if BACKEND is not None:
+        BACKEND.delete_patient(patient_id)
+        print(f"Patient with ID {patient_id} has been deleted.")
+        return
+
     # Load all patients
     patients = load_all_patients()
     updated_patients = []
@@ -9,12 +9,30 @@
 
 import tkinter as tk
 import os
-from helper.storage import load_json
+from helper import storage
+from helper.sqlite_store import SqliteStore, DB_FILE
+from egram import egram_storage
 from gui.login_screen import LoginFrame
 from gui.register_screen import RegisterFrame
 from gui.dashboard import Dashboard
 from gui.egram_screen import EgramScreen
 
+# "json" keeps everything in the files under data/
+# "sqlite" keeps users, patients and egram session metadata in data/dcm.sqlite3
+# (the JSON files are imported the first time the database is created)
+STORAGE_BACKEND = "json"
+
+
+def setup_storage(users_path):
+    if STORAGE_BACKEND != "sqlite":
+        return
+
+    db = SqliteStore(DB_FILE)
+    if db.is_empty():
+        db.import_json(storage.PATIENTS_FILE, users_path)
+    storage.use_backend(db)
+    egram_storage.use_metadata_backend(db)
+
 
 class DCMApp:
     def __init__(self):
@@ -26,7 +44,11 @@ class DCMApp:
 
         # Load data from the json file
         self.data_path = os.path.join("data", "users.json")
-        self.data = load_json(self.data_path, {"users": []})
+        setup_storage(self.data_path)
+        self.data = storage.load_users(self.data_path)
+
+        # min/max overviews for sessions recorded before they existed
+        egram_storage.start_pyramid_backfill()
 
         # Container frame - essentially holding all frames as cards which can be cycled through
         container = tk.Frame(self.root)
@@ -0,0 +1,20 @@
+import pytest
+import json
+
+from egram import egram_storage
+
+
+# -------------------------------
+# SHARED FIXTURES
+# -------------------------------
+@pytest.fixture
+def egram_paths(tmp_path, monkeypatch):
+    """Point egram storage at an empty temp folder and legacy file."""
+    legacy_file = tmp_path / "egram.json"
+    with open(legacy_file, "w") as f:
+        json.dump({"egram_sessions": []}, f)
+
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(legacy_file))
+    monkeypatch.setattr(egram_storage, "EGRAM_DIR", str(tmp_path / "egram"))
+    yield tmp_path
+    egram_storage.close_storage()
@@ -0,0 +1,100 @@
+import numpy as np
+
+from egram import egram_codec
+from egram.egram_clock import SampleClock, GAP_MS
+
+
+# -------------------------------
+# HELPERS
+# -------------------------------
+def ns(ms):
+    return int(ms * 1e6)
+
+
+# -------------------------------
+# TESTS FOR SAMPLE CLOCK
+# -------------------------------
+def test_sequence_counter_wraps_and_drops():
+    clock = SampleClock(500, sequence_bits=8)
+
+    t1 = clock.stamp(4, sequence=[250, 251, 252, 253], arrival_ns=ns(1000))
+    # 254 lost, counter wraps to 0
+    t2 = clock.stamp(3, sequence=[255, 0, 1], arrival_ns=ns(1010))
+
+    assert list(t1) == [0, 2, 4, 6]
+    assert list(t2) == [10, 12, 14]
+    assert clock.stats()["dropped_frames"] == 1
+
+
+def test_sequence_counter_long_dropout_uses_host_time():
+    clock = SampleClock(500, sequence_bits=8)
+    clock.stamp(1, sequence=[0], arrival_ns=ns(0))
+
+    # 300 frames (600 ms) later the counter reads 300 % 256 = 44
+    t = clock.stamp(1, sequence=[44], arrival_ns=ns(600))
+    assert list(t) == [600]
+
+
+def test_device_clock_ticks_wrap():
+    clock = SampleClock(500, tick_bits=16)
+    t1 = clock.stamp(2, device_ticks=[65532, 65534])
+    t2 = clock.stamp(2, device_ticks=[0, 2])
+
+    assert list(t1) == [0, 2]
+    assert list(t2) == [4, 6]
+
+
+def test_host_clock_tracks_drift():
+    # device runs 0.1 % fast, 20 frames per read with jitter
+    rng = np.random.default_rng(0)
+    clock = SampleClock(500)
+    period = 2.0 / 1.001
+
+    count = 0
+    last = -1
+    for _ in range(3000):
+        count += 20
+        arrival = (count - 1) * period + 4 + rng.uniform(0, 2)
+        t = clock.stamp(20, arrival_ns=ns(arrival))
+        assert t[0] > last and (np.diff(t) > 0).all()
+        last = t[-1]
+
+    assert abs(clock.drift_ppm() - (-999)) < 300
+    assert abs(last - (count - 1) * period) < 5
+
+
+def test_host_clock_gap_counts_dropped_frames():
+    clock = SampleClock(500)
+    clock.stamp(10, arrival_ns=ns(18))
+    t = clock.stamp(10, arrival_ns=ns(18 + 20 + GAP_MS + 100))
+
+    # the batch ends at its arrival time, not right after the previous one
+    assert t[-1] == 20 + GAP_MS + 100 + 18
+    assert clock.stats()["gaps"] == 1
+
+
+def test_start_offset_and_monotonic_duplicates():
+    clock = SampleClock(500, start_ms=1000)
+    t = clock.stamp(3, sequence=[5, 5, 6], arrival_ns=ns(0))
+
+    assert t[0] == 1000
+    assert (np.diff(t) > 0).all()
+
+
+def test_host_clock_stamps_compact_to_int_deltas():
+    rng = np.random.default_rng(1)
+    clock = SampleClock(500, start_ms=1234.567)
+    stamps = []
+    for i in range(1, 501):
+        arrival = i * 20 * 2.0 + rng.uniform(0, 3)
+        stamps.append(clock.stamp(20, arrival_ns=ns(arrival)))
+    t = np.concatenate(stamps)
+    values = np.round(np.sin(t / 100) * 50) / 10
+
+    raw = egram_codec.encode_channel(t, values)
+    decoded_t, decoded_values = egram_codec.decode_channel(raw)
+
+    assert np.array_equal(decoded_t, t)
+    assert np.array_equal(decoded_values, values)
+    # int32 microsecond deltas, not float64 timestamps
+    assert len(raw) < 2.5 * len(t)
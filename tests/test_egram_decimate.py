@@ -0,0 +1,57 @@
+import numpy as np
+
+from egram.egram_decimate import Decimator, minmax_buckets
+from egram.egram_pyramid import envelope_xy
+from egram.egram_ring import RingBuffer
+
+
+# -------------------------------
+# TESTS FOR TRACE DECIMATION
+# -------------------------------
+def test_short_traces_pass_through():
+    t = np.arange(100) * 2.0
+    xs, ys = Decimator().update(t, np.ones(100), 0, 200, 600)
+
+    assert np.array_equal(xs, t)
+    assert len(ys) == 100
+
+
+def test_peaks_survive_decimation():
+    t = np.arange(10000) * 2.0
+    values = np.zeros(10000)
+    values[1234] = 5.0
+    values[7777] = -3.0
+
+    xs, ys = Decimator().update(t, values, 0, t[-1], 200)
+
+    assert len(xs) <= 2 * 200 + 2
+    assert ys.max() == 5.0
+    assert ys.min() == -3.0
+
+
+def test_incremental_matches_full_recompute():
+    rng = np.random.default_rng(0)
+    ring = RingBuffer(5000)
+    decimator = Decimator()
+    width = 10000 / 500
+
+    for i in range(600):
+        t = i * 40 + np.arange(20) * 2.0
+        ring.extend(t, rng.normal(size=20))
+        xs, ys = ring.window(10000)
+        out = decimator.update(xs, ys, xs[-1] - 10000, xs[-1], 500)
+
+        if len(xs) > 1000:
+            index, lo, hi = minmax_buckets(xs, ys, width)
+            expected = envelope_xy((index + 0.5) * width, lo, hi)
+            assert np.array_equal(out[0], expected[0])
+            assert np.array_equal(out[1], expected[1])
+
+
+def test_reset_buffer_starts_over():
+    decimator = Decimator()
+    t = np.arange(5000) * 2.0
+    decimator.update(t, np.ones(5000), 0, t[-1], 100)
+
+    xs, ys = decimator.update(t[:3000], -np.ones(3000), 0, t[-1], 100)
+    assert (ys == -1).all()
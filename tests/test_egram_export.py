@@ -0,0 +1,120 @@
+import pytest
+import csv
+import os
+import numpy as np
+
+from egram import egram_storage
+from egram.egram_export import export_session, export_sessions, main, read_binary, EDF_SCALE
+
+
+# -------------------------------
+# FIXTURES
+# -------------------------------
+@pytest.fixture
+def recorded(egram_paths):
+    """Finished session with two channels and a marker."""
+    session_id = egram_storage.create_session("P001", {"sampling_rate_hz": 100})["session_id"]
+    egram_storage.add_samples(session_id, "atrial", [{"t": i * 10, "value": (i % 20) / 10.0} for i in range(250)])
+    egram_storage.add_samples(session_id, "ventricular", [{"t": i * 10, "value": -0.5} for i in range(120)])
+    egram_storage.add_marker(session_id, {"channel": "atrial", "abbr": "AS", "timestamp_ms": 40, "modifier": None})
+    egram_storage.finish_session(session_id)
+    return session_id
+
+
+# -------------------------------
+# TESTS FOR EXPORT
+# -------------------------------
+def test_csv_export(recorded, tmp_path):
+    paths = export_session(recorded, str(tmp_path / "out"), "csv", chunk_size=64)
+
+    with open(paths[0], newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["channel", "t_ms", "value_mv"]
+    assert rows[1] == ["atrial", "0", "0"]
+    assert rows[2] == ["atrial", "10", "0.1"]
+    assert len(rows) == 1 + 250 + 120
+
+    with open(paths[1], newline="") as f:
+        markers = list(csv.reader(f))
+    assert markers[1] == ["40", "atrial", "AS", ""]
+
+
+def test_binary_export_round_trip(recorded, tmp_path):
+    path = export_session(recorded, str(tmp_path / "out"), "bin", chunk_size=64)[0]
+    header, channels = read_binary(path)
+
+    assert header["session"]["session_id"] == recorded
+    assert header["markers"][0]["abbr"] == "AS"
+    t, values = egram_storage.get_channel_arrays(recorded, "atrial")
+    assert np.array_equal(channels["atrial"]["t"], t)
+    assert np.array_equal(channels["atrial"]["value"], values)
+    assert len(channels["surface"]) == 0
+
+
+def test_edf_export_layout(recorded, tmp_path):
+    path = export_session(recorded, str(tmp_path / "out"), "edf")[0]
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    signals = int(raw[252:256])
+    records = int(raw[236:244])
+    assert signals == 2
+    # 250 atrial samples at 100 Hz need 3 one-second records
+    assert records == 3
+    header_bytes = 256 + 256 * signals
+    assert len(raw) == header_bytes + records * signals * 100 * 2
+
+    first = np.frombuffer(raw, dtype="<i2", count=100, offset=header_bytes)
+    assert first[1] == round(0.1 * EDF_SCALE)
+    # ventricular runs out in the second record and is padded as missing
+    second_vent = np.frombuffer(raw, dtype="<i2", count=100, offset=header_bytes + 3 * 200)
+    assert second_vent[19] == round(-0.5 * EDF_SCALE)
+    assert second_vent[20] == -32768
+
+
+def test_export_sessions_in_worker_processes(recorded, tmp_path):
+    other = egram_storage.create_session("P002", {})["session_id"]
+    egram_storage.add_samples(other, "atrial", [{"t": 0, "value": 1.0}])
+
+    results = export_sessions([recorded, other], str(tmp_path / "bulk"), "csv", workers=2)
+
+    assert set(results) == {recorded, other}
+    for paths in results.values():
+        assert all(os.path.exists(p) for p in paths)
+    with open(results[other][0]) as f:
+        assert f.read().splitlines()[1] == "atrial,0,1"
+
+
+def test_high_pass_export(recorded, tmp_path):
+    raw = read_binary(export_session(recorded, str(tmp_path / "raw"), "bin")[0])
+    header, channels = read_binary(export_session(recorded, str(tmp_path / "hp"), "bin", high_pass=True)[0])
+
+    assert raw[0]["high_pass_hz"] is None
+    assert header["high_pass_hz"] > 0
+    assert np.array_equal(channels["atrial"]["t"], raw[1]["atrial"]["t"])
+    # constant ventricular channel filters to zero
+    assert np.allclose(channels["ventricular"]["value"], 0.0)
+    assert not np.allclose(channels["atrial"]["value"], raw[1]["atrial"]["value"])
+
+
+def test_export_unknown_session(egram_paths, tmp_path):
+    with pytest.raises(ValueError):
+        export_session("EGRAM_MISSING", str(tmp_path), "csv")
+
+
+def test_export_command_line_is_read_only(recorded, tmp_path, monkeypatch):
+    # the app is still running: its journal and index belong to it
+    egram_storage.close_storage()
+    journal = os.path.join(egram_storage.EGRAM_DIR, "journal.bin")
+    with open(journal, "wb") as f:
+        f.write(b"pending")
+    os.remove(os.path.join(egram_storage.EGRAM_DIR, "index.json"))
+    monkeypatch.setattr(egram_storage, "WRITE_BEHIND", True)
+    monkeypatch.setattr(egram_storage, "READ_ONLY", False)
+
+    assert main([recorded, "--out", str(tmp_path / "cli"), "--workers", "1"]) == 0
+
+    assert os.path.exists(os.path.join(str(tmp_path / "cli"), recorded + ".csv"))
+    with open(journal, "rb") as f:
+        assert f.read() == b"pending"
+    assert not os.path.exists(os.path.join(egram_storage.EGRAM_DIR, "index.json"))
@@ -0,0 +1,51 @@
+import numpy as np
+
+from egram.egram_filter import HighPassFilter, filter_values, highpass_coefficients
+
+
+# -------------------------------
+# HELPERS
+# -------------------------------
+def reference(values, rate=500):
+    # plain per-sample biquad, primed like HighPassFilter
+    (b0, b1, b2), (a1, a2) = highpass_coefficients(rate)
+    s1, s2 = -b0 * values[0], b2 * values[0]
+    out = []
+    for x in values:
+        y = b0 * x + s1
+        s1 = b1 * x - a1 * y + s2
+        s2 = b2 * x - a2 * y
+        out.append(y)
+    return np.array(out)
+
+
+# -------------------------------
+# TESTS FOR HIGH-PASS FILTER
+# -------------------------------
+def test_streaming_blocks_match_per_sample_filter():
+    t = np.arange(3000)
+    values = 2.0 + np.sin(t * 0.07) + 0.01 * t
+
+    hpf = HighPassFilter(500)
+    out = np.concatenate([hpf.process(values[i:i + 37]) for i in range(0, len(values), 37)])
+
+    assert np.allclose(out, reference(values), atol=1e-9)
+    assert np.allclose(filter_values(values), out, atol=1e-9)
+
+
+def test_dc_offset_is_removed():
+    out = filter_values(np.full(5000, 3.0))
+    assert np.abs(out).max() < 1e-9
+
+
+def test_missing_samples_stay_missing():
+    hpf = HighPassFilter(500)
+    out = hpf.process([np.nan, 1.0, np.nan, 1.0])
+
+    assert np.isnan(out[[0, 2]]).all()
+    assert np.allclose(out[[1, 3]], 0.0)
+
+
+def test_coefficients_are_cached():
+    assert highpass_coefficients(500) is highpass_coefficients(500)
+    assert highpass_coefficients(500) != highpass_coefficients(1000)
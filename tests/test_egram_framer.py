@@ -0,0 +1,52 @@
+from egram.egram_framer import PacketFramer, FRAME_SIZE
+
+
+# -------------------------------
+# HELPERS
+# -------------------------------
+def frame(n):
+    return bytes([0xAA, 0x22] + [n % 256] * (FRAME_SIZE - 2))
+
+
+# -------------------------------
+# TESTS FOR PACKET FRAMER
+# -------------------------------
+def test_frames_split_across_reads():
+    framer = PacketFramer()
+    data = frame(1) + frame(2) + frame(3)
+
+    frames = []
+    for i in range(0, len(data), 7):
+        frames += framer.feed(data[i:i + 7])
+
+    assert frames == [frame(1), frame(2), frame(3)]
+    assert framer.stats()["resyncs"] == 0
+    assert framer.stats()["buffered_bytes"] == 0
+
+
+def test_resync_skips_garbage():
+    framer = PacketFramer()
+    frames = framer.feed(b"\x01\x02\xAA\x03" + frame(1) + b"\xAA" * 5 + frame(2))
+
+    assert frames == [frame(1), frame(2)]
+    stats = framer.stats()
+    assert stats["resyncs"] == 2
+    assert stats["discarded_bytes"] == 4 + 5
+    assert stats["frames"] == 2
+
+
+def test_sync_word_split_between_reads():
+    framer = PacketFramer()
+    assert framer.feed(b"\x00" * 30 + b"\xAA") == []
+    assert framer.feed(frame(7)[1:]) == [frame(7)]
+    assert framer.stats()["discarded_bytes"] == 30
+
+
+def test_buffer_is_compacted():
+    framer = PacketFramer(compact_bytes=64)
+    for i in range(100):
+        framer.feed(frame(i)[:15])
+        framer.feed(frame(i)[15:] + b"\x55")
+
+    assert framer.stats()["frames"] == 100
+    assert len(framer.buffer) < 64 + 2 * FRAME_SIZE
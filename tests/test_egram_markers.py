@@ -0,0 +1,45 @@
+from matplotlib.figure import Figure
+
+from egram.egram_markers import MarkerPool, MarkerTrack
+
+
+# -------------------------------
+# TESTS FOR MARKER TRACKS
+# -------------------------------
+def test_visible_markers_by_bisection():
+    track = MarkerTrack(retain_ms=10000)
+    for t in range(0, 1000, 100):
+        track.add(t, f"M{t}")
+    track.add(250, "late")
+
+    times, labels = track.visible(200, 400)
+    assert times == [200, 250, 300, 400]
+    assert labels == ["M200", "late", "M300", "M400"]
+
+
+def test_prune_bounds_retention():
+    track = MarkerTrack(retain_ms=500)
+    for t in range(0, 10000, 100):
+        track.add(t, "VS")
+        track.prune(t)
+
+    assert len(track) == 6
+    assert track.times[0] == 9400
+
+
+# -------------------------------
+# TESTS FOR MARKER POOL
+# -------------------------------
+def test_pool_reuses_text_artists():
+    ax = Figure().add_subplot(111)
+    pool = MarkerPool(ax)
+
+    pool.show([1, 2, 3], ["AS", "VS", "AP"])
+    first = list(pool.texts)
+    pool.show([5], ["VP"])
+    pool.show([6, 7], ["AS", "VS"])
+
+    assert pool.texts[:3] == first
+    assert len(ax.texts) == 3
+    assert [t.get_text() for t in pool.visible_texts()] == ["AS", "VS"]
+    assert not pool.texts[2].get_visible()
@@ -0,0 +1,246 @@
+import pytest
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from egram.egram_plot import EgramPlot
+
+
+# -------------------------------
+# FIXTURES
+# -------------------------------
+@pytest.fixture
+def plot():
+    """EgramPlot with a 1 second window (no Tk canvas needed)."""
+    return EgramPlot(window_seconds=1)
+
+
+# -------------------------------
+# RECORDED ARRAY TESTS
+# -------------------------------
+def test_load_arrays_slices_window(plot):
+    t = np.arange(0, 5000, 2, dtype=float)
+    values = np.sin(t)
+
+    plot.load_arrays("atrial", t, values, end_ms=3000)
+    xs, ys = plot.buffer_to_xy(plot.atrial_buf)
+
+    assert xs[0] == 2000
+    assert xs[-1] == 3000
+    # slices share memory with the source arrays
+    assert np.shares_memory(xs, t)
+
+
+def test_live_samples_replace_loaded_arrays(plot):
+    t = np.arange(0, 100, 2, dtype=float)
+    plot.load_arrays("atrial", t, t)
+
+    plot.update_samples("atrial", [{"t": 0, "value": 1.0}], "2X")
+    xs, ys = plot.buffer_to_xy(plot.atrial_buf)
+    assert list(xs) == [0]
+    assert list(ys) == [2.0]
+
+
+# -------------------------------
+# LIVE RING BUFFER TESTS
+# -------------------------------
+def test_update_samples_keeps_one_window(plot):
+    # 1 s window at 500 Hz -> 500 sample ring
+    for start in range(0, 4000, 20):
+        plot.update_samples("atrial", [{"t": start + i * 2, "value": 1.0} for i in range(10)], "1X")
+
+    xs, ys = plot.buffer_to_xy(plot.atrial_buf)
+    assert xs[-1] == 3998
+    # 500 samples spaced 2 ms apart
+    assert xs[0] == 3000
+    assert len(xs) == 500
+    # the drawn window is a view into the ring, not a copy
+    assert np.shares_memory(xs, plot.rings["atrial"].t)
+
+
+def test_missing_values_become_nan(plot):
+    plot.update_samples("ventricular", [{"t": 0}, {"t": 2}], "1X")
+    _, ys = plot.buffer_to_xy(plot.vent_buf)
+    assert np.isnan(ys).all()
+
+
+def test_load_overview_draws_min_max_strokes(plot):
+    t = np.array([0.0, 10000.0, 20000.0])
+    plot.load_overview("atrial", t, np.array([-1.0, -2.0, -3.0]), np.array([1.0, 2.0, 3.0]))
+    xs, ys = plot.buffer_to_xy(plot.atrial_buf)
+
+    assert list(xs) == [0, 0, 10000, 10000, 20000, 20000]
+    assert list(ys) == [-1, 1, -2, 2, -3, 3]
+
+    # the whole overview is in view, not just the last window
+    plot.adjust_xlim()
+    assert plot.ax_atrial.get_xlim() == (0, 20000)
+
+
+def test_latest_timestamp_is_tracked(plot):
+    plot.update_samples("atrial", [{"t": 100, "value": 0.0}], "1X")
+    plot.update_samples("ventricular", [{"t": 1500, "value": 0.0}], "1X")
+    plot.update_samples("atrial", [{"t": 1200, "value": 0.0}], "1X")
+    assert plot.latest_t == 1500
+
+    plot.adjust_xlim()
+    assert plot.ax_atrial.get_xlim() == (500, 1500)
+
+    plot.reset()
+    assert plot.latest_t == 0
+    plot.load_arrays("surface", np.array([0.0, 300.0]), np.zeros(2))
+    assert plot.latest_t == 300
+
+
+def test_high_pass_toggle_keeps_buffer(plot):
+    samples = [{"t": i * 2, "value": 1.0} for i in range(20)]
+    plot.update_samples("atrial", samples, "1X")
+
+    plot.set_high_pass(True)
+    plot.update_samples("atrial", [{"t": 40 + i * 2, "value": 1.0} for i in range(20)], "1X")
+
+    xs, ys = plot.buffer_to_xy(plot.atrial_buf)
+    assert len(xs) == 40
+    # raw samples before the switch, DC removed after it
+    assert np.allclose(ys[:20], 1.0)
+    assert np.allclose(ys[20:], 0.0, atol=1e-9)
+
+
+# -------------------------------
+# BLITTING TESTS
+# -------------------------------
+def test_blit_reuses_lines_and_background(plot):
+    canvas = FigureCanvasAgg(plot.fig)
+    plot.attach(canvas)
+
+    full_draws = []
+    canvas.mpl_connect("draw_event", lambda event: full_draws.append(event))
+
+    line = plot.line_atrial
+    for start in range(0, 400, 20):
+        samples = [{"t": start + i * 2, "value": np.sin(start + i)} for i in range(10)]
+        plot.update_samples("atrial", samples, "1X")
+        plot.update_samples("ventricular", samples, "1X")
+        plot.blit("both")
+
+    assert plot.line_atrial is line
+    assert plot.background is not None
+    # first frame and y-range changes only, the rest are blits
+    assert len(full_draws) <= 3
+    assert plot.ax_atrial.get_xlim() == (0, 398)
+    assert len(line.get_xdata()) == 200
+
+    # a layout change rebuilds the background
+    plot.blit("atrial")
+    assert len(full_draws) <= 4
+    assert not plot.ax_vent.get_visible()
+
+
+def test_blit_flat_signal_keeps_y_range(plot):
+    canvas = FigureCanvasAgg(plot.fig)
+    plot.attach(canvas)
+
+    full_draws = []
+    canvas.mpl_connect("draw_event", lambda event: full_draws.append(event))
+
+    for start in range(0, 400, 20):
+        samples = [{"t": start + i * 2, "value": 0.0} for i in range(10)]
+        plot.update_samples("atrial", samples, "1X")
+        plot.blit("atrial")
+
+    # first frame only; a constant trace never rescales
+    assert len(full_draws) == 1
+    bottom, top = plot.ax_atrial.get_ylim()
+    assert bottom < 0 < top
+
+
+def test_detach_restores_full_draws(plot):
+    canvas = FigureCanvasAgg(plot.fig)
+    plot.attach(canvas)
+    plot.detach()
+
+    assert not plot.line_atrial.get_animated()
+    plot.blit("surface")
+    assert plot.shown == ["surface"]
+
+
+def test_long_windows_are_decimated_to_pixels():
+    plot = EgramPlot(window_seconds=60)
+    t = np.arange(30000) * 2.0
+    values = np.zeros(30000)
+    values[29000] = 4.0
+    plot.update_arrays("atrial", t, values, "1X")
+    plot.redraw("atrial")
+
+    columns = int(plot.ax_atrial.bbox.width)
+    xdata = plot.line_atrial.get_xdata()
+    assert len(xdata) <= 2 * columns + 2
+    assert max(plot.line_atrial.get_ydata()) == 4.0
+
+    plot.decimate = False
+    plot.redraw("atrial")
+    assert len(plot.line_atrial.get_xdata()) == 30000
+
+
+def test_load_arrays_drops_decimated_buckets():
+    plot = EgramPlot(window_seconds=60)
+    t = np.arange(30000) * 2.0
+    plot.load_arrays("atrial", t, np.zeros(30000))
+    plot.redraw("atrial")
+
+    # another recording over the same range, its peak must not be hidden
+    # by buckets cached for the first one
+    values = np.zeros(30000)
+    values[15000] = 5.0
+    plot.load_arrays("atrial", t, values)
+    plot.redraw("atrial")
+    assert max(plot.line_atrial.get_ydata()) == 5.0
+
+
+def test_only_markers_in_view_are_drawn(plot):
+    plot.update_samples("atrial", [{"t": t, "value": 0.0} for t in range(0, 3000, 2)], "1X")
+    for t in range(0, 3000, 250):
+        plot.add_marker({"channel": "atrial", "abbr": "AS", "timestamp_ms": t, "modifier": None})
+    plot.add_marker({"channel": "bogus", "abbr": "X", "timestamp_ms": 10})
+
+    plot.redraw("atrial")
+    texts = plot.marker_pools["atrial"].visible_texts()
+    # 1 s window ending at 2998
+    assert [t.get_position()[0] for t in texts] == [2000, 2250, 2500, 2750]
+
+    for _ in range(3):
+        plot.redraw("atrial")
+    assert len(plot.ax_atrial.texts) == 4
+
+    plot.show_markers = False
+    plot.redraw("atrial")
+    assert plot.marker_pools["atrial"].visible_texts() == []
+
+
+def test_marker_memory_is_bounded():
+    plot = EgramPlot(window_seconds=1, marker_history_ms=1000)
+    for t in range(0, 100000, 100):
+        plot.update_samples("ventricular", [{"t": t, "value": 0.0}], "1X")
+        plot.add_marker({"channel": "ventricular", "abbr": "VS", "timestamp_ms": t})
+
+    assert len(plot.marker_tracks["ventricular"]) <= 21
+
+
+def test_channel_mode_switch_keeps_buffers(plot):
+    canvas = FigureCanvasAgg(plot.fig)
+    plot.attach(canvas)
+    samples = [{"t": t, "value": 1.0} for t in range(0, 500, 2)]
+    plot.update_samples("atrial", samples, "1X")
+    plot.update_samples("ventricular", samples, "1X")
+
+    plot.blit("atrial")
+    assert plot.ax_atrial.get_visible() and not plot.ax_vent.get_visible()
+
+    # ventricular samples keep arriving while hidden
+    plot.update_samples("ventricular", [{"t": 500, "value": 2.0}], "1X")
+    plot.blit("ventricular")
+    plot.blit("both")
+
+    assert plot.ax_atrial.get_visible() and plot.ax_vent.get_visible()
+    assert len(plot.line_vent.get_xdata()) == 251
+    assert plot.line_vent.get_ydata()[-1] == 2.0
+    assert plot.canvas is canvas
@@ -0,0 +1,88 @@
+import time
+
+from egram.egram_render import RenderScheduler
+
+
+# -------------------------------
+# HELPERS
+# -------------------------------
+class FakeWidget:
+    """Collects after() callbacks instead of running a Tk loop."""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append((ms, callback))
+        return len(self.scheduled)
+
+    def after_cancel(self, after_id):
+        self.scheduled = []
+
+    def run_next(self):
+        _, callback = self.scheduled.pop(0)
+        callback()
+
+
+# -------------------------------
+# TESTS FOR RENDER SCHEDULER
+# -------------------------------
+def test_updates_are_coalesced_into_one_frame():
+    applied, draws = [], []
+    widget = FakeWidget()
+    renderer = RenderScheduler(widget, applied.append, lambda: draws.append(1), fps=50)
+    renderer.start()
+    assert widget.scheduled[0][0] == 20
+
+    for i in range(5):
+        renderer.post(i)
+    widget.run_next()
+
+    assert applied == [[0, 1, 2, 3, 4]]
+    assert len(draws) == 1
+    stats = renderer.stats()
+    assert stats["frames"] == 1
+    assert stats["max_updates_per_frame"] == 5
+
+
+def test_idle_frames_are_not_drawn():
+    draws = []
+    widget = FakeWidget()
+    renderer = RenderScheduler(widget, lambda updates: None, lambda: draws.append(1))
+    renderer.start()
+
+    widget.run_next()
+    widget.run_next()
+    assert draws == []
+
+    renderer.request_draw()
+    widget.run_next()
+    assert draws == [1]
+
+
+def test_slow_draws_skip_frames():
+    widget = FakeWidget()
+    renderer = RenderScheduler(widget, lambda updates: None, lambda: time.sleep(0.025), fps=100)
+    renderer.start()
+
+    renderer.post("x")
+    widget.run_next()
+
+    stats = renderer.stats()
+    assert stats["skipped_frames"] >= 2
+    assert stats["draw_ms_p50"] >= 25
+    # the next tick waits for the next frame boundary, never longer than a frame
+    assert 1 <= widget.scheduled[-1][0] <= 10
+
+
+def test_stop_flushes_pending_updates():
+    applied = []
+    widget = FakeWidget()
+    renderer = RenderScheduler(widget, applied.append, lambda: None)
+    renderer.start()
+    renderer.post("last")
+
+    renderer.stop()
+    assert not renderer.running
+    assert applied == [["last"]]
+    assert widget.scheduled == []
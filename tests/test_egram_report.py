@@ -0,0 +1,83 @@
+import pytest
+import os
+import threading
+
+from egram import egram_storage
+from egram import egram_report
+from egram.egram_report import render_report, submit_report, submit_day_reports
+
+
+# -------------------------------
+# FIXTURES
+# -------------------------------
+@pytest.fixture
+def report_pool(egram_paths, monkeypatch):
+    """Two report workers, shut down before the storage is closed."""
+    monkeypatch.setattr(egram_report, "REPORT_WORKERS", 2)
+    yield
+    egram_report.shutdown_reports()
+
+
+@pytest.fixture
+def recorded(report_pool):
+    """Finished session with samples and a marker."""
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(session_id, "atrial", [{"t": i * 2, "value": (i % 30) / 10.0} for i in range(3000)])
+    egram_storage.add_marker(session_id, {"channel": "atrial", "abbr": "AS", "timestamp_ms": 100, "modifier": None})
+    egram_storage.finish_session(session_id)
+    return session_id
+
+
+# -------------------------------
+# TESTS FOR REPORTS
+# -------------------------------
+def test_render_report_png_and_pdf(recorded, tmp_path):
+    patient = {"id": "P001", "name": "John", "device": {"model": "Dr1", "serial": "Abc123"}}
+
+    png = render_report(recorded, str(tmp_path / "r" / "report.png"), patient)
+    with open(png, "rb") as f:
+        assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+
+    pdf = render_report(recorded, str(tmp_path / "r" / "report.pdf"), patient)
+    with open(pdf, "rb") as f:
+        assert f.read(4) == b"%PDF"
+
+
+def test_submit_report_updates_print_metadata(recorded, tmp_path):
+    path = submit_report(recorded, "png", str(tmp_path / "reports"), patient={}).result(timeout=60)
+
+    assert os.path.exists(path)
+    meta = egram_storage.get_session(recorded)["print_metadata"]
+    assert meta["printed"] is True
+    assert meta["file_path"] == path
+    assert meta["printed_at"] is not None
+
+
+def test_day_reports_render_in_parallel(recorded, tmp_path):
+    other = egram_storage.create_session("P002", {})["session_id"]
+    egram_storage.add_samples(other, "ventricular", [{"t": 0, "value": 1.0}])
+
+    day = egram_storage.get_session(recorded)["start_time"][:10]
+    jobs = submit_day_reports(day, "pdf", str(tmp_path / "day"))
+
+    assert set(jobs) == {recorded, other}
+    for session_id, job in jobs.items():
+        assert os.path.exists(job.result(timeout=60))
+        assert egram_storage.get_session(session_id)["print_metadata"]["printed"]
+
+
+def test_submit_report_after_shutdown_fails(recorded, tmp_path):
+    # hold the writer so the pool is shut down before the render is queued
+    release = threading.Event()
+    egram_storage.run_write(release.wait, wait=False)
+    job = submit_report(recorded, "png", str(tmp_path / "late"), patient={})
+    egram_report.shutdown_reports()
+    release.set()
+
+    with pytest.raises(RuntimeError):
+        job.result(timeout=60)
+
+
+def test_submit_report_invalid_format(recorded):
+    with pytest.raises(ValueError):
+        submit_report(recorded, "docx")
@@ -0,0 +1,54 @@
+import numpy as np
+
+from egram.egram_ring import RingBuffer
+
+
+# -------------------------------
+# TESTS FOR RING BUFFER
+# -------------------------------
+def test_push_and_wrap_keeps_newest_in_order():
+    ring = RingBuffer(4)
+    for i in range(10):
+        ring.push(i, i * 10)
+
+    t, values = ring.views()
+    assert list(t) == [6, 7, 8, 9]
+    assert list(values) == [60, 70, 80, 90]
+    assert ring.latest_t() == 9
+
+
+def test_extend_matches_push():
+    pushed = RingBuffer(7)
+    extended = RingBuffer(7)
+    data = np.arange(30, dtype=float)
+
+    for x in data:
+        pushed.push(x, -x)
+    for start in range(0, 30, 4):
+        extended.extend(data[start:start + 4], -data[start:start + 4])
+
+    assert np.array_equal(pushed.views()[0], extended.views()[0])
+    assert np.array_equal(pushed.views()[1], extended.views()[1])
+
+
+def test_extend_larger_than_capacity():
+    ring = RingBuffer(5)
+    ring.push(0, 0)
+    ring.extend(np.arange(1, 13), np.arange(1, 13))
+
+    assert list(ring.views()[0]) == [8, 9, 10, 11, 12]
+    ring.push(13, 13)
+    assert list(ring.views()[0]) == [9, 10, 11, 12, 13]
+
+
+def test_window_and_clear():
+    ring = RingBuffer(100)
+    ring.extend(np.arange(0, 200, 2), np.ones(100))
+
+    t, _ = ring.window(10)
+    assert list(t) == [188, 190, 192, 194, 196, 198]
+
+    ring.clear()
+    assert len(ring) == 0
+    assert ring.latest_t() is None
+    assert len(ring.window(10)[0]) == 0
@@ -0,0 +1,755 @@
+import pytest
+import json
+import os
+import threading
+import numpy as np
+
+from egram import egram_storage, egram_codec, egram_segments
+from egram.egram_segments import SAMPLE_STRUCT
+from egram.egram_samples import SampleBlock
+from egram.egram_writer import WriteBehind
+from egram.egram_segments import SegmentStore
+from egram.egram_migrate import LegacySessionReader, migrate_legacy_file
+from egram.egram_index import SessionIndex, SqliteSessionIndex, make_entry
+from egram.egram_pyramid import LEVELS, OVERVIEW_POINTS, read_level
+from helper.sqlite_store import SqliteStore
+
+
+# -------------------------------
+# FIXTURES
+# -------------------------------
+@pytest.fixture
+def legacy_session(egram_paths):
+    """Write one unfinished session into the legacy egram.json file."""
+    session = {
+        "session_id": "EGRAM_OLD",
+        "patient_id": "P001",
+        "start_time": "2025-10-24T14:12:00Z",
+        "end_time": None,
+        "telemetry_status_log": [{"time": "2025-10-24T14:12:00Z", "status": "connected"}],
+        "settings": {"egm_gain": "1X"},
+        "channels": {
+            "atrial": {"enabled": True, "samples": [{"t": 0, "value": 0.32}]},
+            "ventricular": {"enabled": True, "samples": []},
+            "surface": {"enabled": False, "samples": []}
+        },
+        "markers": [],
+        "print_metadata": {"printed": False, "printed_at": None, "file_path": None}
+    }
+    with open(egram_paths / "egram.json", "w") as f:
+        json.dump({"egram_sessions": [session]}, f)
+    return session
+
+
+# -------------------------------
+# SEGMENT STORE TESTS
+# -------------------------------
+def test_create_and_get_session(egram_paths):
+    session = egram_storage.create_session("P001", {"egm_gain": "2X"})
+    loaded = egram_storage.get_session(session["session_id"])
+
+    assert loaded["patient_id"] == "P001"
+    assert loaded["settings"]["egm_gain"] == "2X"
+    assert loaded["telemetry_status_log"][0]["status"] == "created"
+
+
+def test_add_samples_appends_binary_records(egram_paths):
+    session = egram_storage.create_session("P001", {})
+    session_id = session["session_id"]
+
+    egram_storage.add_samples(session_id, "atrial", [{"t": 0, "value": 0.5}])
+    egram_storage.add_samples(session_id, "atrial", [{"t": 2, "value": -1.2}, {"t": 4, "value": 0.0}])
+
+    egram_storage.flush()
+    segment = egram_storage.get_store().segment_path(session_id, "atrial")
+    assert os.path.getsize(segment) == 3 * SAMPLE_STRUCT.size
+
+    samples = egram_storage.get_session(session_id)["channels"]["atrial"]["samples"]
+    assert samples == [
+        {"t": 0, "value": 0.5},
+        {"t": 2, "value": -1.2},
+        {"t": 4, "value": 0.0}
+    ]
+
+
+def test_add_samples_accepts_sample_blocks(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+
+    egram_storage.add_samples(session_id, "atrial", SampleBlock([0, 2], [0.5, np.nan]))
+    egram_storage.add_samples(session_id, "atrial", [{"t": 4, "value": 1.0}])
+
+    samples = egram_storage.get_session(session_id)["channels"]["atrial"]["samples"]
+    assert samples == [{"t": 0, "value": 0.5}, {"t": 2, "value": None}, {"t": 4, "value": 1.0}]
+
+
+def test_add_samples_invalid_channel(egram_paths):
+    session = egram_storage.create_session("P001", {})
+    with pytest.raises(ValueError):
+        egram_storage.add_samples(session["session_id"], "bogus", [])
+
+
+def test_add_samples_unknown_session(egram_paths):
+    with pytest.raises(ValueError):
+        egram_storage.add_samples("EGRAM_MISSING", "atrial", [])
+
+
+def test_markers_and_telemetry(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    marker = {"channel": "atrial", "abbr": "AS", "timestamp_ms": 10, "modifier": None}
+
+    egram_storage.add_marker(session_id, marker)
+    egram_storage.set_telemetry(session_id, "disconnected")
+
+    loaded = egram_storage.get_session(session_id)
+    assert loaded["markers"] == [marker]
+    assert loaded["telemetry_status_log"][-1]["status"] == "disconnected"
+
+
+def test_legacy_session_is_imported_on_write(legacy_session):
+    egram_storage.add_samples("EGRAM_OLD", "atrial", [{"t": 2, "value": 0.34}])
+
+    loaded = egram_storage.get_session("EGRAM_OLD")
+    assert loaded["channels"]["atrial"]["samples"] == [
+        {"t": 0, "value": 0.32},
+        {"t": 2, "value": 0.34}
+    ]
+    # legacy copy is not listed twice
+    assert len(egram_storage.list_sessions("P001")) == 1
+
+
+def test_get_or_start_session_reuses_unfinished(egram_paths):
+    first = egram_storage.get_or_start_session("P001")
+    again = egram_storage.get_or_start_session("P001")
+    assert again["session_id"] == first["session_id"]
+
+    egram_storage.finish_session(first["session_id"])
+    fresh = egram_storage.get_or_start_session("P001")
+    assert fresh["session_id"] != first["session_id"]
+
+
+# -------------------------------
+# SESSION INDEX TESTS
+# -------------------------------
+def test_index_tracks_headers_and_counts(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.create_session("P002", {})
+    egram_storage.add_samples(session_id, "atrial", [{"t": 0, "value": 0.1}, {"t": 2, "value": 0.2}])
+    egram_storage.finish_session(session_id)
+
+    store = egram_storage.get_store()
+    headers = egram_storage.list_session_headers("P001")
+    assert [h["session_id"] for h in headers] == [session_id]
+    assert headers[0]["end_time"] is not None
+    assert headers[0]["sample_counts"]["atrial"] == 2
+    # compacted on finish: no raw segment left
+    assert headers[0]["byte_offsets"]["atrial"] == {
+        "compact": os.path.getsize(store.compact_path(session_id, "atrial")),
+        "segment": 0
+    }
+    assert "channels" not in headers[0]
+
+
+def test_index_is_persisted_and_rebuilt(egram_paths, monkeypatch):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+
+    # fresh process: index is read back from disk
+    monkeypatch.setattr(egram_storage, "_indexes", {})
+    assert egram_storage.get_session(session_id)["patient_id"] == "P001"
+
+    # lost index: rebuilt from the session headers
+    os.remove(os.path.join(egram_storage.EGRAM_DIR, egram_storage.INDEX_NAME))
+    monkeypatch.setattr(egram_storage, "_indexes", {})
+    assert [h["session_id"] for h in egram_storage.list_session_headers("P001")] == [session_id]
+
+
+def test_index_put_leaves_readers_snapshot(tmp_path):
+    index = SessionIndex(str(tmp_path / "index.json"))
+    for i in range(3):
+        index.put(make_entry({"session_id": f"S{i}", "patient_id": "P001"}), save=False)
+
+    # a reader iterating while the writer adds a session sees the old dict
+    seen = []
+    for entry in index.entries.values():
+        seen.append(entry["session_id"])
+        index.put(make_entry({"session_id": f"N{len(seen)}", "patient_id": "P001"}), save=False)
+
+    assert seen == ["S0", "S1", "S2"]
+    assert len(index.for_patient("P001")) == 6
+
+
+def test_index_includes_legacy_sessions(legacy_session):
+    headers = egram_storage.list_session_headers("P001")
+    assert headers[0]["legacy"] is True
+    assert headers[0]["sample_counts"]["atrial"] == 1
+    assert egram_storage.get_or_start_session("P001")["session_id"] == "EGRAM_OLD"
+
+
+# -------------------------------
+# WRITE-BEHIND TESTS
+# -------------------------------
+def test_write_behind_batches_appends(tmp_path):
+    writer = WriteBehind(str(tmp_path), flush_interval=60)
+    target = str(tmp_path / "atrial.seg")
+
+    for i in range(10):
+        writer.append(target, bytes([i]))
+    assert not os.path.exists(target)
+    assert writer.metrics()["queue_depth"] == 10
+
+    writer.flush()
+    with open(target, "rb") as f:
+        assert f.read() == bytes(range(10))
+
+    metrics = writer.metrics()
+    assert metrics["queue_depth"] == 0
+    assert metrics["flushes"] == 1
+    assert metrics["last_batch_size"] == 10
+    writer.close()
+
+
+def test_write_behind_replays_journal_after_crash(tmp_path):
+    writer = WriteBehind(str(tmp_path), flush_interval=60)
+    target = str(tmp_path / "atrial.seg")
+    writer.append(target, b"abc")
+    writer.append(target, b"def")
+    # simulate a crash: nothing flushed, journal left on disk
+    writer.journal.close()
+
+    WriteBehind(str(tmp_path), flush_interval=60).close()
+    with open(target, "rb") as f:
+        assert f.read() == b"abcdef"
+
+    # replaying twice must not duplicate data
+    WriteBehind(str(tmp_path), flush_interval=60).close()
+    with open(target, "rb") as f:
+        assert f.read() == b"abcdef"
+
+
+def test_write_behind_retries_failed_batch(tmp_path, monkeypatch):
+    writer = WriteBehind(str(tmp_path), flush_interval=60)
+    target = str(tmp_path / "atrial.seg")
+    writer.append(target, b"abc")
+
+    # disk full while the batch is applied
+    real_write = writer.write_run
+    def full(*args):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(writer, "write_run", full)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert writer.metrics()["queue_depth"] == 1
+
+    # later appends keep working and the batch goes out on the next flush
+    writer.append(target, b"def")
+    monkeypatch.setattr(writer, "write_run", real_write)
+    writer.flush()
+    with open(target, "rb") as f:
+        assert f.read() == b"abcdef"
+    assert writer.journal_files() == [writer.journal_path]
+    writer.close()
+
+
+def test_storage_reads_see_pending_writes(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(session_id, "ventricular", [{"t": 0, "value": 1.5}])
+
+    loaded = egram_storage.get_session(session_id)
+    assert loaded["channels"]["ventricular"]["samples"] == [{"t": 0, "value": 1.5}]
+    assert egram_storage.writer_metrics()["records_flushed"] >= 1
+
+
+# -------------------------------
+# MEMORY-MAPPED CHANNEL TESTS
+# -------------------------------
+def test_get_channel_arrays_is_memory_mapped(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    samples = [{"t": i * 2, "value": i / 10.0} for i in range(100)]
+    egram_storage.add_samples(session_id, "atrial", samples)
+
+    t, values = egram_storage.get_channel_arrays(session_id, "atrial")
+    assert isinstance(t.base, np.memmap) or isinstance(t, np.memmap)
+    assert len(t) == 100
+    assert t[50] == 100.0
+    assert values[50] == pytest.approx(5.0)
+
+
+def test_get_channel_arrays_legacy_and_empty(legacy_session):
+    t, values = egram_storage.get_channel_arrays("EGRAM_OLD", "atrial")
+    assert list(t) == [0.0]
+    assert list(values) == [0.32]
+
+    t, values = egram_storage.get_channel_arrays("EGRAM_OLD", "surface")
+    assert len(t) == 0
+
+
+# -------------------------------
+# COMPACT ENCODING TESTS
+# -------------------------------
+def test_finish_session_compacts_losslessly(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    # values exactly as parse_egram_packet produces them (int8 count / 10)
+    counts = [((i * 7) % 256) - 128 for i in range(5000)]
+    samples = [{"t": i * 2, "value": c / 10.0} for i, c in enumerate(counts)]
+    egram_storage.add_samples(session_id, "atrial", samples)
+    egram_storage.flush()
+
+    store = egram_storage.get_store()
+    raw_size = os.path.getsize(store.segment_path(session_id, "atrial"))
+    egram_storage.finish_session(session_id)
+
+    assert not os.path.exists(store.segment_path(session_id, "atrial"))
+    assert os.path.getsize(store.compact_path(session_id, "atrial")) * 10 < raw_size
+    assert egram_storage.get_session(session_id)["channels"]["atrial"]["samples"] == samples
+    assert egram_storage.list_session_headers("P001")[0]["sample_counts"]["atrial"] == 5000
+
+
+def test_compact_falls_back_for_non_count_values(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    samples = [{"t": 0.5, "value": 0.123}, {"t": 1.25, "value": None}, {"t": 3, "value": 500.0}]
+    egram_storage.add_samples(session_id, "surface", samples)
+    egram_storage.finish_session(session_id)
+
+    # appending after compaction keeps both parts readable
+    egram_storage.add_samples(session_id, "surface", [{"t": 4, "value": 1.0}])
+    loaded = egram_storage.get_session(session_id)["channels"]["surface"]["samples"]
+    assert loaded == samples + [{"t": 4, "value": 1.0}]
+
+
+@pytest.mark.parametrize("crash_at", ["remove", "replace"])
+def test_compaction_interrupted_by_crash(egram_paths, monkeypatch, crash_at):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    samples = [{"t": i * 2, "value": (i % 50) / 10.0} for i in range(3000)]
+    egram_storage.add_samples(session_id, "atrial", samples[:1000])
+    egram_storage.finish_session(session_id)
+    egram_storage.add_samples(session_id, "atrial", samples[1000:])
+    egram_storage.flush()
+
+    # crash before the raw segment is removed, or right after it
+    store = egram_storage.get_store()
+    def crash(*args):
+        raise OSError("crash")
+    with monkeypatch.context() as m, pytest.raises(OSError):
+        m.setattr(egram_segments.os, crash_at, crash)
+        store.compact_channel(session_id, "atrial")
+    egram_storage.close_storage()
+
+    # restart
+    store = egram_storage.get_store()
+    records = store.map_channel(session_id, "atrial")
+    assert len(records) == 3000
+    assert np.all(np.diff(records["t"]) > 0)
+    assert len(store.read_range(session_id, "atrial", 1990, 2010)) == 11
+    assert not os.path.exists(store.compact_path(session_id, "atrial") + ".tmp")
+
+
+# -------------------------------
+# SINGLE-WRITER ACTOR TESTS
+# -------------------------------
+def test_concurrent_writers_lose_no_updates(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+
+    def producer(channel, base):
+        for i in range(200):
+            egram_storage.add_samples(session_id, channel, [{"t": base + i, "value": 0.1}], wait=False)
+        egram_storage.add_marker(session_id, {"abbr": channel, "timestamp_ms": base}, wait=False)
+
+    threads = [threading.Thread(target=producer, args=(c, n * 1000)) for n, c in enumerate(["atrial", "surface"])]
+    threads.append(threading.Thread(target=egram_storage.set_telemetry, args=(session_id, "connected")))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    loaded = egram_storage.finish_session(session_id)
+    assert len(loaded["channels"]["atrial"]["samples"]) == 200
+    assert len(loaded["channels"]["surface"]["samples"]) == 200
+    # surface starts disabled, enabling it must not drop the other changes
+    assert loaded["channels"]["surface"]["enabled"]
+    assert loaded["end_time"] is not None
+    assert len(loaded["markers"]) == 2
+    assert [e["status"] for e in loaded["telemetry_status_log"]] == ["created", "connected"]
+
+
+def test_get_or_start_session_creates_one_session_across_threads(egram_paths):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(egram_storage.get_or_start_session("P001")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({s["session_id"] for s in results}) == 1
+    assert len(egram_storage.list_session_headers("P001")) == 1
+
+
+def test_queued_write_errors_are_reported(egram_paths, capsys):
+    future = egram_storage.add_marker("EGRAM_MISSING", {"abbr": "AS"}, wait=False)
+    with pytest.raises(ValueError):
+        future.result()
+    # the error callback runs on the writer thread, let it finish the job
+    egram_storage.run_write(lambda: None)
+    assert "storage write" in capsys.readouterr().out
+    assert egram_storage.storage_metrics()["actor"]["failed"] == 1
+
+
+# -------------------------------
+# LAZY SESSION HANDLE TESTS
+# -------------------------------
+def test_session_handles_load_channels_on_access(egram_paths, monkeypatch):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(session_id, "atrial", [{"t": 0, "value": 0.5}])
+
+    loads = []
+    real_load = egram_storage.load_channel
+    monkeypatch.setattr(egram_storage, "load_channel", lambda *a: loads.append(a) or real_load(*a))
+
+    handle = egram_storage.load_sessions()["egram_sessions"][0]
+    assert handle["session_id"] == session_id
+    assert handle["end_time"] is None
+    assert loads == []
+
+    assert handle["channels"]["atrial"]["samples"] == [{"t": 0, "value": 0.5}]
+    assert loads == [(session_id, "atrial")]
+
+    # new samples invalidate the cached arrays
+    egram_storage.add_samples(session_id, "atrial", [{"t": 2, "value": 0.7}])
+    assert len(handle["channels"]["atrial"]["samples"]) == 2
+
+
+def test_session_cache_respects_memory_budget(egram_paths):
+    session_ids = []
+    for _ in range(4):
+        session_id = egram_storage.create_session("P001", {})["session_id"]
+        egram_storage.add_samples(session_id, "atrial", [{"t": i, "value": 0.1} for i in range(1000)])
+        session_ids.append(session_id)
+
+    # one channel = 1000 timestamps + 1000 values = 16000 bytes
+    original = egram_storage.SESSION_CACHE_BYTES
+    egram_storage.set_session_cache_budget(40000)
+    for session_id in session_ids:
+        egram_storage.get_session(session_id).channel_arrays("atrial")
+
+    metrics = egram_storage.session_cache_metrics()
+    assert metrics["entries"] == 2
+    assert metrics["used_bytes"] <= 40000
+    assert metrics["evictions"] == 2
+
+    egram_storage.get_session(session_ids[-1]).channel_arrays("atrial")
+    assert egram_storage.session_cache_metrics()["hits"] == 1
+    egram_storage.set_session_cache_budget(original)
+
+
+def test_save_sessions_materializes_handles(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(session_id, "atrial", [{"t": 0, "value": 0.5}])
+
+    egram_storage.save_sessions(egram_storage.load_sessions())
+    with open(egram_paths / "egram.json") as f:
+        saved = json.load(f)["egram_sessions"][0]
+
+    assert saved["session_id"] == session_id
+    assert saved["channels"]["atrial"] == {"enabled": True, "samples": [{"t": 0, "value": 0.5}]}
+    assert saved["telemetry_status_log"][0]["status"] == "created"
+
+
+# -------------------------------
+# TIME-RANGE QUERY TESTS
+# -------------------------------
+def test_channel_range_on_raw_segment(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(session_id, "atrial", [{"t": i * 2, "value": 0.1} for i in range(1000)])
+
+    t, values = egram_storage.get_channel_range(session_id, "atrial", 101, 110)
+    assert list(t) == [102, 104, 106, 108, 110]
+
+    samples = egram_storage.get_samples_range(session_id, "atrial", 0, 2)
+    assert samples == [{"t": 0, "value": 0.1}, {"t": 2, "value": 0.1}]
+
+
+def test_channel_range_decodes_only_overlapping_blocks(egram_paths, monkeypatch):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    samples = [{"t": i * 2, "value": (i % 100) / 10.0} for i in range(50000)]
+    egram_storage.add_samples(session_id, "atrial", samples)
+    egram_storage.finish_session(session_id)
+    egram_storage.add_samples(session_id, "atrial", [{"t": 100000, "value": 1.0}])
+
+    decoded = []
+    real_decode = egram_codec.decode_block
+    monkeypatch.setattr(egram_codec, "decode_block", lambda raw: decoded.append(1) or real_decode(raw))
+
+    t, values = egram_storage.get_channel_range(session_id, "atrial", 40000, 40020)
+    assert list(t) == list(range(40000, 40022, 2))
+    assert list(values) == [s["value"] for s in samples[20000:20011]]
+    assert len(decoded) == 1
+
+    # range reaching into the samples appended after compaction
+    t, _ = egram_storage.get_channel_range(session_id, "atrial", 99996, 200000)
+    assert list(t) == [99996, 99998, 100000]
+
+
+def test_decode_still_reads_single_block_files():
+    t = np.arange(10, dtype=float)
+    raw = egram_codec.encode_block(t, t / 10.0)
+    assert egram_codec.read_count(raw) == 10
+    assert list(egram_codec.decode_channel(raw)[0]) == list(t)
+
+
+def test_markers_range(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    for ts in [30, 10, 20, 40]:
+        egram_storage.add_marker(session_id, {"abbr": "AS", "timestamp_ms": ts})
+
+    found = egram_storage.get_markers_range(session_id, 15, 30)
+    assert [m["timestamp_ms"] for m in found] == [20, 30]
+
+
+def test_markers_range_reads_log_once(egram_paths, monkeypatch):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    for ts in range(0, 1000, 10):
+        egram_storage.add_marker(session_id, {"abbr": "VS", "timestamp_ms": ts})
+
+    store = egram_storage.get_store()
+    reads = []
+    real_read = store.read_markers
+    monkeypatch.setattr(store, "read_markers", lambda sid: reads.append(sid) or real_read(sid))
+
+    assert len(egram_storage.get_markers_range(session_id, 100, 200)) == 11
+    # markers added later (a late one too) are merged into the sorted copy
+    egram_storage.add_marker(session_id, {"abbr": "AS", "timestamp_ms": 155})
+    egram_storage.add_marker(session_id, {"abbr": "AS", "timestamp_ms": 2000})
+    found = egram_storage.get_markers_range(session_id, 150, 160)
+    assert [m["timestamp_ms"] for m in found] == [150, 155, 160]
+    assert len(egram_storage.get_markers_range(session_id, 1500, 3000)) == 1
+    assert len(reads) == 1
+
+
+def test_channel_range_legacy_session(legacy_session):
+    t, values = egram_storage.get_channel_range("EGRAM_OLD", "atrial", 0, 0)
+    assert list(values) == [0.32]
+    assert egram_storage.get_markers_range("EGRAM_OLD", 0, 100) == []
+
+
+# -------------------------------
+# MIN/MAX PYRAMID TESTS
+# -------------------------------
+def test_finish_session_builds_pyramid(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    samples = [{"t": i * 2, "value": ((i % 50) - 25) / 10.0} for i in range(100000)]
+    egram_storage.add_samples(session_id, "atrial", samples)
+    egram_storage.finish_session(session_id)
+
+    store = egram_storage.get_store()
+    for level in LEVELS:
+        assert len(read_level(store, session_id, "atrial", level)) == 100000 // level
+
+    t, lo, hi = egram_storage.get_channel_overview(session_id, "atrial")
+    assert len(t) * 2 <= OVERVIEW_POINTS
+    assert lo.min() == pytest.approx(-2.5)
+    assert hi.max() == pytest.approx(2.4)
+
+    # a narrow range falls through to the raw samples
+    t, lo, hi = egram_storage.get_channel_overview(session_id, "atrial", 1000, 1100)
+    assert list(t) == list(range(1000, 1102, 2))
+    assert list(lo) == list(hi)
+
+
+def test_pyramid_rebuilds_incrementally(egram_paths):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(session_id, "atrial", [{"t": i, "value": 0.0} for i in range(1005)])
+    egram_storage.finish_session(session_id)
+
+    # the session grows after it was finished; the partial bucket is redone
+    egram_storage.add_samples(session_id, "atrial", [{"t": 1005 + i, "value": 9.0} for i in range(20)])
+    egram_storage.build_pyramids(session_id)
+
+    buckets = read_level(egram_storage.get_store(), session_id, "atrial", 10)
+    assert len(buckets) == 103
+    assert buckets["max"][99] == 0.0
+    assert buckets["max"][100] == 9.0
+    assert buckets["min"][100] == 0.0
+    assert buckets["t"][-1] == 1020
+
+
+def test_overview_of_legacy_session(legacy_session):
+    t, lo, hi = egram_storage.get_channel_overview("EGRAM_OLD", "atrial")
+    assert list(t) == [0]
+    assert list(hi) == [0.32]
+
+
+# -------------------------------
+# LEGACY STREAMING / MIGRATION TESTS
+# -------------------------------
+def write_legacy_file(path, count, samples_per_channel=50):
+    sessions = []
+    for i in range(count):
+        sessions.append({
+            "session_id": f"EGRAM_{i:03d}",
+            "patient_id": "P001" if i % 2 == 0 else "P002",
+            "start_time": f"2025-10-24T14:{i:02d}:00Z",
+            "end_time": f"2025-10-24T14:{i:02d}:30Z",
+            "telemetry_status_log": [],
+            "settings": {"note": "ünïcode"},
+            "channels": {
+                "atrial": {"enabled": True, "samples": [{"t": j * 2, "value": j / 10.0} for j in range(samples_per_channel)]},
+                "ventricular": {"enabled": True, "samples": []},
+                "surface": {"enabled": False, "samples": []}
+            },
+            "markers": [],
+            "print_metadata": {"printed": False, "printed_at": None, "file_path": None}
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"egram_sessions": sessions}, f, indent=4, ensure_ascii=False)
+    return sessions
+
+
+def test_streaming_reader_matches_json_load(tmp_path):
+    path = tmp_path / "egram.json"
+    sessions = write_legacy_file(path, 12)
+
+    # tiny chunks force sessions to span many reads
+    reader = LegacySessionReader(str(path), chunk_size=128)
+    assert list(reader) == sessions
+    assert reader.offset <= os.path.getsize(path)
+
+
+def test_migration_is_resumable(tmp_path):
+    legacy = tmp_path / "egram.json"
+    sessions = write_legacy_file(legacy, 6)
+    root = str(tmp_path / "egram")
+
+    # pretend a previous run got through the first two sessions
+    store = SegmentStore(root)
+    store.import_session(sessions[0])
+    store.import_session(sessions[1])
+
+    stats = migrate_legacy_file(str(legacy), root, progress=None)
+    assert stats["migrated"] == 4
+    assert stats["skipped"] == 2
+    assert stats["percent"] == 100.0
+
+    again = migrate_legacy_file(str(legacy), root, progress=None)
+    assert again["migrated"] == 0
+
+    store = SegmentStore(root)
+    assert store.load_session("EGRAM_005")["channels"]["atrial"]["samples"] == sessions[5]["channels"]["atrial"]["samples"]
+    assert os.path.exists(store.compact_path("EGRAM_005", "atrial"))
+
+
+def test_resumed_sqlite_migration_keeps_logs(tmp_path):
+    legacy = tmp_path / "egram.json"
+    sessions = write_legacy_file(legacy, 2)
+    sessions[0]["markers"] = [{"abbr": "AS", "timestamp_ms": 4}]
+    sessions[0]["telemetry_status_log"] = [{"time": "2025-10-24T14:00:00Z", "status": "connected"}]
+    with open(legacy, "w") as f:
+        json.dump({"egram_sessions": sessions}, f)
+    root = str(tmp_path / "egram")
+
+    # interrupted after writing the session, before indexing it
+    SegmentStore(root).import_session(sessions[0])
+
+    db = SqliteStore(str(tmp_path / "dcm.sqlite3"))
+    stats = migrate_legacy_file(str(legacy), root, progress=None, index=SqliteSessionIndex(db))
+    assert stats["skipped"] == 1
+    assert db.read_markers("EGRAM_000") == [{"abbr": "AS", "timestamp_ms": 4}]
+    assert [e["status"] for e in db.read_status("EGRAM_000")] == ["connected"]
+    db.close()
+
+
+def test_storage_uses_migrated_sessions(egram_paths):
+    sessions = write_legacy_file(egram_paths / "egram.json", 3)
+    migrate_legacy_file(str(egram_paths / "egram.json"), egram_storage.EGRAM_DIR, progress=None)
+
+    headers = egram_storage.list_session_headers("P001")
+    assert [h["session_id"] for h in headers] == ["EGRAM_000", "EGRAM_002"]
+    assert not any(h["legacy"] for h in headers)
+    assert egram_storage.get_session("EGRAM_002") == sessions[2]
+
+
+# -------------------------------
+# SQLITE METADATA BACKEND TESTS
+# -------------------------------
+def test_sqlite_metadata_backend(egram_paths, monkeypatch):
+    db = SqliteStore(str(egram_paths / "dcm.sqlite3"))
+    monkeypatch.setattr(egram_storage, "METADATA_DB", None)
+    egram_storage.use_metadata_backend(db)
+
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    marker = {"channel": "atrial", "abbr": "AS", "timestamp_ms": 10, "modifier": None}
+    egram_storage.add_marker(session_id, marker)
+    egram_storage.set_telemetry(session_id, "disconnected")
+
+    loaded = egram_storage.get_session(session_id)
+    assert loaded["markers"] == [marker]
+    assert [e["status"] for e in loaded["telemetry_status_log"]] == ["created", "disconnected"]
+    assert db.get_session_entry(session_id)["patient_id"] == "P001"
+    assert [h["session_id"] for h in egram_storage.list_session_headers("P001")] == [session_id]
+
+    egram_storage.use_metadata_backend(None)
+    db.close()
+
+
+def test_sqlite_index_rebuilt_from_existing_store(egram_paths, monkeypatch):
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_marker(session_id, {"abbr": "VS", "timestamp_ms": 4})
+
+    db = SqliteStore(str(egram_paths / "dcm.sqlite3"))
+    monkeypatch.setattr(egram_storage, "METADATA_DB", None)
+    egram_storage.use_metadata_backend(db)
+
+    assert egram_storage.get_session(session_id)["markers"] == [{"abbr": "VS", "timestamp_ms": 4}]
+    assert egram_storage.get_markers_range(session_id, 0, 3) == []
+    assert egram_storage.get_markers_range(session_id, 4, 4) == [{"abbr": "VS", "timestamp_ms": 4}]
+
+    egram_storage.use_metadata_backend(None)
+    db.close()
+
+
+def test_sqlite_logs_survive_index_rebuild(egram_paths, monkeypatch):
+    db = SqliteStore(str(egram_paths / "dcm.sqlite3"))
+    monkeypatch.setattr(egram_storage, "METADATA_DB", None)
+    egram_storage.use_metadata_backend(db)
+
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_marker(session_id, {"abbr": "AS", "timestamp_ms": 10})
+    egram_storage.set_telemetry(session_id, "disconnected")
+
+    # the database copy is rebuilt from the log files: same, no duplicates
+    db.set_meta("egram_index_built", False)
+    egram_storage.use_metadata_backend(db)
+    loaded = egram_storage.get_session(session_id)
+    assert loaded["markers"] == [{"abbr": "AS", "timestamp_ms": 10}]
+    assert [e["status"] for e in loaded["telemetry_status_log"]] == ["created", "disconnected"]
+
+    # and the files hold everything once the database is gone
+    egram_storage.use_metadata_backend(None)
+    assert egram_storage.get_session(session_id)["markers"] == [{"abbr": "AS", "timestamp_ms": 10}]
+    db.close()
+
+
+def test_read_only_index_stays_in_memory(egram_paths, monkeypatch):
+    db = SqliteStore(str(egram_paths / "dcm.sqlite3"))
+    monkeypatch.setattr(egram_storage, "METADATA_DB", None)
+    egram_storage.use_metadata_backend(db)
+
+    session_id = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_marker(session_id, {"abbr": "AS", "timestamp_ms": 10})
+    egram_storage.flush()
+
+    # a read-only process finds the database index unbuilt: it rebuilds in
+    # memory and reads the logs from the files, writing nothing
+    db.set_meta("egram_index_built", False)
+    monkeypatch.setattr(egram_storage, "READ_ONLY", True)
+    egram_storage.use_metadata_backend(db)
+
+    index = egram_storage.get_index()
+    assert not index.owns_logs
+    assert index.get(session_id)["patient_id"] == "P001"
+    assert egram_storage.get_session(session_id)["markers"] == [{"abbr": "AS", "timestamp_ms": 10}]
+    assert db.get_meta("egram_index_built") is False
+    assert not os.path.exists(os.path.join(egram_storage.EGRAM_DIR, "index.json"))
+
+    egram_storage.use_metadata_backend(None)
+    db.close()
@@ -0,0 +1,79 @@
+import numpy as np
+
+from egram.egram_samples import SampleBlock
+from egram.egram_utils import (
+    append_and_trim,
+    apply_gain,
+    convert_raw_samples,
+    counts_to_mv,
+    decode_packets,
+    samples_to_arrays,
+    sample_times,
+    scale_values,
+    trim_window
+)
+
+
+# -------------------------------
+# TESTS FOR BATCH KERNELS
+# -------------------------------
+def make_packet(vent, atrial, header=(0xAA, 0x22)):
+    return bytes(list(header) + [0] * 16 + [vent & 0xFF, atrial & 0xFF])
+
+
+def test_decode_packets_matches_int8_counts():
+    data = make_packet(12, -5) + make_packet(-128, 127) + make_packet(1, 1, header=(0, 0))
+    atrial, vent = decode_packets(data)
+
+    assert np.allclose(atrial[:2], [-0.5, 12.7])
+    assert np.allclose(vent[:2], [1.2, -12.8])
+    assert np.isnan(atrial[2]) and np.isnan(vent[2])
+
+
+def test_kernels_agree_with_dict_wrappers():
+    raw = list(range(-20, 20))
+    samples = convert_raw_samples(raw, 0.1)
+    t, values = samples_to_arrays(apply_gain(samples, "2X"))
+
+    assert np.array_equal(t, sample_times(len(raw)))
+    assert np.allclose(values, scale_values(counts_to_mv(raw), 2.0))
+
+
+def test_missing_values_stay_missing():
+    samples = [{"t": 0, "value": 1.0}, {"t": 2}, {"value": None}]
+
+    assert apply_gain(samples, "0.5X") == [{"t": 0, "value": 0.5}, {"t": 2, "value": None}, {"value": None}]
+    t, values = samples_to_arrays(samples)
+    assert list(t) == [0, 2, 0]
+    assert np.isnan(values[1:]).all()
+
+
+# -------------------------------
+# TESTS FOR SAMPLE BLOCKS
+# -------------------------------
+def test_sample_block_round_trip():
+    samples = [{"t": 0, "value": 1.5}, {"t": 2, "value": None}, {"t": 4.5, "value": -1.0}]
+    block = SampleBlock.from_dicts(samples)
+
+    assert len(block) == 3
+    assert block.to_dicts() == samples
+    assert SampleBlock.coerce(block) is block
+
+
+def test_sample_blocks_through_gain_and_trim():
+    buf = SampleBlock.empty()
+    for start in range(0, 100, 10):
+        block = SampleBlock(start + np.arange(5) * 2.0, np.ones(5))
+        buf = append_and_trim(buf, apply_gain(block, "2X"), 20)
+
+    assert isinstance(buf, SampleBlock)
+    assert list(buf.t) == [78, 80, 82, 84, 86, 88, 90, 92, 94, 96, 98]
+    assert (buf.values == 2.0).all()
+
+
+def test_trim_window_on_dict_lists():
+    samples = [{"t": t, "value": 0.0} for t in range(0, 100, 2)]
+
+    assert trim_window(samples, 10) == samples[-6:]
+    assert trim_window(samples, 1000) == samples
+    assert trim_window([], 10) == []
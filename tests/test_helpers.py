@@ -120,3 +120,13 @@ def test_delete_patient(temp_patient_file, monkeypatch):
     patients = storage.load_all_patients()
     assert len(patients) == 1
     assert patients[0]["id"] == "P002"
+
+
+def test_load_patient_by_id_and_dcm_serial(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    storage.save_patient_to_file({"id": "P001", "name": "A", "device": {"dcm_serial": "DCM-001"}})
+    storage.save_patient_to_file({"id": "P002", "name": "B"})
+
+    assert storage.load_patient_by_id("P002")["name"] == "B"
+    assert storage.load_patient_by_dcm_serial("DCM-001")["id"] == "P001"
+    assert storage.load_patient_by_id("P009") is None
@@ -0,0 +1,101 @@
+import pytest
+import json
+import threading
+
+from helper import storage
+from helper.sqlite_store import SqliteStore
+
+
+# -------------------------------
+# FIXTURES
+# -------------------------------
+@pytest.fixture
+def db(tmp_path):
+    """Fresh SQLite store in a temp folder."""
+    store = SqliteStore(str(tmp_path / "dcm.sqlite3"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def sqlite_backend(db, monkeypatch):
+    """Route the helper.storage patient/user functions through SQLite."""
+    monkeypatch.setattr(storage, "BACKEND", db)
+    return db
+
+
+# -------------------------------
+# TESTS FOR SQLITE STORE
+# -------------------------------
+def test_wal_mode_enabled(db):
+    assert db.query("PRAGMA journal_mode")[0][0] == "wal"
+
+
+def test_patient_lookups_use_indexes(db):
+    plan = db.query("EXPLAIN QUERY PLAN SELECT data FROM patients WHERE dcm_serial = ?", ("DCM-001",))
+    assert "patients_dcm_serial" in str(plan)
+    plan = db.query("EXPLAIN QUERY PLAN SELECT data FROM egram_markers WHERE session_id = ? AND timestamp_ms > ?", ("S", 0))
+    assert "egram_markers_session_time" in str(plan)
+
+
+def test_save_update_delete_patient(sqlite_backend):
+    storage.save_patient_to_file({"id": "P001", "name": "Alice", "device": {"dcm_serial": "DCM-001"}})
+    storage.save_patient_to_file({"id": "P002", "name": "Bob", "device": {"dcm_serial": "DCM-002"}})
+    storage.save_patient_to_file({"id": "P001", "name": "Alicia", "device": {"dcm_serial": "DCM-001"}})
+
+    patients = storage.load_all_patients()
+    assert [p["id"] for p in patients] == ["P001", "P002"]   # update keeps list order
+    assert storage.load_patient_by_name("Alicia")["id"] == "P001"
+    assert storage.load_patient_by_id("P002")["name"] == "Bob"
+    assert storage.load_patient_by_dcm_serial("DCM-002")["name"] == "Bob"
+    assert storage.load_patient_by_dcm_serial("DCM-009") is None
+
+    storage.delete_patient("P001")
+    assert [p["id"] for p in storage.load_all_patients()] == ["P002"]
+
+
+def test_users_round_trip(sqlite_backend, tmp_path):
+    storage.save_users(str(tmp_path / "unused.json"), [{"username": "alice", "password": "1234"}])
+    assert storage.load_users(str(tmp_path / "unused.json")) == {"users": [{"username": "alice", "password": "1234"}]}
+
+
+def test_import_json_files(db, tmp_path):
+    patients_file = tmp_path / "patients.json"
+    users_file = tmp_path / "users.json"
+    with open(patients_file, "w") as f:
+        json.dump({"patients": [{"id": "P001", "name": "Alice"}]}, f)
+    with open(users_file, "w") as f:
+        json.dump({"users": [{"username": "bob", "password": "abcd"}]}, f)
+
+    assert db.is_empty()
+    db.import_json(str(patients_file), str(users_file))
+    assert db.load_all_patients() == [{"id": "P001", "name": "Alice"}]
+    assert db.load_users() == [{"username": "bob", "password": "abcd"}]
+
+
+def test_concurrent_writers_and_readers(db):
+    # acquisition thread writes markers while another thread keeps reading
+    errors = []
+
+    def writer():
+        try:
+            for i in range(200):
+                db.append_markers("S1", [{"abbr": "AS", "timestamp_ms": i}])
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(200):
+                db.read_markers("S1")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer), threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(db.read_markers("S1")) == 200